@@ -0,0 +1,218 @@
+"""
+Record/replay of LLM HTTP traffic at the httpx transport level.
+
+In record mode every request is forwarded to the real API and the response
+is appended to a JSON-lines cassette keyed by a hash of the request (method,
+path and canonicalized JSON body, i.e. the prompt, tools and parameters).
+In replay mode responses are served from the cassette without touching the
+network, so a benchmark measures only application and framework cost.
+
+Configure with LLM_CASSETTE_MODE=record|replay and LLM_CASSETTE_PATH
+(a ".gz" suffix stores the cassette gzip-compressed). Services pass
+`cassette_http_clients()` to their ChatDeepSeek/ChatOpenAI clients.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:  # 仅使用Cassette存储（如测试）时不需要httpx
+    httpx = None
+
+DEFAULT_PATH = "cassettes/llm.jsonl"
+MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """
+    Hash a request into a cassette key. JSON bodies are re-serialized with
+    sorted keys so field order does not change the key.
+    """
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        canonical = body
+    digest = hashlib.sha256()
+    digest.update(f"{method.upper()} {path}\n".encode("utf-8"))
+    digest.update(canonical)
+    return digest.hexdigest()[:32]
+
+
+class Cassette:
+    """
+    JSON-lines store of recorded responses: one {"key", "status", "content_type", "body"}
+    object per line; later lines win, so re-recording a prompt just appends.
+
+    Args:
+        path: Cassette file; ".gz" paths are gzip-compressed
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, status: int, content_type: str, body: str) -> None:
+        entry = {"key": key, "status": status, "content_type": content_type, "body": body}
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._entries[key] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._open("a") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "entries": len(self), "hits": self.hits,
+                "misses": self.misses, "recorded": self.recorded}
+
+
+def _replay(cassette: Cassette, request, key: str):
+    entry = cassette.get(key)
+    if entry is None:
+        raise CassetteMiss(
+            f"No recorded response for {request.method} {request.url.path} (key {key}); "
+            f"re-record {cassette.path} with LLM_CASSETTE_MODE=record"
+        )
+    return httpx.Response(
+        entry["status"],
+        headers={"content-type": entry["content_type"]},
+        content=entry["body"].encode("utf-8"),
+        request=request,
+    )
+
+
+def _record(cassette: Cassette, request, key: str, response):
+    # 流式响应也完整读取后再写入，录制模式不追求首字节延迟
+    body = response.content
+    content_type = response.headers.get("content-type", "application/json")
+    if response.status_code < 500:
+        cassette.put(key, response.status_code, content_type, body.decode("utf-8", errors="replace"))
+    return httpx.Response(response.status_code, headers={"content-type": content_type},
+                          content=body, request=request)
+
+
+if httpx is not None:
+    class CassetteTransport(httpx.BaseTransport):
+        """Sync httpx transport that records to or replays from a Cassette."""
+
+        def __init__(self, cassette: Cassette, mode: str, inner: Optional[httpx.BaseTransport] = None):
+            self.cassette = cassette
+            self.mode = mode
+            self.inner = inner or httpx.HTTPTransport()
+
+        def handle_request(self, request):
+            key = request_key(request.method, request.url.path, request.read())
+            if self.mode == "replay":
+                return _replay(self.cassette, request, key)
+            response = self.inner.handle_request(request)
+            response.read()
+            return _record(self.cassette, request, key, response)
+
+        def close(self) -> None:
+            self.inner.close()
+
+    class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+        """Async counterpart of CassetteTransport."""
+
+        def __init__(self, cassette: Cassette, mode: str, inner: Optional[httpx.AsyncBaseTransport] = None):
+            self.cassette = cassette
+            self.mode = mode
+            self.inner = inner or httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            key = request_key(request.method, request.url.path, await request.aread())
+            if self.mode == "replay":
+                return _replay(self.cassette, request, key)
+            response = await self.inner.handle_async_request(request)
+            await response.aread()
+            return _record(self.cassette, request, key, response)
+
+        async def aclose(self) -> None:
+            await self.inner.aclose()
+
+
+def cassette_mode(mode: Optional[str] = None) -> str:
+    mode = (mode or os.getenv("LLM_CASSETTE_MODE", "off")).lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown LLM_CASSETTE_MODE: {mode}")
+    return mode
+
+
+def cassette_transports(
+    mode: Optional[str] = None,
+    path: Optional[str] = None
+) -> Tuple[Optional["CassetteTransport"], Optional["AsyncCassetteTransport"]]:
+    """
+    Build the (sync, async) transports for the configured mode.
+
+    Args:
+        mode: "record", "replay" or "off"; defaults to LLM_CASSETTE_MODE
+        path: Cassette file; defaults to LLM_CASSETTE_PATH
+
+    Returns:
+        Tuple of transports sharing one Cassette, or (None, None) when off
+    """
+    mode = cassette_mode(mode)
+    if mode == "off":
+        return None, None
+    cassette = Cassette(path or os.getenv("LLM_CASSETTE_PATH", DEFAULT_PATH))
+    return CassetteTransport(cassette, mode), AsyncCassetteTransport(cassette, mode)
+
+
+def cassette_http_clients(
+    mode: Optional[str] = None,
+    path: Optional[str] = None,
+    **client_kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Keyword arguments for a LangChain OpenAI-compatible chat model:
+    `ChatDeepSeek(..., **cassette_http_clients())`. Empty when cassettes are off.
+    """
+    sync_transport, async_transport = cassette_transports(mode, path)
+    if sync_transport is None:
+        return {}
+    return {
+        "http_client": httpx.Client(transport=sync_transport, **client_kwargs),
+        "http_async_client": httpx.AsyncClient(transport=async_transport, **client_kwargs),
+    }
@@ -1 +1,381 @@
- 
\ No newline at end of file
+"""
+Shared runtime metrics for the Python AI services (insight, chartSay, joker).
+
+Metrics live in-process and are rendered in the Prometheus text exposition
+format (version 0.0.4) on demand. Recording is a dict lookup, a bisect and
+a few additions under a per-series lock, so it can sit on request hot paths.
+
+Every service labels its series with `service`, so one dashboard covers all
+of them:
+
+    ai_stage_duration_seconds{service,stage}      histogram, e.g. stage=sql
+    ai_llm_tokens_total{service,stage,type}       type=prompt|completion|cached
+    ai_cache_lookups_total{service,cache,result}  result=hit|miss
+    ai_requests_in_flight{service}
+    ai_sessions{service}
+
+Cache hit rate, for example, is
+`sum(rate(ai_cache_lookups_total{result="hit"}[5m])) / sum(rate(ai_cache_lookups_total[5m]))`.
+
+Only the standard library is used so services can import this module without
+new dependencies.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# LLM调用从几十毫秒到一分钟不等
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage of the code currently running, used to attribute token counts
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("ai_metrics_stage", default="unknown")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class: a named family of series keyed by label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Return the series for the given label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self, name: str, labelnames, values) -> List[str]:
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; use `labels(...).inc(n)`."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; use `labels(...).inc()/dec()/set()`."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name: str, labelnames, values) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_label_text(labelnames, values)} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{_label_text(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets; use `labels(...).observe(v)`."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+
+class Registry:
+    """Holds metric families plus collectors that refresh gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callable run before every render (e.g. to set a gauge from a store size)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception:
+                # 采集回调失败不影响其余指标输出
+                pass
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the metric families shared by all services
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "ai_stage_duration_seconds", "Latency of pipeline stages (intent, sql, chart, schema, search, embed).",
+    ("service", "stage")
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "ai_llm_tokens_total", "LLM tokens by stage; type is prompt, completion or cached (prompt tokens served from the provider cache).",
+    ("service", "stage", "type")
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "ai_cache_lookups_total", "Cache lookups by cache and result (hit or miss).",
+    ("service", "cache", "result")
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "ai_requests_in_flight", "HTTP requests currently being served.",
+    ("service",)
+))
+SESSIONS = REGISTRY.register(Gauge(
+    "ai_sessions", "Sessions currently resident in memory.",
+    ("service",)
+))
+
+
+class _StageTimer:
+    """Context manager observing a stage's duration and marking it as the current stage."""
+
+    __slots__ = ("_series", "_stage", "_start", "_token")
+
+    def __init__(self, series: _HistogramValue, stage: str):
+        self._series = series
+        self._stage = stage
+
+    def __enter__(self):
+        self._token = _current_stage.set(self._stage)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._series.observe(time.perf_counter() - self._start)
+        _current_stage.reset(self._token)
+        return False
+
+
+class ServiceMetrics:
+    """
+    Per-service handle on the shared metric families.
+
+    Args:
+        service: Value of the `service` label, e.g. "insight"
+        registry: Registry to render (the process-wide one by default)
+    """
+
+    def __init__(self, service: str, registry: Registry = REGISTRY):
+        self.service = service
+        self.registry = registry
+
+    def stage(self, stage: str) -> _StageTimer:
+        """Time a block: `with metrics.stage("sql"): ...`."""
+        return _StageTimer(STAGE_DURATION.labels(self.service, stage), stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a stage duration measured by the caller (e.g. across a stream)."""
+        STAGE_DURATION.labels(self.service, stage).observe(seconds)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator form of stage() for sync and async functions."""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(stage):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_tokens(
+        self,
+        prompt: int = 0,
+        completion: int = 0,
+        cached: int = 0,
+        stage: Optional[str] = None
+    ) -> None:
+        """Add token counts; the stage defaults to the enclosing stage() block."""
+        stage = stage or _current_stage.get()
+        for kind, amount in (("prompt", prompt), ("completion", completion), ("cached", cached)):
+            if amount:
+                LLM_TOKENS.labels(self.service, stage, kind).inc(amount)
+
+    def record_llm_usage(self, message: Any, stage: Optional[str] = None) -> None:
+        """Record the LangChain `usage_metadata` of an LLM response message, if present."""
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        details = usage.get("input_token_details") or {}
+        self.record_tokens(
+            prompt=usage.get("input_tokens") or 0,
+            completion=usage.get("output_tokens") or 0,
+            cached=details.get("cache_read") or 0,
+            stage=stage
+        )
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        CACHE_LOOKUPS.labels(self.service, cache, "hit" if hit else "miss").inc()
+
+    def set_sessions(self, count: int) -> None:
+        SESSIONS.labels(self.service).set(count)
+
+    def track_sessions(self, count: Callable[[], int]) -> None:
+        """Refresh the session gauge from `count()` at scrape time instead of on every change."""
+        self.registry.add_collector(lambda: self.set_sessions(count()))
+
+    def install(self, app) -> None:
+        """Count in-flight HTTP requests of a Starlette/FastAPI app."""
+        app.add_middleware(InFlightMiddleware, service=self.service)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class InFlightMiddleware:
+    """Pure ASGI middleware maintaining the in-flight request gauge."""
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.series = IN_FLIGHT.labels(service)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.series.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.series.dec()
+
+
+def start_http_server(port: int, addr: str = "0.0.0.0", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serve /metrics from a daemon thread, for processes without their own HTTP app.
+
+    Returns:
+        ThreadingHTTPServer: The running server (call shutdown() to stop it)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
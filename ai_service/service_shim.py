@@ -0,0 +1,81 @@
+"""
+The one module services import from ai_service.
+
+Each service puts this directory on sys.path (see its serviceMetrics.py /
+metrics.py) and imports everything shared from here:
+
+    from service_shim import CONTENT_TYPE, cassette_transports, service_metrics
+
+    metrics = service_metrics("insight")
+
+Set AI_METRICS=off to swap in NoopMetrics, which implements the full
+ServiceMetrics interface so call sites never need to check what they got.
+"""
+import os
+from contextlib import nullcontext
+from typing import Any, Callable, Optional
+
+import cassette
+import monitoring
+from cassette import cassette_http_clients, cassette_transports  # noqa: F401  (re-exported)
+from monitoring import CONTENT_TYPE, ServiceMetrics  # noqa: F401  (re-exported)
+
+
+class NoopMetrics:
+    """Drop-in ServiceMetrics that records nothing; keep its methods in sync with ServiceMetrics."""
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def stage(self, stage: str):
+        return nullcontext()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        pass
+
+    def timed(self, stage: str) -> Callable:
+        return lambda func: func
+
+    def record_tokens(self, prompt: int = 0, completion: int = 0, cached: int = 0,
+                      stage: Optional[str] = None) -> None:
+        pass
+
+    def record_llm_usage(self, message: Any, stage: Optional[str] = None) -> None:
+        pass
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        pass
+
+    def set_sessions(self, count: int) -> None:
+        pass
+
+    def track_sessions(self, count: Callable[[], int]) -> None:
+        pass
+
+    def install(self, app) -> None:
+        pass
+
+    def render(self) -> str:
+        return ""
+
+
+def service_metrics(service: str, enabled: Optional[bool] = None):
+    """
+    Metrics handle for a service.
+
+    Args:
+        service: Value of the `service` label
+        enabled: Defaults to AI_METRICS (anything but "off"/"0" enables metrics)
+
+    Returns:
+        ServiceMetrics, or NoopMetrics when disabled
+    """
+    if enabled is None:
+        enabled = os.getenv("AI_METRICS", "on").lower() not in ("off", "0", "false")
+    return ServiceMetrics(service) if enabled else NoopMetrics(service)
+
+
+__all__ = [
+    "CONTENT_TYPE", "NoopMetrics", "ServiceMetrics", "cassette", "cassette_http_clients",
+    "cassette_transports", "monitoring", "service_metrics",
+]
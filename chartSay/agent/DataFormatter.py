@@ -1,6 +1,7 @@
 import json
 from langchain_core.prompts import ChatPromptTemplate
 from LLMManager import LLMManager
+from metrics import metrics
 from graph_instructions import graph_instructions
 # from graph_instructions import graph_instructions_with_type as graph_instructions
 
@@ -10,6 +11,7 @@ class DataFormatter:
         self.llm_manager = LLMManager()
 
     
+    @metrics.timed("chart_format")
     def format_data_for_visualization(self, state: dict) -> dict:
         """Format the data for the chosen visualization type."""
         
@@ -1,15 +1,35 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_deepseek import ChatDeepSeek
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
+from metrics import metrics
 
 load_dotenv()
 
+
+@lru_cache(maxsize=None)
+def cassette_clients() -> dict:
+    """
+    Record/replay LLM traffic when LLM_CASSETTE_MODE is set; one cassette shared by all managers.
+    Empty (ChatDeepSeek's default clients) when the mode is unset or ai_service is not deployed.
+    """
+    if os.getenv("LLM_CASSETTE_MODE", "off").lower() == "off":
+        return {}
+    try:
+        from cassette import cassette_http_clients
+    except ImportError:
+        return {}
+    return cassette_http_clients()
+
+
 class LLMManager:
     def __init__(self):
-        self.llm = ChatDeepSeek(model=os.getenv("BASE_MODEL_NAME"), api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0)
+        self.llm = ChatDeepSeek(model=os.getenv("BASE_MODEL_NAME"), api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0, **cassette_clients())
 
     def invoke(self, prompt: ChatPromptTemplate, **kwargs) -> str:
         messages = prompt.format_messages(**kwargs)
         response = self.llm.invoke(messages)
+        # Attributed to the workflow node currently being timed
+        metrics.record_llm_usage(response)
         return response.content
\ No newline at end of file
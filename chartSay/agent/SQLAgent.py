@@ -2,12 +2,14 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from DatabaseManager import DatabaseManager
 from LLMManager import LLMManager
+from metrics import metrics
 
 class SQLAgent:
     def __init__(self):
         self.db_manager = DatabaseManager()
         self.llm_manager = LLMManager()
 
+    @metrics.timed("intent")
     def parse_question(self, state: dict) -> dict:
         """Parse user question and identify relevant tables and columns."""
         question = state['question']
@@ -63,6 +65,7 @@ The "noun_columns" field should contain only the columns that are relevant to th
 
         return {"unique_nouns": list(unique_nouns)}
 
+    @metrics.timed("sql")
     def generate_sql(self, state: dict) -> dict:
         """Generate SQL query based on parsed question and unique nouns."""
         question = state['question']
@@ -125,6 +128,7 @@ Generate SQL query string'''),
         else:
             return {"sql_query": response}
 
+    @metrics.timed("sql_validate")
     def validate_and_fix_sql(self, state: dict) -> dict:
         """Validate and fix the generated SQL query."""
         sql_query = state['sql_query']
@@ -197,6 +201,7 @@ For example:
                 "sql_issues": result["issues"]
             }
 
+    @metrics.timed("sql_execute")
     def execute_sql(self, state: dict) -> dict:
         """Execute SQL query and return results."""
         query = state['sql_query']
@@ -211,6 +216,7 @@ For example:
         except Exception as e:
             return {"error": str(e)}
 
+    @metrics.timed("answer")
     def format_results(self, state: dict) -> dict:
         """Format query results into a human-readable response."""
         question = state['question']
@@ -227,6 +233,7 @@ For example:
         response = self.llm_manager.invoke(prompt, question=question, results=results)
         return {"answer": response}
 
+    @metrics.timed("chart")
     def choose_visualization(self, state: dict) -> dict:
         """Choose an appropriate visualization for the data."""
         question = state['question']
@@ -1,11 +1,13 @@
-
-
+import os
 from WorkflowManager import WorkflowManager
 from dotenv import load_dotenv
+from metrics import monitoring
 
 load_dotenv()
 
+# The graph is served by LangGraph, so metrics get their own /metrics port
+if monitoring and os.getenv("CHARTSAY_METRICS_PORT"):
+    monitoring.start_http_server(int(os.getenv("CHARTSAY_METRICS_PORT")))
+
 # for deployment on langgraph cloud
 graph = WorkflowManager().returnGraph()
-    
-    
\ No newline at end of file
@@ -0,0 +1,45 @@
+# This service's handle on the shared ai_service modules (ai_service/service_shim.py),
+# falling back to no-ops when ai_service is not deployed alongside the service
+import os
+import sys
+from contextlib import nullcontext
+
+# Defaults to the ai_service directory of this repository; override with AI_SERVICE_DIR
+AI_SERVICE_DIR = os.getenv(
+    "AI_SERVICE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ai_service"))
+)
+if os.path.isdir(AI_SERVICE_DIR) and AI_SERVICE_DIR not in sys.path:
+    sys.path.append(AI_SERVICE_DIR)
+
+
+class _NoopMetrics:
+    """Stands in for ServiceMetrics when ai_service is missing; every recording call is a no-op."""
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def stage(self, stage: str):
+        return nullcontext()
+
+    def timed(self, stage: str):
+        return lambda func: func
+
+    def render(self) -> str:
+        return ""
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: None
+
+
+try:
+    from service_shim import CONTENT_TYPE, monitoring, service_metrics  # noqa: F401
+except ImportError:  # langgraph.json packages only this directory; metrics become no-ops
+    monitoring = None
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def service_metrics(service: str, enabled=None):
+        return _NoopMetrics(service)
+
+
+metrics = service_metrics("chartSay")
@@ -1,17 +1,43 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Optional, Dict, Any, List
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 import os
-from loguru import logger
 import sys
-import json
 import datetime
+import threading
+from functools import lru_cache
 
-from dataVisualizerManager import  generate_create_table_sql, generate_sql, generate_chart_config, get_messages
+from dataVisualizerManager import (
+    agenerate_create_table_sql,
+    agenerate_sql,
+    agenerate_chart_config,
+    astream_sql,
+    astream_chart_config,
+    agenerate_chart_configs,
+    get_messages,
+    get_manager_stats,
+    close_manager,
+    prewarm
+)
 from interfaces import DataSource
+from datasourceRegistry import datasource_registry
+from llmRegistry import llm_registry
+from responseCache import response_cache
+from intentClassifier import intent_stats
+from tokenUsage import token_usage
+from sqlValidator import sql_validation_stats
+from dataSampler import SAMPLERS
+from chartPayload import ChartPayload, NDJSONChartParser, parse_columnar
+from serialization import dumps, message_dicts
+from compression import CompressionMiddleware
+from requestLogger import RequestLogger
+from serviceMetrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from tracing import TracingMiddleware, tracer
+from utils import format_sse
 from test_data import (
     EXAMPLE_DATASOURCE,
     EXAMPLE_CHART_DATA,
@@ -19,28 +45,43 @@ from test_data import (
     EXAMPLE_SQL_REQUEST
 )
 
-# Configure loguru logger
-# Remove default handler
-logger.remove()
-# Add console handler with color
-logger.add(
-    sys.stdout,
-    colorize=True,
-    format="{message}",
-    level="INFO",
-    serialize=False  # 禁用JSON格式输出，使用自定义格式
-)
-# Add file handler with rotation
-logger.add(
-    "logs/insight_api_{time:YYYY-MM-DD}.log",
-    rotation="00:00",  # Create new file at midnight
-    retention="30 days",  # Keep logs for 30 days
-    compression="zip",  # Compress rotated logs
-    format="{message}",
-    level="INFO",
-    encoding="utf-8",
-    serialize=False  # 禁用JSON格式输出，使用自定义格式
-)
+@lru_cache(maxsize=None)
+def get_logger():
+    """
+    导入并配置loguru（控制台 + 按天滚动的日志文件）。
+    首次写日志时才执行（通常在请求日志的后台线程中），不占用冷启动的导入时间。
+    """
+    from loguru import logger
+
+    # Remove default handler
+    logger.remove()
+    # Add console handler with color
+    logger.add(
+        sys.stdout,
+        colorize=True,
+        format="{message}",
+        level="INFO",
+        serialize=False  # 禁用JSON格式输出，使用自定义格式
+    )
+    # Add file handler with rotation
+    logger.add(
+        "logs/insight_api_{time:YYYY-MM-DD}.log",
+        rotation="00:00",  # Create new file at midnight
+        retention="30 days",  # Keep logs for 30 days
+        compression="zip",  # Compress rotated logs
+        format="{message}",
+        level="INFO",
+        encoding="utf-8",
+        serialize=False  # 禁用JSON格式输出，使用自定义格式
+    )
+    return logger
+
+
+# 请求日志：处理函数只入队，后台线程截断、序列化为单行JSON后交给loguru写出
+request_logger = RequestLogger(writer=lambda level, line: get_logger().log(level, line))
+
+# 设为1时在启动后由后台线程预先导入LLM依赖、构建客户端和链；默认在首次请求时按需加载
+PREWARM = os.getenv("INSIGHT_PREWARM", "0") == "1"
 
 # API密钥配置
 API_KEY = os.getenv("API_KEY")
@@ -99,9 +140,18 @@ class SchemaRequest(BaseModel):
         description="用户输入的查询需求",
         example=EXAMPLE_SQL_REQUEST["user_input"]
     )
-    datasource: DataSourceModel = Field(
-        description="数据源信息",
-        example=EXAMPLE_SQL_REQUEST["datasource"]
+    datasource: Optional[DataSourceModel] = Field(
+        description="数据源信息（与datasource_id二选一）",
+        example=EXAMPLE_SQL_REQUEST["datasource"],
+        default=None
+    )
+    datasource_id: Optional[str] = Field(
+        description="通过 /datasources 注册得到的数据源ID，提供时无需再传datasource",
+        default=None
+    )
+    use_cache: bool = Field(
+        description="是否使用响应缓存，设为false时强制重新生成",
+        default=True
     )
 class SQLRequest(BaseModel):
     """SQL请求模型"""
@@ -114,9 +164,18 @@ class SQLRequest(BaseModel):
         description="用户输入的查询需求",
         example=EXAMPLE_SQL_REQUEST["user_input"]
     )
-    datasource: DataSourceModel = Field(
-        description="数据源信息",
-        example=EXAMPLE_SQL_REQUEST["datasource"]
+    datasource: Optional[DataSourceModel] = Field(
+        description="数据源信息（与datasource_id二选一）",
+        example=EXAMPLE_SQL_REQUEST["datasource"],
+        default=None
+    )
+    datasource_id: Optional[str] = Field(
+        description="通过 /datasources 注册得到的数据源ID，提供时无需再传datasource",
+        default=None
+    )
+    use_cache: bool = Field(
+        description="是否使用响应缓存，设为false时强制重新生成",
+        default=True
     )
 
     class Config:
@@ -139,12 +198,90 @@ class ChartRequest(BaseModel):
         description="用于生成图表的数据",
         example=EXAMPLE_CHART_DATA
     )
+    sample_strategy: Optional[str] = Field(
+        description="提示词中代表性样本行的抽样策略：first_last_extremes、reservoir、stratified，默认取服务端配置",
+        default=None
+    )
 
     class Config:
         json_schema_extra = {
             "example": EXAMPLE_CHART_REQUEST
         }
 
+# 批量图表生成的并发上限
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", "8"))
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "50"))
+
+
+class ChartBatchItem(BaseModel):
+    """批量图表请求中的单个图表"""
+    session_id: str = Field(
+        description="会话ID，通常每个看板区块一个",
+        example=EXAMPLE_CHART_REQUEST["session_id"]
+    )
+    user_input: str = Field(
+        description="用户输入的可视化需求",
+        example=EXAMPLE_CHART_REQUEST["user_input"]
+    )
+    data: List[Dict[str, Any]] = Field(
+        description="用于生成图表的数据",
+        example=EXAMPLE_CHART_DATA
+    )
+
+
+class ChartBatchRequest(BaseModel):
+    """批量图表请求模型"""
+    items: List[ChartBatchItem] = Field(
+        description="需要生成的图表列表",
+        min_length=1,
+        max_length=MAX_BATCH_ITEMS
+    )
+    max_concurrency: int = Field(
+        description="同时进行的LLM调用数上限",
+        default=4,
+        ge=1,
+        le=MAX_BATCH_CONCURRENCY
+    )
+
+def check_sample_strategy(strategy: Optional[str]) -> None:
+    """校验抽样策略名称"""
+    if strategy and strategy not in SAMPLERS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"未知的抽样策略: {strategy}，可选: {', '.join(SAMPLERS)}"
+        )
+
+
+def resolve_datasource(request) -> DataSource:
+    """根据请求中的datasource_id或内联datasource得到数据源"""
+    if request.datasource_id:
+        entry = datasource_registry.get(request.datasource_id)
+        if entry is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"未知的数据源ID: {request.datasource_id}，请重新注册"
+            )
+        return entry.datasource
+    if request.datasource is None:
+        raise HTTPException(status_code=422, detail="需要提供datasource或datasource_id")
+    return DataSource(
+        name=request.datasource.name,
+        description=request.datasource.description,
+        schema=request.datasource.schema,
+        example_data=request.datasource.example_data,
+        special_fields=request.datasource.special_fields
+    )
+
+class FastJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# 响应体超过该字节数时按Accept-Encoding进行br/gzip压缩
+COMPRESS_MIN_BYTES = int(os.getenv("INSIGHT_COMPRESS_MIN_BYTES", "1024"))
+
 app = FastAPI(
     title="Data Insight API",
     description="""
@@ -157,7 +294,8 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 
@@ -170,9 +308,112 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有头
 )
 
+# 添加响应压缩中间件（SSE流不压缩）
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
 
-@app.post("/generate/schema", 
+# 统计正在处理的请求数（供/metrics输出）
+metrics.install(app)
+
+# 请求级根span（INSIGHT_TRACING=jsonl|otlp时启用），包含请求体解析等框架耗时
+if tracer.enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+
+
+@app.on_event("startup")
+async def warm_up_llm_clients():
+    """INSIGHT_PREWARM=1时在后台线程预热LLM客户端、链和SQL校验器，不阻塞服务开始接收请求"""
+    if PREWARM:
+        threading.Thread(target=prewarm, name="insight-prewarm", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """关闭共享的连接池和会话快照库，并写出尚未落盘的请求日志和span"""
+    await llm_registry.aclose()
+    close_manager()
+    request_logger.close()
+    tracer.close()
+
+
+@app.post("/datasources",
     response_model=Dict[str, Any],
+    summary="注册数据源",
+    description="注册数据源并返回基于内容哈希的ID，之后的SQL/表结构请求可用datasource_id代替完整数据源",
+    responses={
+        200: {
+            "description": "成功注册数据源",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "datasource_id": "ds_3f2a9c0b1d4e5f6a7b8c9d0e",
+                        "created": True
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def register_datasource(
+    request: DataSourceModel,
+    token: str = Depends(verify_api_key)
+):
+    """
+    注册数据源接口
+
+    - **request**: 数据源信息
+    - 相同内容重复注册返回相同ID
+    """
+    entry, created = datasource_registry.register(DataSource(
+        name=request.name,
+        description=request.description,
+        schema=request.schema,
+        example_data=request.example_data,
+        special_fields=request.special_fields
+    ))
+    return {
+        "datasource_id": entry.id,
+        "created": created,
+        "prompt_bytes": entry.bytes
+    }
+
+
+@app.get("/datasources/{datasource_id}",
+    response_model=Dict[str, Any],
+    summary="查询数据源",
+    description="检查数据源ID是否仍在服务端注册（可能因容量限制被淘汰）",
+    responses={
+        401: {
+            "description": "未授权访问"
+        },
+        404: {
+            "description": "数据源ID不存在"
+        }
+    }
+)
+async def get_datasource(
+    datasource_id: str,
+    token: str = Depends(verify_api_key)
+):
+    """
+    查询数据源接口
+
+    - **datasource_id**: 注册时返回的数据源ID
+    """
+    entry = datasource_registry.get(datasource_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"未知的数据源ID: {datasource_id}")
+    return {
+        "datasource_id": entry.id,
+        "name": entry.datasource.name,
+        "description": entry.datasource.description,
+        "prompt_bytes": entry.bytes
+    }
+
+
+@app.post("/generate/schema", 
     summary="生成表结构",
     description="根据用户输入和数据源信息生成对应的表结构",
     responses={
@@ -204,23 +445,18 @@ async def generate_create_sql(
     - **request**: 表结构请求参数
     - 返回生成的表结构和会话ID
     """
+    session_id = request.session_id
+    tracer.annotate(session_id=session_id)
+    # 获取数据源（未知ID直接返回404）
+    datasource = resolve_datasource(request)
     try:
-        session_id = request.session_id
-
-        # 创建数据源
-        datasource = DataSource(
-            name=request.datasource.name,
-            description=request.datasource.description,
-            schema=request.datasource.schema,   
-            example_data=request.datasource.example_data,
-            special_fields=request.datasource.special_fields
-        )
 
         # 生成表结构
-        create_sql_result = generate_create_table_sql(
+        create_sql_result = await agenerate_create_table_sql(
             query=request.user_input,
             datasource=datasource,
-            session_id=session_id
+            session_id=session_id,
+            use_cache=request.use_cache
         )
 
         # 构建日志消息为JSON格式字符串
@@ -232,13 +468,13 @@ async def generate_create_sql(
         }
 
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.info(f"{current_time} | INFO     | __main__:generate_create_sql:0 - Schema generation request\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.info("generate_create_sql", "Schema generation request", log_data)
 
-        return {
+        # 直接返回响应对象，跳过FastAPI对返回值的逐字段编码
+        return FastJSONResponse({
             "create_sql_result": create_sql_result,
             "session_id": session_id
-        }
+        })
 
     except Exception as e:
         # 构建错误日志消息为JSON格式字符串
@@ -250,8 +486,7 @@ async def generate_create_sql(
         }
 
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.error(f"{current_time} | ERROR    | __main__:generate_schema:0 - Schema generation failed\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.error("generate_create_sql", "Schema generation failed", log_data)
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -259,7 +494,6 @@ async def generate_create_sql(
 
 
 @app.post("/generate/sql", 
-    response_model=Dict[str, Any],
     summary="生成SQL查询",
     description="根据用户输入和数据源信息生成对应的SQL查询语句",
     responses={
@@ -292,23 +526,18 @@ async def generate_sql_query(
     - **request**: SQL请求参数
     - 返回生成的SQL查询和会话ID
     """
+    session_id = request.session_id
+    tracer.annotate(session_id=session_id)
+    # 获取数据源（未知ID直接返回404）
+    datasource = resolve_datasource(request)
     try:
-        session_id = request.session_id
-     
-        # 创建数据源
-        datasource = DataSource(
-            name=request.datasource.name,
-            description=request.datasource.description,
-            schema=request.datasource.schema,
-            example_data=request.datasource.example_data,
-            special_fields=request.datasource.special_fields
-        )
 
         # 生成SQL查询
-        sql_result = generate_sql(
+        sql_result = await agenerate_sql(
             query=request.user_input,
             datasource=datasource,
-            session_id=session_id
+            session_id=session_id,
+            use_cache=request.use_cache
         )
     
         # 构建日志消息为JSON格式字符串
@@ -320,13 +549,12 @@ async def generate_sql_query(
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.info(f"{current_time} | INFO     | __main__:generate_sql_query:0 - SQL generation request\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.info("generate_sql_query", "SQL generation request", log_data)
 
-        return {
+        return FastJSONResponse({
             "sql": sql_result,
             "session_id": session_id
-        }
+        })
 
     except Exception as e:
         # 构建错误日志消息为JSON格式字符串
@@ -338,13 +566,11 @@ async def generate_sql_query(
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.error(f"{current_time} | ERROR    | __main__:generate_sql_query:0 - SQL generation failed\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.error("generate_sql_query", "SQL generation failed", log_data)
         
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate/chart",
-    response_model=Dict[str, Any],
     summary="生成图表配置",
     description="根据用户输入和数据生成对应的图表配置",
     responses={
@@ -377,48 +603,347 @@ async def generate_chart(
     - **request**: 图表请求参数
     - 返回生成的图表配置和会话ID
     """
+    check_sample_strategy(request.sample_strategy)
+    return await run_chart_generation(
+        request.session_id,
+        request.user_input,
+        request.data,
+        request.sample_strategy,
+        "generate_chart"
+    )
+
+
+async def run_chart_generation(
+    session_id: str,
+    user_input: str,
+    data,
+    sample_strategy: Optional[str],
+    log_name: str
+) -> FastJSONResponse:
+    """生成图表配置并记录日志，供行式、列式和NDJSON接口共用"""
+    tracer.annotate(session_id=session_id, rows=len(data))
     try:
-        session_id = request.session_id
-    
         # 生成图表配置
-        chart_config = generate_chart_config(
-            data=request.data,
-            query=request.user_input,
-            session_id=session_id
+        chart_config = await agenerate_chart_config(
+            data=data,
+            query=user_input,
+            session_id=session_id,
+            sample_strategy=sample_strategy
         )
         
         # 构建日志消息为JSON格式字符串
         log_data = {
             "session_id": session_id,
-            "user_input": request.user_input,
+            "user_input": user_input,
+            "rows": len(data),
             "chart_config": chart_config,
             "status": "success"
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.info(f"{current_time} | INFO     | __main__:generate_chart:0 - Chart generation request\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.info(log_name, "Chart generation request", log_data)
         
-        return {
+        return FastJSONResponse({
             "chart_config": chart_config,
             "session_id": session_id
-        }
+        })
 
     except Exception as e:
         # 构建错误日志消息为JSON格式字符串
         log_data = {
             "session_id": session_id,
-            "user_input": request.user_input,
+            "user_input": user_input,
             "error": str(e),
             "status": "failed"
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.error(f"{current_time} | ERROR    | __main__:generate_chart:0 - Chart generation failed\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.error(log_name, "Chart generation failed", log_data)
         
         raise HTTPException(status_code=500, detail=str(e))
 
+
+COLUMNAR_EXAMPLE = {
+    "session_id": EXAMPLE_CHART_REQUEST["session_id"],
+    "user_input": EXAMPLE_CHART_REQUEST["user_input"],
+    "columns": ["category", "price"],
+    "values": [["服装", "电子产品"], [500.00, 299.99]]
+}
+
+
+async def run_payload(payload: ChartPayload, log_name: str) -> FastJSONResponse:
+    """校验并执行列式/NDJSON请求"""
+    check_sample_strategy(payload.sample_strategy)
+    return await run_chart_generation(
+        payload.session_id,
+        payload.user_input,
+        payload.data,
+        payload.sample_strategy,
+        log_name
+    )
+
+
+@app.post("/generate/chart/columnar",
+    summary="生成图表配置（列式数据）",
+    description="与 /generate/chart 相同，但数据以列式JSON提交（columns + values），跳过逐单元格的Pydantic校验，适合大数据量",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"example": COLUMNAR_EXAMPLE}}
+        }
+    },
+    responses={
+        401: {
+            "description": "未授权访问"
+        },
+        422: {
+            "description": "请求体格式错误"
+        },
+        500: {
+            "description": "服务器内部错误"
+        }
+    }
+)
+async def generate_chart_columnar(
+    raw: Request,
+    token: str = Depends(verify_api_key)
+):
+    """
+    列式图表配置接口
+
+    - **columns**: 列名列表
+    - **values**: 每列一个数组，与columns一一对应
+    """
+    try:
+        payload = parse_columnar(await raw.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await run_payload(payload, "generate_chart_columnar")
+
+
+@app.post("/generate/chart/ndjson",
+    summary="生成图表配置（NDJSON流式上传）",
+    description="第一行为请求头对象（session_id、user_input、可选columns），之后每行一条数据（数组或对象），边接收边解析为列式数据",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"session_id": "abc123", "user_input": "展示各类别价格", "columns": ["category", "price"]}\n["服装", 500.0]\n["电子产品", 299.99]\n'
+                }
+            }
+        }
+    },
+    responses={
+        401: {
+            "description": "未授权访问"
+        },
+        422: {
+            "description": "请求体格式错误"
+        },
+        500: {
+            "description": "服务器内部错误"
+        }
+    }
+)
+async def generate_chart_ndjson(
+    raw: Request,
+    token: str = Depends(verify_api_key)
+):
+    """
+    NDJSON图表配置接口
+
+    - 请求体按行流式解析，不需要把整个请求体读入内存后再解析
+    """
+    parser = NDJSONChartParser()
+    try:
+        async for chunk in raw.stream():
+            parser.feed(chunk)
+        payload = parser.close()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await run_payload(payload, "generate_chart_ndjson")
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # 禁止反向代理缓冲，保证首字节尽快到达
+}
+
+
+async def stream_events(events, build_result, log_name: str, log_data: Dict[str, Any]):
+    """
+    将生成器事件转换为SSE：partial事件原样转发，result事件按非流式接口的格式封装
+
+    - **events**: ("partial" | "result", dict) 事件的异步生成器
+    - **build_result**: 将最终结果封装为与非流式接口相同的响应体
+    """
+    try:
+        async for event, payload in events:
+            if event == "partial":
+                yield format_sse("partial", payload)
+                continue
+
+            result = build_result(payload)
+            log_data = {**log_data, "result": payload, "status": "success"}
+            request_logger.info(log_name, "Streaming request", log_data)
+            yield format_sse("result", result)
+
+    except Exception as e:
+        log_data = {**log_data, "error": str(e), "status": "failed"}
+        request_logger.error(log_name, "Streaming request failed", log_data)
+        yield format_sse("error", {"detail": str(e)})
+
+
+@app.post("/generate/sql/stream",
+    summary="流式生成SQL查询",
+    description="以SSE流式返回SQL生成过程中的部分结构化结果，最后返回与 /generate/sql 相同的结果",
+    responses={
+        200: {
+            "description": "SSE事件流：partial（部分结果）、result（最终结果）、error（错误）",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: partial\ndata: {"sql":"SELECT"}\n\nevent: result\ndata: {"sql":{"query":"SELECT * FROM table","explanation":"..."},"session_id":"abc123"}\n\n'
+                }
+            }
+        },
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def generate_sql_query_stream(
+    request: SQLRequest,
+    token: str = Depends(verify_api_key)
+):
+    """
+    流式生成SQL查询接口
+
+    - **request**: SQL请求参数
+    - 先推送部分结果（sql先于explanation），最后推送完整结果
+    """
+    session_id = request.session_id
+    datasource = resolve_datasource(request)
+    events = astream_sql(
+        query=request.user_input,
+        datasource=datasource,
+        session_id=session_id,
+        use_cache=request.use_cache
+    )
+    return StreamingResponse(
+        stream_events(
+            events,
+            lambda sql_result: {"sql": sql_result, "session_id": session_id},
+            "generate_sql_query_stream",
+            {"session_id": session_id, "user_input": request.user_input}
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@app.post("/generate/chart/stream",
+    summary="流式生成图表配置",
+    description="以SSE流式返回图表配置的部分结果，最后返回与 /generate/chart 相同的结果",
+    responses={
+        200: {
+            "description": "SSE事件流：partial（部分结果）、result（最终结果）、error（错误）",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: partial\ndata: {"type":"bar","xKey":"category"}\n\nevent: result\ndata: {"chart_config":{"config":{"type":"bar"}},"session_id":"abc123"}\n\n'
+                }
+            }
+        },
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def generate_chart_stream(
+    request: ChartRequest,
+    token: str = Depends(verify_api_key)
+):
+    """
+    流式生成图表配置接口
+
+    - **request**: 图表请求参数
+    - 先推送部分结果（type/xKey/yKeys先于takeaway），最后推送完整结果
+    """
+    check_sample_strategy(request.sample_strategy)
+    session_id = request.session_id
+    events = astream_chart_config(
+        data=request.data,
+        query=request.user_input,
+        session_id=session_id,
+        sample_strategy=request.sample_strategy
+    )
+    return StreamingResponse(
+        stream_events(
+            events,
+            lambda chart_config: {"chart_config": chart_config, "session_id": session_id},
+            "generate_chart_stream",
+            {"session_id": session_id, "user_input": request.user_input}
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.post("/generate/chart/batch",
+    summary="批量生成图表配置",
+    description="一次请求生成多个图表（如看板的多个区块），以有限并发执行，每完成一个就通过SSE推送",
+    responses={
+        200: {
+            "description": "SSE事件流：item（单个结果或错误）、done（汇总）",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: item\ndata: {"index":1,"session_id":"s2","chart_config":{"config":{"type":"bar"}}}\n\nevent: item\ndata: {"index":0,"session_id":"s1","error":"..."}\n\nevent: done\ndata: {"total":2,"succeeded":1,"failed":1}\n\n'
+                }
+            }
+        },
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def generate_chart_batch(
+    request: ChartBatchRequest,
+    token: str = Depends(verify_api_key)
+):
+    """
+    批量生成图表配置接口
+
+    - **request**: 批量图表请求参数
+    - 每个图表完成后立即推送，单个失败不影响其他图表
+    """
+    items = [
+        {"data": item.data, "query": item.user_input, "session_id": item.session_id}
+        for item in request.items
+    ]
+
+    async def events():
+        succeeded = failed = 0
+        async for index, chart_config, error in agenerate_chart_configs(items, request.max_concurrency):
+            session_id = items[index]["session_id"]
+            if error is None:
+                succeeded += 1
+                yield format_sse("item", {"index": index, "session_id": session_id, "chart_config": chart_config})
+            else:
+                failed += 1
+                log_data = {
+                    "session_id": session_id,
+                    "user_input": items[index]["query"],
+                    "error": str(error),
+                    "status": "failed"
+                }
+                request_logger.error("generate_chart_batch", "Batch item failed", log_data)
+                yield format_sse("item", {"index": index, "session_id": session_id, "error": str(error)})
+
+        log_data = {"total": len(items), "succeeded": succeeded, "failed": failed}
+        request_logger.info("generate_chart_batch", "Batch chart generation request", log_data)
+        yield format_sse("done", log_data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @app.get("/messages/{session_id}",
     summary="获取会话消息",
     description="获取指定会话ID的所有历史消息记录",
@@ -444,12 +969,14 @@ async def generate_chart(
 )
 async def get_session_messages(
     session_id: str, 
+    compact: bool = False,
     token: str = Depends(verify_api_key)
 ):
     """
     获取会话消息接口
     
     - **session_id**: 会话ID
+    - **compact**: 为true时每条消息只返回type和content，长会话序列化更快
     - 返回SQL消息和图表消息列表
     """
     try:
@@ -460,14 +987,13 @@ async def get_session_messages(
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.info(f"{current_time} | INFO     | __main__:get_session_messages:0 - Retrieving messages\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.info("get_session_messages", "Retrieving messages", log_data)
         
         sql_messages, chart_messages = get_messages(session_id)
-        return {
-            "sql_messages": [msg.model_dump() for msg in sql_messages],
-            "chart_messages": [msg.model_dump() for msg in chart_messages]
-        }
+        return FastJSONResponse({
+            "sql_messages": message_dicts(sql_messages, compact),
+            "chart_messages": message_dicts(chart_messages, compact)
+        })
     except Exception as e:
         # 构建错误日志消息为JSON格式字符串
         log_data = {
@@ -477,14 +1003,169 @@ async def get_session_messages(
         }
         
         # 输出结构化日志
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        logger.error(f"{current_time} | ERROR    | __main__:get_session_messages:0 - Error retrieving messages\n{json.dumps(log_data, indent=2, ensure_ascii=False)}")
+        request_logger.error("get_session_messages", "Error retrieving messages", log_data)
         
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats/llm",
+    summary="获取LLM连接池统计",
+    description="获取共享LLM客户端的连接池与连接复用统计",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_llm_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取LLM连接池统计接口
+
+    - 返回请求数、新建连接数、连接复用率等统计信息
+    """
+    return llm_registry.get_stats()
+
+@app.get("/stats/cache",
+    summary="获取响应缓存统计",
+    description="获取SQL与表结构响应缓存的命中率统计以及已注册数据源的统计",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_cache_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取响应缓存统计接口
+
+    - 返回缓存条目数、命中/未命中次数和命中率，以及数据源注册表统计
+    """
+    return {
+        **response_cache.get_stats(),
+        "datasources": datasource_registry.get_stats()
+    }
+
+@app.get("/stats/intent",
+    summary="获取本地意图分类统计",
+    description="获取本地意图分类器的命中率以及与LLM判断的一致率",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_intent_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取本地意图分类统计接口
+
+    - 返回本地命中次数、LLM回退次数、命中率和一致率
+    """
+    return intent_stats.get_stats()
+
+@app.get("/stats/tokens",
+    summary="获取token用量统计",
+    description="按阶段获取提示词token、模型侧前缀缓存命中token和输出token，以及缓存命中率",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_token_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取token用量统计接口
+
+    - 返回每个阶段的调用次数、提示词token、缓存命中token和命中率
+    """
+    return token_usage.get_stats()
+
+@app.get("/stats/sql",
+    summary="获取SQL本地校验统计",
+    description="获取生成SQL的本地校验耗时、首次通过次数以及自动修复次数",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_sql_validation_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取SQL本地校验统计接口
+
+    - 返回校验次数、平均耗时、首次通过、修复成功/失败次数和修复调用次数
+    """
+    return sql_validation_stats.get_stats()
+
+@app.get("/stats/sessions",
+    summary="获取会话统计",
+    description="获取会话存储（常驻会话数、估算字节数、淘汰次数）、推测式SQL生成以及会话级串行化与重复请求合并的统计",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_session_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取会话统计接口
+
+    - 返回会话存储计数以及推测式SQL生成的采用/丢弃次数
+    """
+    return get_manager_stats()
+
+@app.get("/stats/logging",
+    summary="获取请求日志统计",
+    description="获取请求日志队列的入队、写出、丢弃（队列满时丢弃最旧记录）、采样跳过和写入失败次数",
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_logging_stats(
+    token: str = Depends(verify_api_key)
+):
+    """
+    获取请求日志统计接口
+
+    - 返回入队/写出/丢弃/采样跳过次数以及当前积压的记录数
+    """
+    return request_logger.get_stats()
+
+@app.get("/metrics",
+    summary="Prometheus指标",
+    description="以Prometheus文本格式输出各阶段耗时直方图、LLM token数、缓存命中、进行中请求数和会话数",
+    response_class=Response,
+    responses={
+        401: {
+            "description": "未授权访问"
+        }
+    }
+)
+async def get_metrics(
+    token: str = Depends(verify_api_key)
+):
+    """
+    Prometheus指标接口
+
+    - 返回text/plain格式的指标；AI_METRICS=off或未随服务部署ai_service时为空
+    """
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     # 输出启动日志
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    logger.info(f"{current_time} | INFO     | __main__:<module>:0 - Starting Insight API server")
+    get_logger().info(f"{current_time} | INFO     | __main__:<module>:0 - Starting Insight API server")
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,68 @@
+"""
+Load test: throughput of blocking vs. async generation under concurrent requests.
+
+The LLM chains are replaced by fakes that wait a fixed latency (time.sleep for
+invoke, asyncio.sleep for ainvoke), so the numbers isolate how well the event
+loop overlaps in-flight requests.
+
+Usage (from insight/core):
+    python benchmarks/bench_async_concurrency.py [latency_seconds]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+os.environ.setdefault("BASE_MODEL_NAME", "deepseek-chat")
+
+from chainCache import chain_cache  # noqa: E402
+from dataVisualizer import SQLQueryOutput  # noqa: E402
+from dataVisualizerManager import DataVisualizerManager  # noqa: E402
+from interfaces import DataSource  # noqa: E402
+from test_data import EXAMPLE_DATASOURCE  # noqa: E402
+
+
+class FakeSQLChain:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def _result(self):
+        return SQLQueryOutput(sql="SELECT 1", explanation="fake")
+
+    def invoke(self, inputs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+async def run(concurrency: int, use_async: bool, datasource: DataSource) -> float:
+    manager = DataVisualizerManager()
+
+    async def one(i: int):
+        # Each request is a new session, so intent short-circuits to "yes"
+        if use_async:
+            await manager.agenerate_sql("查询销售数据", datasource, session_id=f"s{i}")
+        else:
+            manager.generate_sql("查询销售数据", datasource, session_id=f"s{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+    return concurrency / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    chain_cache.override("sql", os.getenv("BASE_MODEL_NAME"), FakeSQLChain(latency))
+    datasource = DataSource(**EXAMPLE_DATASOURCE)
+
+    print(f"fake LLM latency: {latency * 1000:.0f} ms")
+    print(f"{'in-flight':>10} {'blocking rps':>14} {'async rps':>12}")
+    for concurrency in (1, 4, 16, 64):
+        blocking = asyncio.run(run(concurrency, False, datasource))
+        non_blocking = asyncio.run(run(concurrency, True, datasource))
+        print(f"{concurrency:>10} {blocking:>14.1f} {non_blocking:>12.1f}")
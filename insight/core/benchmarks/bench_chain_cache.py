@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: per-call CPU cost of building a stage chain vs. reusing the cached one.
+
+Usage (from insight/core):
+    python benchmarks/bench_chain_cache.py [iterations]
+
+No network calls are made; only prompt/schema/tool construction is timed.
+"""
+import os
+import sys
+import timeit
+from typing import List, Optional, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+os.environ.setdefault("DEEPSEEK_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BASE_MODEL_NAME", "deepseek-chat")
+
+from langchain.prompts import ChatPromptTemplate  # noqa: E402
+from pydantic import BaseModel, Field  # noqa: E402
+
+from chainCache import chain_cache  # noqa: E402
+from dataVisualizer import CHART_TEMPLATE, CHART_HUMAN_TEMPLATE  # noqa: E402
+from llmRegistry import get_llm  # noqa: E402
+
+
+def build_per_call():
+    """What generate_chart_config used to do on every request."""
+    class ChartConfigOutput(BaseModel):
+        description: str = Field(description="Describe what the chart is showing")
+        takeaway: str = Field(description="The main takeaway from the chart")
+        type: str = Field(description="Type of chart (bar, line, area, pie)")
+        title: str = Field(description="The title of the chart")
+        xKey: str = Field(description="Key for x-axis or category")
+        yKeys: List[str] = Field(description="Key(s) for y-axis values")
+        multipleLines: Optional[bool] = Field(default=False, description="For line charts: whether comparing groups of data")
+        measurementColumn: Optional[str] = Field(default=None, description="For line charts: key for quantitative y-axis column")
+        lineCategories: Optional[List[str]] = Field(default=[], description="For line charts: categories for different lines")
+        colors: Optional[Dict[str, str]] = Field(default={}, description="Mapping of data keys to color values")
+        legend: bool = Field(description="Whether to show legend")
+        explanation: str = Field(description="Explanation of the visualization")
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", CHART_TEMPLATE),
+        ("human", CHART_HUMAN_TEMPLATE)
+    ])
+    model = get_llm(os.getenv("BASE_MODEL_NAME"), temperature=0)
+    return prompt | model.with_structured_output(ChartConfigOutput)
+
+
+def cached():
+    return chain_cache.get("chart", os.getenv("BASE_MODEL_NAME"))
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cached()  # build once
+
+    per_call = timeit.timeit(build_per_call, number=iterations) / iterations
+    reused = timeit.timeit(cached, number=iterations) / iterations
+
+    print(f"iterations:           {iterations}")
+    print(f"build per call:       {per_call * 1e6:10.1f} us")
+    print(f"cached chain lookup:  {reused * 1e6:10.1f} us")
+    print(f"saved per call:       {(per_call - reused) * 1e6:10.1f} us")
+    print(f"cache stats:          {chain_cache.get_stats()}")
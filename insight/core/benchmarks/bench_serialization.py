@@ -0,0 +1,114 @@
+"""
+Benchmark: response serialization time and bytes on the wire.
+
+Builds a large /messages/{session_id} payload (message dicts shaped like
+BaseMessage.model_dump()) and a large chart response, then compares:
+
+- stdlib json (what JSONResponse does), with FastAPI's jsonable_encoder pass
+  in front of it when fastapi is installed (what a plain `return dict` costs)
+- serialization.dumps (orjson when installed)
+- raw vs gzip vs brotli body sizes (brotli when installed)
+- for /messages, building the payload from LangChain messages with the full
+  model_dump() shape vs ?compact=true (needs langchain_core)
+
+Usage (from insight/core):
+    python benchmarks/bench_serialization.py [turns]
+"""
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import compress_body, brotli  # noqa: E402
+from serialization import dumps, message_dicts, orjson  # noqa: E402
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+
+def message(kind: str, content: str) -> dict:
+    # BaseMessage.model_dump() 的字段
+    return {
+        "content": content,
+        "additional_kwargs": {},
+        "response_metadata": {},
+        "type": kind,
+        "name": None,
+        "id": None,
+        "example": False,
+    }
+
+
+def session_payload(turns: int) -> dict:
+    chart = {
+        "type": "line", "title": "Monthly revenue by region", "xKey": "month",
+        "yKeys": ["east", "north", "south"], "multipleLines": True, "measurementColumn": "revenue",
+        "lineCategories": ["east", "north", "south"],
+        "colors": {"east": "hsl(210, 70%, 60%)", "north": "hsl(150, 60%, 50%)", "south": "hsl(30, 70%, 60%)"},
+        "legend": True, "description": "各区域月度收入趋势" * 3, "takeaway": "华东区域增长最快" * 3,
+        "explanation": "折线图适合展示随时间变化的趋势，多条线用于比较各区域" * 3,
+    }
+    messages = []
+    for i in range(turns):
+        messages.append(message("human", f"第{i}轮：按区域展示最近12个月的收入，改用折线图"))
+        messages.append(message("ai", str(chart)))
+    return {"sql_messages": [], "chart_messages": messages}
+
+
+def chart_payload(rows: int) -> dict:
+    return {
+        "chart_config": {"config": {"type": "bar", "title": "Sales", "xKey": "category", "yKeys": ["sales"]}},
+        "data": [{"category": f"c{i % 50}", "month": f"2024-{i % 12 + 1:02d}", "sales": i * 1.25} for i in range(rows)],
+        "session_id": "bench",
+    }
+
+
+def stdlib(content):
+    if jsonable_encoder is not None:
+        content = jsonable_encoder(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def report_messages(turns: int, number: int) -> None:
+    """Time the whole /messages handler body: message objects -> dicts -> bytes."""
+    try:
+        from langchain_core.messages import AIMessage, HumanMessage
+    except ImportError:
+        print("\n/messages from BaseMessage objects: langchain_core not installed")
+        return
+    history = session_payload(turns)["chart_messages"]
+    messages = [(HumanMessage if m["type"] == "human" else AIMessage)(content=m["content"]) for m in history]
+    before = timeit.timeit(lambda: dumps({"chart_messages": [m.model_dump() for m in messages]}), number=number) / number
+    after = timeit.timeit(lambda: dumps({"chart_messages": message_dicts(messages, compact=True)}), number=number) / number
+    print(f"\n/messages from {len(messages)} BaseMessage objects")
+    print(f"  model_dump() + dumps:    {before * 1000:9.2f} ms")
+    print(f"  compact + dumps:         {after * 1000:9.2f} ms  ({before / after:.1f}x)")
+
+
+def report(name: str, content: dict, number: int) -> None:
+    baseline = timeit.timeit(lambda: stdlib(content), number=number) / number
+    fast = timeit.timeit(lambda: dumps(content), number=number) / number
+    body = dumps(content)
+    print(f"\n{name}")
+    print(f"  stdlib{' + jsonable_encoder' if jsonable_encoder else ''}: {baseline * 1000:9.2f} ms")
+    print(f"  serialization.dumps ({'orjson' if orjson else 'json'}): {fast * 1000:9.2f} ms  ({baseline / fast:.1f}x)")
+    print(f"  raw bytes:    {len(body):>10,}")
+    gz_time = timeit.timeit(lambda: gzip.compress(body, compresslevel=6), number=number) / number
+    print(f"  gzip-6 bytes: {len(compress_body(body, 'gzip')):>10,}  ({gz_time * 1000:.2f} ms)")
+    if brotli is not None:
+        br_time = timeit.timeit(lambda: compress_body(body, "br"), number=number) / number
+        print(f"  br-4 bytes:   {len(compress_body(body, 'br')):>10,}  ({br_time * 1000:.2f} ms)")
+    else:
+        print("  br: brotli not installed")
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    report(f"/messages with {turns} chart turns", session_payload(turns), number=20)
+    report_messages(turns, number=20)
+    report("20k-row JSON payload", chart_payload(20000), number=10)
@@ -0,0 +1,336 @@
+"""
+Local stand-in for the DeepSeek/OpenAI chat completions API, for offline load tests.
+
+Serves POST /chat/completions (and /v1/chat/completions) from a thread pool:
+
+- Requests that bind a tool (with_structured_output / bind_tools) get a
+  tool call whose arguments are the canned output for that tool name
+  (SQLQueryOutput, ChartConfigOutput, ...), or a filler object built from
+  the tool's JSON schema for unknown tools.
+- Latency = time to first token drawn from a distribution, plus completion
+  tokens / tokens-per-second. Streaming responses pace their chunks at that rate.
+- Usage reports prompt/completion tokens estimated at ~4 chars per token, and
+  simulates the provider prefix cache: a system prompt seen before is reported
+  as `prompt_cache_hit_tokens`.
+
+Usage (from insight/core):
+    python benchmarks/fake_llm_server.py [--port 8099] [--latency lognormal:-1.2,0.4] [--tokens-per-second 60]
+
+Then point insight at it:
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8099 DEEPSEEK_API_KEY=fake python app.py
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+# 与test_data.EXAMPLE_DATASOURCE一致，保证生成的SQL能通过本地校验
+CANNED_OUTPUTS: Dict[str, Dict[str, Any]] = {
+    "IntentOutput": {"intent": "yes", "explanation": "需要重新获取数据"},
+    "SchemaOutput": {"sql": "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR(200), price DECIMAL(10,2), category VARCHAR(50))"},
+    "SQLQueryOutput": {
+        "sql": "SELECT category, MAX(price) AS max_price FROM products GROUP BY category",
+        "explanation": "按类别分组并取每组最高价格"
+    },
+    "ChartConfigOutput": {
+        "type": "bar", "title": "各类别商品数量", "xKey": "category", "yKeys": ["stock"],
+        "multipleLines": False, "measurementColumn": None, "lineCategories": [],
+        "colors": {"stock": "hsl(210, 70%, 60%)"}, "legend": True,
+        "description": "展示各个类别的库存数量", "takeaway": "服装类库存最多",
+        "explanation": "柱状图适合比较类别之间的数量"
+    },
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a time-to-first-token distribution.
+
+    Args:
+        spec: "fixed:S", "uniform:LO,HI", "normal:MEAN,STD" or "lognormal:MU,SIGMA" (seconds)
+
+    Returns:
+        Callable[[random.Random], float]: Sampler returning a non-negative delay
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+def filler_from_schema(schema: Dict[str, Any]) -> Any:
+    """Build a minimal value that satisfies a JSON schema (for unknown tools)."""
+    kind = schema.get("type")
+    if "anyOf" in schema:
+        return filler_from_schema(schema["anyOf"][0])
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: filler_from_schema(prop) for name, prop in properties.items()}
+    if kind == "array":
+        return []
+    if kind == "boolean":
+        return False
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "null":
+        return None
+    return "fake"
+
+
+class FakeLLMServer:
+    """
+    Threaded fake chat completions server.
+
+    Args:
+        latency: Time-to-first-token spec, see parse_latency()
+        tokens_per_second: Completion token rate; 0 disables the generation delay
+        outputs: Canned tool arguments by tool name (merged over CANNED_OUTPUTS)
+        text: Reply to requests that bind no tool
+        host: Bind address
+        port: Bind port; 0 picks a free one
+        seed: RNG seed for reproducible latency draws
+    """
+
+    def __init__(
+        self,
+        latency: str = "fixed:0.05",
+        tokens_per_second: float = 0,
+        outputs: Optional[Dict[str, Dict[str, Any]]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+        text: str = "ok"
+    ):
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.outputs = {**CANNED_OUTPUTS, **(outputs or {})}
+        self.text = text
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._seen_prefixes = set()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.stream_requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _delay(self) -> float:
+        with self._rng_lock:
+            return self.sample_latency(self._rng)
+
+    def _usage(self, messages: List[Dict[str, Any]], completion: str) -> Dict[str, Any]:
+        prompt_tokens = estimate_tokens(json.dumps(messages, ensure_ascii=False))
+        system = "".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        with self._stats_lock:
+            cached = estimate_tokens(system) if system and system in self._seen_prefixes else 0
+            self._seen_prefixes.add(system)
+        completion_tokens = estimate_tokens(completion)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cached,
+            "prompt_cache_miss_tokens": prompt_tokens - cached,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def _answer(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the tool call (or plain text) answering a request."""
+        tools = body.get("tools") or []
+        if not tools:
+            return {"content": self.text}
+        function = tools[0].get("function", {})
+        choice = body.get("tool_choice")
+        if isinstance(choice, dict):
+            name = choice.get("function", {}).get("name", function.get("name"))
+        else:
+            name = function.get("name")
+        for tool in tools:
+            if tool.get("function", {}).get("name") == name:
+                function = tool["function"]
+        args = self.outputs.get(name)
+        if args is None:
+            args = filler_from_schema(function.get("parameters", {}))
+        return {"tool_name": name, "arguments": json.dumps(args, ensure_ascii=False)}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._stats_lock:
+                    server.requests += 1
+                    if body.get("stream"):
+                        server.stream_requests += 1
+
+                answer = server._answer(body)
+                completion = answer.get("arguments") or answer.get("content", "")
+                usage = server._usage(body.get("messages", []), completion)
+                time.sleep(server._delay())
+                if body.get("stream"):
+                    self._stream(body, answer, usage)
+                    return
+                if server.tokens_per_second:
+                    time.sleep(usage["completion_tokens"] / server.tokens_per_second)
+                self._send_json(200, self._completion(body, answer, usage))
+
+            def _message(self, answer: Dict[str, Any]) -> Dict[str, Any]:
+                if "tool_name" not in answer:
+                    return {"role": "assistant", "content": answer["content"]}
+                return {
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [{
+                        "id": f"call_{uuid.uuid4().hex[:24]}",
+                        "type": "function",
+                        "function": {"name": answer["tool_name"], "arguments": answer["arguments"]},
+                    }],
+                }
+
+            def _completion(self, body, answer, usage) -> Dict[str, Any]:
+                return {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model") or "deepseek-chat",
+                    "choices": [{
+                        "index": 0,
+                        "message": self._message(answer),
+                        "finish_reason": "tool_calls" if "tool_name" in answer else "stop",
+                    }],
+                    "usage": usage,
+                }
+
+            def _stream(self, body, answer, usage) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model") or "deepseek-chat",
+                }
+                text = answer.get("arguments") or answer.get("content", "")
+                # 约每4个字符一个token
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+                per_piece = (4 / server.tokens_per_second) if server.tokens_per_second else 0
+                call_id = f"call_{uuid.uuid4().hex[:24]}"
+                for i, piece in enumerate(pieces):
+                    if "tool_name" in answer:
+                        call = {"index": 0, "function": {"arguments": piece}}
+                        if i == 0:
+                            call.update({"id": call_id, "type": "function"})
+                            call["function"]["name"] = answer["tool_name"]
+                        delta = {"tool_calls": [call]}
+                    else:
+                        delta = {"content": piece}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    self._chunk({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                    if per_piece:
+                        time.sleep(per_piece)
+                finish = "tool_calls" if "tool_name" in answer else "stop"
+                self._chunk({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._chunk({**base, "choices": [], "usage": usage})
+                self._write(b"data: [DONE]\n\n")
+                self._write(b"")
+
+            def _chunk(self, payload: Dict[str, Any]) -> None:
+                self._write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+            def _write(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake DeepSeek/OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", default="lognormal:-1.2,0.4", help="time to first token, e.g. fixed:0.3")
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--outputs", help="JSON file of canned tool arguments by tool name")
+    args = parser.parse_args()
+
+    outputs = None
+    if args.outputs:
+        with open(args.outputs, encoding="utf-8") as f:
+            outputs = json.load(f)
+    server = FakeLLMServer(args.latency, args.tokens_per_second, outputs, args.host, args.port).start()
+    print(f"Fake LLM server listening on {server.url} (latency={args.latency}, {args.tokens_per_second} tok/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
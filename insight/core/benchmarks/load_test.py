@@ -0,0 +1,221 @@
+"""
+Load test: insight API throughput and latency against a local fake LLM.
+
+Starts benchmarks/fake_llm_server.py, points the LLM registry at it, serves
+app.py with uvicorn on a free local port and drives it over HTTP:
+
+1. For each scenario (/generate/sql, /generate/chart, /messages/{id}) and
+   concurrency level, runs a fixed number of requests and reports RPS and
+   p50/p95/p99 latency.
+2. Creates sessions in steps and reports process memory (RSS and traced
+   Python allocations) per resident session count.
+
+Nothing leaves the machine, so it runs in CI. Requires the app's own
+dependencies (fastapi, uvicorn, httpx, langchain).
+
+Usage (from insight/core):
+    python benchmarks/load_test.py [--concurrency 1,8,32,64] [--requests 200]
+        [--latency fixed:0.2] [--tokens-per-second 0] [--sessions 100,500,1000]
+        [--scenarios sql,chart,messages]
+"""
+import argparse
+import asyncio
+import gc
+import math
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm_server import FakeLLMServer  # noqa: E402
+
+API_KEY = "bench"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def rss_bytes() -> Optional[int]:
+    # Linux: /proc/self/statm 第二列为常驻页数
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(port: int):
+    """Serve app.py with uvicorn in a background thread."""
+    import uvicorn
+    from app import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    # 非主线程中不能安装信号处理
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, name="insight-api", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def request_factory(scenario: str):
+    from test_data import EXAMPLE_CHART_REQUEST, EXAMPLE_SQL_REQUEST
+
+    if scenario == "sql":
+        return lambda client, sid: client.post("/generate/sql", json={**EXAMPLE_SQL_REQUEST, "session_id": sid})
+    if scenario == "chart":
+        return lambda client, sid: client.post("/generate/chart", json={**EXAMPLE_CHART_REQUEST, "session_id": sid})
+    if scenario == "messages":
+        return lambda client, sid: client.get(f"/messages/{sid}")
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run_level(client, scenario: str, concurrency: int, total: int) -> Dict[str, float]:
+    """Run `total` requests with `concurrency` virtual users, one session per user."""
+    send = request_factory(scenario)
+    sessions = [f"{scenario}-c{concurrency}-u{i}" for i in range(concurrency)]
+    if scenario == "messages":
+        # 先为每个虚拟用户建立一轮对话，再压测只读接口
+        seed = request_factory("sql")
+        await asyncio.gather(*(seed(client, sid) for sid in sessions))
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def user(sid: str):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await send(client, sid)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(sid) for sid in sessions))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def measure_memory(client, steps: List[int]) -> List[Dict[str, float]]:
+    """Create sessions (one SQL + one chart turn each) and record memory at each step."""
+    from dataVisualizerManager import get_manager_stats
+
+    sql, chart = request_factory("sql"), request_factory("chart")
+    gc.collect()
+    tracemalloc.start()
+    base_rss, base_traced = rss_bytes(), tracemalloc.get_traced_memory()[0]
+    created = 0
+    rows = []
+    semaphore = asyncio.Semaphore(32)
+
+    async def new_session(i: int):
+        async with semaphore:
+            sid = f"mem-{i}"
+            await sql(client, sid)
+            await chart(client, sid)
+
+    for step in steps:
+        await asyncio.gather(*(new_session(i) for i in range(created, step)))
+        created = step
+        gc.collect()
+        rss, traced = rss_bytes(), tracemalloc.get_traced_memory()[0]
+        sessions = get_manager_stats()["sessions"]
+        rows.append({
+            "sessions": step,
+            "resident": sessions["resident"],
+            "rss_mb": (rss - base_rss) / 2**20 if rss and base_rss else float("nan"),
+            "traced_mb": (traced - base_traced) / 2**20,
+            "estimated_mb": sessions["estimated_bytes"] / 2**20,
+        })
+    tracemalloc.stop()
+    return rows
+
+
+async def main_async(args) -> None:
+    import httpx
+
+    concurrency = [int(c) for c in args.concurrency.split(",")]
+    steps = [int(s) for s in args.sessions.split(",") if s]
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    limits = httpx.Limits(max_connections=max(concurrency) + 8, max_keepalive_connections=max(concurrency) + 8)
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits, timeout=120) as client:
+        print(f"{'scenario':<10}{'conc':>6}{'reqs':>7}{'errs':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for scenario in args.scenarios.split(","):
+            for level in concurrency:
+                r = await run_level(client, scenario, level, args.requests)
+                print(f"{scenario:<10}{level:>6}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10.1f}"
+                      f"{r['p50'] * 1000:>10.1f}{r['p95'] * 1000:>10.1f}{r['p99'] * 1000:>10.1f}")
+
+        if steps:
+            print(f"\n{'sessions':>9}{'resident':>10}{'RSS +MB':>10}{'traced +MB':>12}{'estimated MB':>14}{'KB/session':>12}")
+            for row in await measure_memory(client, steps):
+                per_session = row["traced_mb"] * 1024 / row["sessions"] if row["sessions"] else 0.0
+                print(f"{row['sessions']:>9}{row['resident']:>10}{row['rss_mb']:>10.1f}{row['traced_mb']:>12.1f}"
+                      f"{row['estimated_mb']:>14.2f}{per_session:>12.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test of the insight API")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", default="sql,chart,messages")
+    parser.add_argument("--sessions", default="100,500,1000", help="session counts for the memory phase")
+    parser.add_argument("--latency", default="fixed:0.2", help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    args = parser.parse_args()
+
+    fake = FakeLLMServer(args.latency, args.tokens_per_second).start()
+    os.environ["DEEPSEEK_BASE_URL"] = fake.url
+    os.environ["DEEPSEEK_API_KEY"] = "fake"
+    os.environ["BASE_MODEL_NAME"] = "deepseek-chat"
+    os.environ["API_KEY"] = API_KEY
+    os.environ["LLM_PRECONNECT"] = "0"
+
+    port = free_port()
+    server, thread = start_api(port)
+    args.base_url = f"http://127.0.0.1:{port}"
+    print(f"fake LLM at {fake.url} (latency={args.latency}), insight API at {args.base_url}\n")
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+        fake.stop()
+        print(f"\nfake LLM served {fake.requests} completions ({fake.stream_requests} streamed)")
+
+
+if __name__ == "__main__":
+    main()
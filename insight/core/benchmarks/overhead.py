@@ -0,0 +1,123 @@
+"""
+Overhead benchmark: DataVisualizer cost per request with model latency removed.
+
+Records one pass of the intent, SQL and chart stages against the local fake
+LLM server into an LLM cassette (ai_service/cassette.py), then replays the
+cassette so every LLM call returns instantly. The replayed timings are pure
+application + LangChain overhead: prompt rendering, history, validation,
+structured-output parsing, metrics and tracing.
+
+Usage (from insight/core):
+    python benchmarks/overhead.py [--iterations 200] [--cassette cassettes/overhead.jsonl]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ("intent", "sql", "chart")
+# Answer of the seeded prior turn
+PRIOR_SQL = "SELECT category, MAX(price) AS max_price FROM products GROUP BY category"
+
+
+async def run_turn(timings: Dict[str, List[float]]) -> None:
+    """
+    One follow-up turn through every stage on a session seeded with the same
+    prior turn, so each replay sends identical prompts and intent reaches the LLM.
+    """
+    from dataVisualizer import DataVisualizer
+    from interfaces import DataSource
+    from test_data import EXAMPLE_CHART_DATA, EXAMPLE_CHART_REQUEST, EXAMPLE_DATASOURCE, EXAMPLE_REQUEST
+
+    visualizer = DataVisualizer(session_id="overhead")
+    datasource = DataSource(**EXAMPLE_DATASOURCE)
+    # 首轮意图不调用LLM，先写入一轮历史；追问选用本地分类器不确定的问题
+    visualizer._append_turn("intent", EXAMPLE_REQUEST["user_input"], "yes")
+    visualizer._append_turn("sql", EXAMPLE_REQUEST["user_input"], PRIOR_SQL)
+    query = EXAMPLE_CHART_REQUEST["user_input"]
+    assert visualizer.intent_needs_llm(query), "intent would be answered locally; pick another follow-up"
+    calls = {
+        "intent": lambda: visualizer.agenerate_intent(query),
+        "sql": lambda: visualizer.agenerate_sql(query, datasource, use_cache=False),
+        "chart": lambda: visualizer.agenerate_chart_config(EXAMPLE_CHART_DATA, query),
+    }
+    for stage in STAGES:
+        start = time.perf_counter()
+        await calls[stage]()
+        timings[stage].append(time.perf_counter() - start)
+
+
+async def run_turns(timings: Dict[str, List[float]], iterations: int) -> None:
+    for _ in range(iterations):
+        await run_turn(timings)
+
+
+def measure(mode: str, cassette_path: str, iterations: int) -> Dict[str, object]:
+    """
+    Run `iterations` turns with LLM traffic recorded to or replayed from a cassette.
+
+    Args:
+        mode: "record" or "replay"
+        cassette_path: Cassette file shared by both modes
+        iterations: Number of turns
+
+    Returns:
+        Dict with per-stage timings in seconds and the cassette stats
+    """
+    import llmRegistry
+    from cassette import cassette_transports
+    from chainCache import chain_cache
+
+    transports = cassette_transports(mode, cassette_path)
+    registry = llmRegistry.LLMClientRegistry(transports=transports)
+    previous = llmRegistry.llm_registry
+    # 链缓存持有旧客户端，切换注册表前后都要清空
+    llmRegistry.llm_registry = registry
+    chain_cache.clear()
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    try:
+        asyncio.run(run_turns(timings, iterations))
+    finally:
+        llmRegistry.llm_registry = previous
+        chain_cache.clear()
+        registry.close()
+    return {"timings": timings, "cassette": transports[0].cassette.get_stats()}
+
+
+def main() -> None:
+    from fake_llm_server import FakeLLMServer
+
+    parser = argparse.ArgumentParser(description="DataVisualizer overhead with LLM latency replayed away")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--cassette", default="cassettes/overhead.jsonl")
+    parser.add_argument("--rerecord", action="store_true", help="record again even if the cassette exists")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DEEPSEEK_API_KEY", "fake")
+    os.environ.setdefault("BASE_MODEL_NAME", "deepseek-chat")
+    if args.rerecord or not os.path.exists(args.cassette):
+        if os.path.exists(args.cassette):
+            os.remove(args.cassette)
+        with FakeLLMServer(latency="fixed:0") as fake:
+            os.environ["DEEPSEEK_BASE_URL"] = fake.url
+            measure("record", args.cassette, 1)
+    os.environ.setdefault("DEEPSEEK_BASE_URL", "http://127.0.0.1:9/v1")
+
+    # 第一轮包含链构建和导入开销，不计入
+    measure("replay", args.cassette, 1)
+    result = measure("replay", args.cassette, args.iterations)
+    print(f"{'stage':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, values in result["timings"].items():
+        ordered = sorted(values)
+        print(f"{stage:<8}{sum(values) / len(values) * 1000:>10.2f}"
+              f"{ordered[len(ordered) // 2] * 1000:>10.2f}{ordered[int(len(ordered) * 0.95)] * 1000:>10.2f}")
+    print(f"\ncassette: {result['cassette']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# Cache of compiled prompt | structured-output chains, built once per (stage, model)
+import threading
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from llmRegistry import get_llm
+from tokenUsage import extract_usage, token_usage
+from tracing import tracer
+
+if TYPE_CHECKING:
+    # 提示模板和Runnable模块在首次构建链时才导入，缩短冷启动时的导入耗时
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import Runnable
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """
+    Static definition of a generation stage. `template` is the system message and
+    should only contain session-independent text so it forms a stable prompt
+    prefix; per-request variables belong in `human_template`.
+    """
+    name: str
+    template: str
+    output_model: Type[BaseModel]
+    temperature: float = 0
+    human_template: str = "{query}"
+
+
+def _parsed_with_usage(stage: str, output: Dict[str, Any]) -> BaseModel:
+    # with_structured_output(include_raw=True) -> {"raw", "parsed", "parsing_error"}
+    token_usage.record(stage, output.get("raw"))
+    if output.get("parsing_error") is not None:
+        raise output["parsing_error"]
+    return output["parsed"]
+
+
+def _usage_tap(stage: str) -> "Runnable":
+    from langchain_core.runnables import RunnableGenerator
+
+    # 透传流式消息块，并记录最后一个块携带的token用量
+    def transform(chunks):
+        for chunk in chunks:
+            token_usage.record(stage, chunk)
+            yield chunk
+
+    async def atransform(chunks):
+        async for chunk in chunks:
+            token_usage.record(stage, chunk)
+            yield chunk
+
+    return RunnableGenerator(transform, atransform)
+
+
+def _traced_step(name: str, runnable: "Runnable", usage: bool = False) -> "Runnable":
+    """
+    Wrap one chain step in a tracing span. With usage=True the step's raw
+    AIMessage token counts are attached to the span.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    def annotate(span, output) -> None:
+        if usage and isinstance(output, dict):
+            span.set_attributes(extract_usage(output.get("raw")) or {})
+
+    def invoke(inputs, config=None):
+        with tracer.span(name) as span:
+            output = runnable.invoke(inputs, config)
+            annotate(span, output)
+            return output
+
+    async def ainvoke(inputs, config=None):
+        with tracer.span(name) as span:
+            output = await runnable.ainvoke(inputs, config)
+            annotate(span, output)
+            return output
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+
+class ChainCache:
+    """
+    Builds `prompt | llm.with_structured_output(...)` chains once and reuses them.
+    Parsing the template and generating the JSON schema / tool definition for the
+    output model only happens on the first call for each (stage, model). Chains
+    record the provider's token usage (including cached prompt tokens) per stage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageSpec] = {}
+        self._chains: Dict[Tuple[str, Optional[str], bool], "Runnable"] = {}
+        self.builds = 0
+        self.hits = 0
+
+    def register_stage(self, spec: StageSpec) -> None:
+        """Register (or replace) a stage definition and drop its compiled chains."""
+        with self._lock:
+            self._stages[spec.name] = spec
+            for key in [k for k in self._chains if k[0] == spec.name]:
+                del self._chains[key]
+
+    def _prompt(self, spec: StageSpec) -> "ChatPromptTemplate":
+        from langchain_core.prompts import ChatPromptTemplate
+
+        return ChatPromptTemplate.from_messages([
+            ("system", spec.template),
+            ("human", spec.human_template)
+        ])
+
+    def _build(self, spec: StageSpec, model_name: Optional[str]) -> "Runnable":
+        from langchain_core.runnables import RunnableLambda
+
+        model = get_llm(model_name, temperature=spec.temperature)
+        # include_raw 保留原始AIMessage，用于读取token用量和缓存命中数
+        structured = model.with_structured_output(spec.output_model, include_raw=True)
+        prompt = self._prompt(spec)
+        parse = RunnableLambda(partial(_parsed_with_usage, spec.name))
+        if tracer.enabled:
+            # 分别记录提示渲染、LLM调用（网络等待+工具参数解析）和结果解析的耗时
+            prompt = _traced_step("prompt", prompt)
+            structured = _traced_step("llm", structured, usage=True)
+            parse = _traced_step("parse", parse)
+        return prompt | structured | parse
+
+    def _build_stream(self, spec: StageSpec, model_name: Optional[str]) -> "Runnable":
+        # 与 with_structured_output 相同的工具调用，但解析器输出逐步增长的部分JSON
+        from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+
+        model = get_llm(model_name, temperature=spec.temperature)
+        tool_name = spec.output_model.__name__
+        bound = model.bind_tools([spec.output_model], tool_choice=tool_name)
+        parser = JsonOutputKeyToolsParser(key_name=tool_name, first_tool_only=True)
+        return self._prompt(spec) | bound | _usage_tap(spec.name) | parser
+
+    def get(self, stage: str, model_name: Optional[str] = None) -> "Runnable":
+        """
+        Get the compiled chain for a stage and model, building it on first use.
+
+        Args:
+            stage: Registered stage name (intent, schema, sql, chart)
+            model_name: Model name passed to the LLM registry
+
+        Returns:
+            Runnable: The prompt | structured-output chain
+        """
+        return self._get_or_build(stage, model_name, streaming=False)
+
+    def get_stream(self, stage: str, model_name: Optional[str] = None) -> "Runnable":
+        """
+        Get the streaming variant of a stage chain. Its astream() yields partial
+        dicts of the structured output as the tool-call arguments arrive.
+        """
+        return self._get_or_build(stage, model_name, streaming=True)
+
+    def _get_or_build(self, stage: str, model_name: Optional[str], streaming: bool) -> "Runnable":
+        key = (stage, model_name, streaming)
+        chain = self._chains.get(key)
+        if chain is not None:
+            self.hits += 1
+            return chain
+
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                if stage not in self._stages:
+                    raise ValueError(f"Unknown stage: {stage}")
+                build = self._build_stream if streaming else self._build
+                chain = build(self._stages[stage], model_name)
+                self._chains[key] = chain
+                self.builds += 1
+        return chain
+
+    def override(self, stage: str, model_name: Optional[str], chain: Any, streaming: bool = False) -> None:
+        """Install a prebuilt chain for (stage, model); used by benchmarks and tests."""
+        with self._lock:
+            self._chains[(stage, model_name, streaming)] = chain
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "stages": len(self._stages),
+            "chains": len(self._chains),
+            "builds": self.builds,
+            "hits": self.hits,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chains.clear()
+
+
+# Global chain cache shared across sessions and requests
+chain_cache = ChainCache()
@@ -0,0 +1,186 @@
+# ASGI middleware negotiating brotli/gzip response compression from Accept-Encoding
+import gzip
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只提供gzip
+    brotli = None
+
+
+DEFAULT_MINIMUM_SIZE = 1024
+# SSE必须逐事件送达，压缩缓冲会增加首字节延迟
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+def supported_encodings() -> List[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: str, available: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Pick the response encoding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Header value, e.g. "gzip, deflate, br;q=0.9"
+        available: Encodings in server preference order (defaults to br, gzip)
+
+    Returns:
+        Optional[str]: "br", "gzip" or None for identity
+    """
+    available = list(available or supported_encodings())
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        # 权重相同时按服务端偏好顺序（br优先）
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Incremental compressor with a uniform interface for gzip and brotli."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: gzip头和尾
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """Compress a complete body in one call."""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compresses HTTP responses with brotli or gzip according to Accept-Encoding.
+
+    Complete bodies smaller than minimum_size, already-encoded responses and
+    event streams are passed through. Streamed bodies are compressed chunk by
+    chunk with a sync flush so each chunk reaches the client immediately.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(self, encoding, send))
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class _CompressingSend:
+    """Wraps the ASGI send callable for one response."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Dict[str, Any]] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    def _headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = [(k, v) for k, v in self.start["headers"] if k.lower() != b"content-length"]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        vary = _header(headers, b"vary")
+        if vary is None:
+            headers.append((b"vary", b"Accept-Encoding"))
+        elif b"accept-encoding" not in vary.lower():
+            headers = [(k, v + b", Accept-Encoding" if k.lower() == b"vary" else v) for k, v in headers]
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def __call__(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = message.get("headers", [])
+            content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+            self.passthrough = (
+                _header(headers, b"content-encoding") is not None
+                or content_type.startswith(EXCLUDED_CONTENT_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        middleware = self.middleware
+
+        if self.compressor is None and not more_body:
+            # 完整响应体：小于阈值不压缩
+            if len(body) < middleware.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            compressed = compress_body(body, self.encoding, middleware.gzip_level, middleware.brotli_quality)
+            await self.send({**self.start, "headers": self._headers(len(compressed))})
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+            return
+
+        if self.compressor is None:
+            self.compressor = _Compressor(self.encoding, middleware.gzip_level, middleware.brotli_quality)
+            await self.send({**self.start, "headers": self._headers(None)})
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body, final=not more_body),
+            "more_body": more_body
+        })
@@ -0,0 +1,130 @@
+# Per-session async locks and single-flight coalescing of identical in-flight requests
+import asyncio
+import hashlib
+import json
+from contextlib import asynccontextmanager
+from dataclasses import asdict, is_dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
+
+from interfaces import ColumnarData
+
+T = TypeVar("T")
+
+# 图表数据参与请求指纹计算的抽样行数（避免对大数据集整体序列化）
+FINGERPRINT_SAMPLE_ROWS = 64
+
+
+def _jsonable(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    return value
+
+
+def request_key(*parts: Any) -> str:
+    """Stable digest of request parts (dataclasses and dicts are JSON-encoded)."""
+    raw = json.dumps([_jsonable(p) for p in parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def data_fingerprint(data: Union[List[Dict[str, Any]], ColumnarData]) -> List[Any]:
+    """
+    Cheap fingerprint of a chart payload: its length plus an evenly spaced sample
+    of rows (always including the first and last row).
+    """
+    if not len(data):
+        return [0]
+    step = max(1, len(data) // FINGERPRINT_SAMPLE_ROWS)
+    if isinstance(data, ColumnarData):
+        return [len(data), data.columns, [values[::step] + values[-1:] for values in data.values]]
+    sample = data[::step]
+    return [len(data), sample, data[-1]]
+
+
+class SessionLocks:
+    """One asyncio.Lock per session_id, dropped once no request holds or waits on it."""
+
+    def __init__(self):
+        self._locks: Dict[str, List[Any]] = {}  # session_id -> [lock, refcount]
+        self.contended = 0
+
+    @asynccontextmanager
+    async def hold(self, session_id: Optional[str]):
+        if not session_id:
+            yield
+            return
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        if entry[0].locked():
+            self.contended += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the
+    computation, later callers with the same key await the same result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 一个调用方取消不会取消其他调用方共享的计算
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class RequestCoordinator:
+    """Serializes work per session and coalesces identical in-flight requests."""
+
+    def __init__(self):
+        self.locks = SessionLocks()
+        self.single_flight = SingleFlight()
+
+    async def run(self, session_id: Optional[str], key: Optional[str], fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn under the session lock; when key is given, identical concurrent
+        calls share a single execution.
+        """
+        async def locked() -> T:
+            async with self.locks.hold(session_id):
+                return await fn()
+
+        if key is None or not session_id:
+            return await locked()
+        return await self.single_flight.do(key, locked)
+
+    def get_stats(self) -> Dict[str, Any]:
+        executed = self.single_flight.executed
+        coalesced = self.single_flight.coalesced
+        return {
+            "executed": executed,
+            "coalesced": coalesced,
+            "coalesced_rate": round(coalesced / (executed + coalesced), 4) if executed + coalesced else 0.0,
+            "inflight": len(self.single_flight),
+            "locked_sessions": len(self.locks),
+            "lock_contended": self.locks.contended,
+        }
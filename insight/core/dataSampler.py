@@ -0,0 +1,265 @@
+"""
+Representative row sampling of chart data.
+
+The column profile (dataProfiler) tells the model what each column looks like;
+a handful of concrete rows shows how they combine. Instead of the first rows,
+which for time-ordered data are only the earliest points, the chart prompt
+gets rows picked by a pluggable strategy:
+
+- reservoir: uniform random rows (Vitter's Algorithm L, which jumps over the
+  list instead of drawing a random number per row)
+- stratified: rows from every value of a low-cardinality categorical column
+- first_last_extremes: first and last rows plus the rows holding the min/max
+  of each numeric column
+
+Strategies work on column arrays (see dataProfiler.to_columns or
+ColumnarData), make one pass over the payload at most, keep a bounded amount
+of state, and return row indices in original order. A fixed seed makes the
+sample deterministic, so identical payloads yield identical prompts.
+"""
+import json
+import math
+import os
+import random
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from dataProfiler import to_columns
+from interfaces import ColumnarData
+
+
+DEFAULT_STRATEGY = os.getenv("INSIGHT_SAMPLE_STRATEGY", "first_last_extremes")
+DEFAULT_MAX_ROWS = int(os.getenv("INSIGHT_SAMPLE_ROWS", "20"))
+# 样本在提示词中的字符预算（约等于token预算的2-4倍）
+DEFAULT_MAX_CHARS = int(os.getenv("INSIGHT_SAMPLE_CHARS", "4000"))
+DEFAULT_SEED = int(os.getenv("INSIGHT_SAMPLE_SEED", "0"))
+# 选择分层列时扫描的行数
+STRATIFY_SCAN_ROWS = 1000
+MAX_VALUE_CHARS = 40
+
+Columns = Dict[str, List[Any]]
+# sampler(columns, max_rows, rng) -> sorted row indices
+Sampler = Callable[[Columns, int, random.Random], List[int]]
+
+SAMPLERS: Dict[str, Sampler] = {}
+
+
+def register_sampler(name: str, sampler: Sampler) -> None:
+    """Register (or replace) a sampling strategy under a name."""
+    SAMPLERS[name] = sampler
+
+
+def _uniform(rng: random.Random) -> float:
+    # random() 可能返回0，log(0)会报错
+    return rng.random() or 5e-324
+
+
+def _num_rows(columns: Columns) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def reservoir_sample(columns: Columns, max_rows: int, rng: random.Random) -> List[int]:
+    """Uniform sample of row indices using Algorithm L (O(k log(n/k)) random draws)."""
+    n = _num_rows(columns)
+    if n <= max_rows:
+        return list(range(n))
+    reservoir = list(range(max_rows))
+    w = math.exp(math.log(_uniform(rng)) / max_rows)
+    i = max_rows - 1
+    while True:
+        i += math.floor(math.log(_uniform(rng)) / math.log(1 - w)) + 1
+        if i >= n:
+            break
+        reservoir[rng.randrange(max_rows)] = i
+        w *= math.exp(math.log(_uniform(rng)) / max_rows)
+    return sorted(reservoir)
+
+
+def pick_stratify_column(columns: Columns, max_rows: int) -> Optional[str]:
+    """
+    Choose the string column whose distinct count (over the first rows) is the
+    largest that still fits in max_rows, so every stratum can be shown.
+    """
+    best, best_distinct = None, 1
+    for key, column in columns.items():
+        values = column[:STRATIFY_SCAN_ROWS]
+        if not all(isinstance(v, str) for v in values if v is not None):
+            continue
+        distinct = len(set(values))
+        if best_distinct < distinct <= max_rows:
+            best, best_distinct = key, distinct
+    return best
+
+
+def stratified_sample(
+    columns: Columns,
+    max_rows: int,
+    rng: random.Random,
+    column: Optional[str] = None
+) -> List[int]:
+    """
+    Per-stratum reservoirs in a single pass, then round-robin allocation of the
+    row budget so that every category appears. Falls back to reservoir sampling
+    when no suitable categorical column exists or there are too many strata.
+    """
+    n = _num_rows(columns)
+    if n <= max_rows:
+        return list(range(n))
+    column = column or pick_stratify_column(columns, max_rows)
+    if column is None:
+        return reservoir_sample(columns, max_rows, rng)
+
+    reservoirs: Dict[Any, List[int]] = {}
+    seen: Dict[Any, int] = {}
+    for i, key in enumerate(columns[column]):
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        if count == 1 and len(seen) > max_rows:
+            # 分层数超出预算，无法保证每层都有代表
+            return reservoir_sample(columns, max_rows, rng)
+        bucket = reservoirs.setdefault(key, [])
+        if count <= max_rows:
+            bucket.append(i)
+        else:
+            j = rng.randrange(count)
+            if j < max_rows:
+                bucket[j] = i
+
+    chosen: List[int] = []
+    buckets = [sorted(bucket) for bucket in reservoirs.values()]
+    depth = 0
+    while len(chosen) < max_rows:
+        added = False
+        for bucket in buckets:
+            if depth < len(bucket) and len(chosen) < max_rows:
+                chosen.append(bucket[depth])
+                added = True
+        if not added:
+            break
+        depth += 1
+    return sorted(chosen)
+
+
+def first_last_extremes_sample(columns: Columns, max_rows: int, rng: random.Random) -> List[int]:
+    """
+    First and last rows plus the argmin/argmax row of each numeric column.
+    Each column's extremes are located in a single pass; None, bools and
+    non-numeric values are skipped, so True/False never stand in for 1/0.
+    """
+    n = _num_rows(columns)
+    if n <= max_rows:
+        return list(range(n))
+
+    extremes: List[int] = []
+    for column in columns.values():
+        first = next((v for v in column[:STRATIFY_SCAN_ROWS] if v is not None), None)
+        if isinstance(first, bool) or not isinstance(first, (int, float)):
+            continue
+        low = high = None
+        for i, v in enumerate(column):
+            if v is None or isinstance(v, bool) or not isinstance(v, (int, float)):
+                continue
+            if low is None or v < column[low]:
+                low = i
+            if high is None or v > column[high]:
+                high = i
+        if low is not None:
+            extremes.extend((low, high))
+
+    # 极值优先，剩余预算从首尾两端交替填充
+    indices = set(list(dict.fromkeys(extremes))[:max_rows])
+    front, back = 0, n - 1
+    while len(indices) < max_rows and front <= back:
+        indices.add(front)
+        if len(indices) < max_rows:
+            indices.add(back)
+        front, back = front + 1, back - 1
+    return sorted(indices)
+
+
+register_sampler("reservoir", reservoir_sample)
+register_sampler("stratified", stratified_sample)
+register_sampler("first_last_extremes", first_last_extremes_sample)
+
+
+def _as_columns(data: Union[List[Dict[str, Any]], ColumnarData, Columns]) -> Columns:
+    if isinstance(data, ColumnarData):
+        return data.as_dict()
+    if isinstance(data, dict):
+        return data
+    return to_columns(data)
+
+
+def sample_indices(
+    columns: Columns,
+    strategy: Optional[str] = None,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    seed: int = DEFAULT_SEED
+) -> List[int]:
+    """
+    Pick representative row indices.
+
+    Args:
+        columns: Column name to value array
+        strategy: Registered strategy name (defaults to INSIGHT_SAMPLE_STRATEGY)
+        max_rows: Row budget
+        seed: Seed for the strategy's random generator
+
+    Returns:
+        List[int]: Sorted row indices
+    """
+    name = strategy or DEFAULT_STRATEGY
+    if name not in SAMPLERS:
+        raise ValueError(f"Unknown sampling strategy: {name}")
+    return SAMPLERS[name](columns, max_rows, random.Random(seed))
+
+
+def rows_at(columns: Columns, indices: List[int]) -> List[Dict[str, Any]]:
+    """Materialize the given rows from column arrays."""
+    return [{name: values[i] for name, values in columns.items()} for i in indices]
+
+
+def sample_rows(
+    data: Union[List[Dict[str, Any]], ColumnarData],
+    strategy: Optional[str] = None,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    seed: int = DEFAULT_SEED
+) -> List[Dict[str, Any]]:
+    """Sample representative rows from row-oriented or columnar data, in original order."""
+    columns = _as_columns(data)
+    indices = sample_indices(columns, strategy, max_rows, seed)
+    if isinstance(data, list):
+        return [data[i] for i in indices]
+    return rows_at(columns, indices)
+
+
+def _clip(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_VALUE_CHARS:
+        return value[:MAX_VALUE_CHARS - 1] + "…"
+    return value
+
+
+def render_sample(rows: List[Dict[str, Any]], max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """Render rows as JSON lines, stopping once the character budget is reached."""
+    lines: List[str] = []
+    used = 0
+    for row in rows:
+        line = json.dumps({k: _clip(v) for k, v in row.items()}, ensure_ascii=False, default=str)
+        if lines and used + len(line) > max_chars:
+            lines.append(f"... ({len(rows) - len(lines)} more sampled rows omitted)")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
+
+
+def sample_for_prompt(
+    data: Union[List[Dict[str, Any]], ColumnarData, Columns],
+    strategy: Optional[str] = None,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    max_chars: int = DEFAULT_MAX_CHARS
+) -> str:
+    """Sample a dataset (rows, ColumnarData or column arrays) and render it for the chart prompt."""
+    columns = _as_columns(data)
+    rows = rows_at(columns, sample_indices(columns, strategy, max_rows))
+    header = f"{len(rows)} of {_num_rows(columns)} rows, strategy={strategy or DEFAULT_STRATEGY}"
+    return header + "\n" + render_sample(rows, max_chars)
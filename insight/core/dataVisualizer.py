@@ -1,21 +1,29 @@
 # Core interfaces for SQL generation and chart configuration from natural language
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, AsyncIterator, Tuple, Callable, Union
+from functools import partial
+import asyncio
+import time
 import uuid
 import os 
 
-from interfaces import DataSource
+from interfaces import DataSource, ColumnarData
+from datasourceRegistry import datasource_registry
+from chainCache import chain_cache, StageSpec
+from responseCache import response_cache, make_cache_key
+from historyCompactor import CompactHistory, create_stage_histories
+from dataProfiler import profile_columns, render_profile, to_columns
+from dataSampler import sample_for_prompt
+from intentClassifier import IntentDecision, classify_intent, intent_stats, should_shadow
+from sqlValidator import SQL_REPAIR_RETRIES, repair_query, sql_validation_stats, validate_sql
+from sessionSnapshot import SNAPSHOT_VERSION
+from serviceMetrics import metrics
+from tracing import tracer
 
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from langchain_openai import ChatOpenAI
-from langchain_deepseek import ChatDeepSeek
 from pydantic import BaseModel, Field
-from langchain_core.messages import (
-    HumanMessage,
-    SystemMessage,
-    AIMessage,
-    BaseMessage,
-)
+
+if TYPE_CHECKING:
+    # 消息类在首次写入会话历史时才导入，避免app冷启动加载langchain_core
+    from langchain_core.messages import BaseMessage
 
 
 from dotenv import load_dotenv
@@ -23,58 +31,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def filter_messages_by_window(messages: List[BaseMessage], window_size: int = 5) -> List[BaseMessage]:
-    """
-    Filter messages using a sliding window to keep the conversation context manageable.
-    
-    Args:
-        messages: List of conversation messages
-        window_size: Size of the sliding window (number of message pairs to keep)
-        
-    Returns:
-        List[BaseMessage]: Filtered list of messages within the window
-    """
-    if not messages:
-        return []
-        
-    # If messages are less than window size, return all
-    if len(messages) <= window_size * 2:
-        return messages
-        
-    # Keep the first system message if it exists
-    filtered = []
-    if isinstance(messages[0], SystemMessage):
-        filtered.append(messages[0])
-        messages = messages[1:]
-        
-    # Get the last N pairs of messages (human + AI)
-    message_pairs = list(zip(messages[::2], messages[1::2]))
-    recent_pairs = message_pairs[-window_size:]
-    
-    # Flatten the pairs back into a single list
-    filtered.extend([msg for pair in recent_pairs for msg in pair])
-    
-    return filtered
-
-
-class DataVisualizer:
-    # TODO：应该添加顶嘴功能，作为一个边界控制， 如果超出边界，应该返回而不是报错
-    """
-    Class for generating SQL queries and chart configurations from natural language.
-    Handles both SQL generation and visualization configuration based on user queries.
-    """
-    
-    def __init__(self, model_name: str = "gpt-4", session_id: Optional[str] = None):
-        """
-        Initialize the NLP data visualizer.
-        
-        Args:
-            model_name: The name of the language model to use
-            session_id: Unique identifier for this session
-        """
-        self.model_name = os.getenv("BASE_MODEL_NAME")
-        self.session_id = session_id or str(uuid.uuid4())
-        self.intent_system_message = """你是一个意图识别专家，你的任务是, 基于用户多轮对话， 判度用户当前输入是否需要重新生成sql
+# System prompts and structured output models are defined once at import time;
+# chains built from them are compiled lazily by chain_cache per (stage, model).
+INTENT_SYSTEM_MESSAGE = """你是一个意图识别专家，你的任务是, 基于用户多轮对话， 判度用户当前输入是否需要重新生成sql
                                         1. 如果用户输入与修改SQL无关，之和图表配置有关，返回no 
                                         2. 如果用户输入涉及数据重新获取，返回yes
                                         3. 请注意联系多轮对话上下文， 不要孤立的看待当前输入
@@ -98,7 +57,7 @@ class DataVisualizer:
                                         Human: 分析产品A的销售情况
                                         判断: yes (需要获取数据)
                                         """
-        self.schema_system_message = """你是一个数据库模式分析专家，你的任务是:
+SCHEMA_SYSTEM_MESSAGE = """你是一个数据库模式分析专家，你的任务是:
                                     1. 基于用户的多轮对话历史和当前输入，生成创建表的SQL语句
                                     2. 返回的SQL语句需要符合PostgreSQL的语法， 并且只能够创建表
                                     3. 返回的SQL语句需要包含表的名称， 字段名称， 字段类型， 字段约束等
@@ -107,10 +66,10 @@ class DataVisualizer:
                                    """
                                     
                             
-        self.sql_system_message = """你是一个PostgreSQL专家，你的任务是:
+SQL_SYSTEM_MESSAGE = """你是一个PostgreSQL专家，你的任务是:
                                     1. 基于用户的多轮对话历史和当前输入，生成合适的SQL查询语句
                                     """
-        self.chart_system_message = """你是一个数据可视化专家，你的任务是:
+CHART_SYSTEM_MESSAGE = """你是一个数据可视化专家，你的任务是:
                                     1. 基于用户的多轮对话历史和当前输入，生成合适的图表配置
                                     2. 我会提供历史用户输入和历史图表配置，请你更加聪明的结合上下文进行处理
                                     3. 颜色必须使用hsl()格式返回
@@ -170,30 +129,412 @@ class DataVisualizer:
                                         legend: true
                                     }};
                                     """
-     
-        self.intent_messages: List[BaseMessage] = []
-        self.sql_messages: List[BaseMessage] = []
-        self.chart_messages: List[BaseMessage] = []
-        self.schema_messages: List[BaseMessage] = []
+
+
+class IntentOutput(BaseModel):
+    intent: str = Field(description="意图判断结果，yes表示需要重新生成SQL，no表示不需要")
+    explanation: str = Field(description="意图判断的解释说明")
+
+
+class SchemaOutput(BaseModel):
+    sql: str = Field(description="The SQL to create the table")
+
+
+class SQLQueryOutput(BaseModel):
+    sql: str = Field(description="The SQL query to execute, 也可能是历史sql")
+    explanation: str = Field(description="Explanation of what the SQL query does，如果是历史sql，也进行解释")
+
+
+class ChartConfigOutput(BaseModel):
+    # Fields the UI can render early come first; the model emits tool arguments in schema order
+    type: str = Field(description="Type of chart (bar, line, area, pie)")
+    title: str = Field(description="The title of the chart")
+    xKey: str = Field(description="Key for x-axis or category")
+    yKeys: List[str] = Field(description="Key(s) for y-axis values")
+    multipleLines: Optional[bool] = Field(default=False, description="For line charts: whether comparing groups of data")
+    measurementColumn: Optional[str] = Field(default=None, description="For line charts: key for quantitative y-axis column")
+    lineCategories: Optional[List[str]] = Field(default=[], description="For line charts: categories for different lines")
+    colors: Optional[Dict[str, str]] = Field(default={}, description="Mapping of data keys to color values")
+    legend: bool = Field(description="Whether to show legend")
+    description: str = Field(description="Describe what the chart is showing")
+    takeaway: str = Field(description="The main takeaway from the chart")
+    explanation: str = Field(description="Explanation of the visualization")
+
+
+# Prompt layout: the system message holds only static text (plus the datasource
+# block for schema/sql), so it is a byte-stable prefix shared across sessions and
+# eligible for provider-side prefix caching. Per-session history and the query
+# go last, in the human message.
+INTENT_TEMPLATE = INTENT_SYSTEM_MESSAGE
+
+INTENT_HUMAN_TEMPLATE = """Previous conversation:
+{chat_history}
+
+User Query: {query}
+
+判断是否需要重新生成SQL查询。"""
+
+SCHEMA_TEMPLATE = SCHEMA_SYSTEM_MESSAGE + """
+{datasource}"""
+
+SCHEMA_HUMAN_TEMPLATE = """Previous conversation:
+{chat_history}
+
+User Query: {query}"""
+
+SQL_TEMPLATE = SQL_SYSTEM_MESSAGE + """
+{datasource}"""
+
+SQL_HUMAN_TEMPLATE = """Previous conversation:
+{chat_history}
+
+User Query: {query}
+
+Generate a SQL query to answer this question."""
+
+CHART_TEMPLATE = CHART_SYSTEM_MESSAGE
+
+CHART_HUMAN_TEMPLATE = """Data Profile (per-column summary of the full dataset):
+{data}
+
+Representative Rows (JSON lines):
+{sample}
+
+Previous conversation:
+{chat_history}
+
+User Query: {query}"""
+
+# Chart payloads larger than this are profiled off the event loop
+PROFILE_OFFLOAD_ROWS = 10000
+
+
+ChartData = Union[List[Dict[str, Any]], ColumnarData]
+
+
+def describe_chart_data(data: ChartData, sample_strategy: Optional[str] = None) -> Dict[str, str]:
+    """Column profile plus a representative row sample for the chart prompt."""
+    # 列只提取一次，分析和抽样共用
+    columns = data.as_dict() if isinstance(data, ColumnarData) else to_columns(data)
+    return {
+        "data": render_profile(profile_columns(columns)),
+        "sample": sample_for_prompt(columns, sample_strategy)
+    }
+
+
+async def adescribe_chart_data(data: ChartData, sample_strategy: Optional[str] = None) -> Dict[str, str]:
+    """describe_chart_data, moved to a worker thread for large payloads."""
+    if len(data) > PROFILE_OFFLOAD_ROWS:
+        # 大数据集的分析放到线程池，避免阻塞事件循环
+        return await asyncio.to_thread(describe_chart_data, data, sample_strategy)
+    return describe_chart_data(data, sample_strategy)
+
+
+# Rough per-message object overhead (message instance, dict, list slot)
+MESSAGE_OVERHEAD_BYTES = 200
+# Stages with a <stage>_messages list on DataVisualizer
+SESSION_STAGES = ("intent", "sql", "chart", "schema")
+
+
+def _message_bytes(content: str) -> int:
+    return len(content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+# Keeps references to fire-and-forget tasks (e.g. intent shadow checks)
+_background_tasks = set()
+
+chain_cache.register_stage(StageSpec("intent", INTENT_TEMPLATE, IntentOutput, human_template=INTENT_HUMAN_TEMPLATE))
+chain_cache.register_stage(StageSpec("schema", SCHEMA_TEMPLATE, SchemaOutput, human_template=SCHEMA_HUMAN_TEMPLATE))
+chain_cache.register_stage(StageSpec("sql", SQL_TEMPLATE, SQLQueryOutput, human_template=SQL_HUMAN_TEMPLATE))
+chain_cache.register_stage(StageSpec("chart", CHART_TEMPLATE, ChartConfigOutput, human_template=CHART_HUMAN_TEMPLATE))
+
+
+class DataVisualizer:
+    # TODO：应该添加顶嘴功能，作为一个边界控制， 如果超出边界，应该返回而不是报错
+    """
+    Class for generating SQL queries and chart configurations from natural language.
+    Handles both SQL generation and visualization configuration based on user queries.
+    """
+    
+    def __init__(self, model_name: str = "gpt-4", session_id: Optional[str] = None):
+        """
+        Initialize the NLP data visualizer.
+        
+        Args:
+            model_name: The name of the language model to use
+            session_id: Unique identifier for this session
+        """
+        self.model_name = os.getenv("BASE_MODEL_NAME")
+        self.session_id = session_id or str(uuid.uuid4())
+        self.intent_messages: List["BaseMessage"] = []
+        self.sql_messages: List["BaseMessage"] = []
+        self.chart_messages: List["BaseMessage"] = []
+        self.schema_messages: List["BaseMessage"] = []
+        # Token-budgeted, pre-rendered history per stage (intent, sql, chart, schema)
+        self.histories = create_stage_histories()
+        # Approximate memory held by the message lists, maintained on append/trim
+        self.estimated_bytes = 0
 
         self.last_sql_query: Optional[str] = None
         self.last_chart_config: Optional[Dict[str, Any]] = None
         self.sql_query = ""
 
-    def _get_chat_history(self, messages: List[BaseMessage]) -> str:
-        """将消息历史记录转换为字符串格式"""
-        history = []
-        for msg in messages[1:]:  # Skip the system message
-            if isinstance(msg, HumanMessage):
-                history.append(f"Human: {msg.content}")
-            elif isinstance(msg, AIMessage):
-                history.append(f"Assistant: {msg.content}")
+    def _get_chat_history(self, stage: str) -> str:
+        """获取该阶段在token预算内的历史记录字符串（增量维护，无需重新渲染）"""
+        return self.histories[stage].render()
+
+    def _append_turn(self, stage: str, query: str, answer: str) -> None:
+        """将一轮对话追加到消息列表和对应阶段的压缩历史中"""
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        getattr(self, f"{stage}_messages").extend([
+            HumanMessage(content=query),
+            AIMessage(content=answer)
+        ])
+        history = self.histories[stage]
+        history.append("Human", query)
+        history.append("Assistant", answer)
+        self.estimated_bytes += _message_bytes(query) + _message_bytes(answer)
+
+    def trim_history(self, max_bytes: int) -> None:
+        """
+        Drop the oldest turns (longest message list first) until the session fits in
+        max_bytes. The latest turn of each list is kept so follow-ups keep their context.
+        Each stage's compact history is cut to the same turns, never keeping lines
+        whose messages were dropped.
+        """
+        stage_lists = {stage: getattr(self, f"{stage}_messages") for stage in SESSION_STAGES}
+        trimmed = set()
+        while self.estimated_bytes > max_bytes:
+            stage = max(stage_lists, key=lambda name: len(stage_lists[name]))
+            messages = stage_lists[stage]
+            if len(messages) <= 2:
+                break
+            for msg in messages[:2]:
+                self.estimated_bytes -= _message_bytes(msg.content)
+            del messages[:2]
+            trimmed.add(stage)
+        for stage in trimmed:
+            if stage in self.histories:
+                # 压缩历史是消息列表的后缀，每条消息对应一行
+                self.histories[stage].keep_last(len(stage_lists[stage]))
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """
+        Serialize the session state for SnapshotStore.
+
+        Message lists are stored as plain contents: _append_turn always adds a
+        (human, ai) pair and trimming drops whole pairs, so roles follow from position.
+
+        Returns:
+            Dict[str, Any]: JSON-compatible snapshot
+        """
+        return {
+            "v": SNAPSHOT_VERSION,
+            "session_id": self.session_id,
+            "messages": {
+                stage: [msg.content for msg in getattr(self, f"{stage}_messages")]
+                for stage in SESSION_STAGES
+            },
+            "histories": {stage: history.to_snapshot() for stage, history in self.histories.items()},
+            "estimated_bytes": self.estimated_bytes,
+            "last_sql_query": self.last_sql_query,
+            "sql_query": self.sql_query,
+            "last_chart_config": self.last_chart_config.model_dump() if self.last_chart_config else None,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "DataVisualizer":
+        """
+        Rebuild a visualizer from to_snapshot() output without re-counting tokens
+        or re-rendering histories.
+
+        Args:
+            snapshot: Snapshot produced by to_snapshot()
+
+        Returns:
+            DataVisualizer: The restored session
+        """
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        visualizer = cls(session_id=snapshot["session_id"])
+        for stage, contents in snapshot["messages"].items():
+            getattr(visualizer, f"{stage}_messages").extend(
+                HumanMessage(content=content) if i % 2 == 0 else AIMessage(content=content)
+                for i, content in enumerate(contents)
+            )
+        for stage, lines in snapshot["histories"].items():
+            if stage in visualizer.histories:
+                budget = visualizer.histories[stage].budget
+                visualizer.histories[stage] = CompactHistory.from_snapshot(budget, lines)
+        visualizer.estimated_bytes = snapshot["estimated_bytes"]
+        visualizer.last_sql_query = snapshot["last_sql_query"]
+        visualizer.sql_query = snapshot["sql_query"]
+        if snapshot["last_chart_config"] is not None:
+            visualizer.last_chart_config = ChartConfigOutput(**snapshot["last_chart_config"])
+        return visualizer
+
+    def _lookup_cache(
+        self,
+        stage: str,
+        output_model,
+        cache_parts: Dict[str, Any],
+        use_cache: bool = True
+    ):
+        """
+        Look up a stage result in the response cache.
+
+        Args:
+            stage: Stage name registered in chain_cache
+            output_model: Structured output model used to rebuild cached results
+            cache_parts: Prompt inputs that determine the cache key
+            use_cache: Set to False to bypass the cache for this call
 
-                
-        filtered_history = filter_messages_by_window(history)
-        return "\n".join(filtered_history)
+        Returns:
+            Tuple of (cache_key, cached_result); cache_key is None when caching is skipped
+        """
+        if not (use_cache and response_cache.enabled):
+            return None, None
+        cache_key = make_cache_key(stage, **cache_parts)
+        cached = response_cache.get(cache_key)
+        return cache_key, output_model(**cached) if cached is not None else None
 
+    async def _alookup_cache(
+        self,
+        stage: str,
+        output_model,
+        cache_parts: Dict[str, Any],
+        use_cache: bool = True
+    ):
+        """Async counterpart of _lookup_cache; SQLite lookups run off the event loop."""
+        if not (use_cache and response_cache.enabled):
+            return None, None
+        cache_key = make_cache_key(stage, **cache_parts)
+        cached = await response_cache.aget(cache_key)
+        return cache_key, output_model(**cached) if cached is not None else None
+
+    @staticmethod
+    def _validate(result, validator: Callable):
+        check = validator(result.sql)
+        sql_validation_stats.record_validation(check)
+        return check
+
+    def _repair_sql(self, chain, inputs: Dict[str, Any], result, validator: Callable):
+        """
+        Validate generated SQL locally; on failure re-prompt with the concrete
+        errors, at most SQL_REPAIR_RETRIES times.
+        """
+        attempts = 0
+        check = self._validate(result, validator)
+        while not check.valid and attempts < SQL_REPAIR_RETRIES:
+            attempts += 1
+            result = chain.invoke({**inputs, "query": repair_query(inputs["query"], result.sql, check)})
+            check = self._validate(result, validator)
+        tracer.annotate(sql_valid=check.valid, repair_attempts=attempts)
+        if not check.skipped:
+            sql_validation_stats.record_outcome(attempts, check.valid)
+        return result
+
+    async def _arepair_sql(self, chain, inputs: Dict[str, Any], result, validator: Callable):
+        """Async counterpart of _repair_sql."""
+        attempts = 0
+        check = self._validate(result, validator)
+        while not check.valid and attempts < SQL_REPAIR_RETRIES:
+            attempts += 1
+            result = await chain.ainvoke({**inputs, "query": repair_query(inputs["query"], result.sql, check)})
+            check = self._validate(result, validator)
+        tracer.annotate(sql_valid=check.valid, repair_attempts=attempts)
+        if not check.skipped:
+            sql_validation_stats.record_outcome(attempts, check.valid)
+        return result
+
+    def _invoke_cached(
+        self,
+        stage: str,
+        output_model,
+        inputs: Dict[str, Any],
+        cache_parts: Dict[str, Any],
+        use_cache: bool = True,
+        validator: Optional[Callable] = None
+    ):
+        """
+        Execute a stage chain, serving the result from the response cache when possible.
+        Fresh SQL results are validated (and repaired) before they are cached.
+        """
+        with metrics.stage(stage), tracer.span(stage, stage=stage, session_id=self.session_id) as span:
+            cache_key, cached = self._lookup_cache(stage, output_model, cache_parts, use_cache)
+            span.set_attribute("cache_hit", cached is not None)
+            if cached is not None:
+                return cached
+
+            chain = chain_cache.get(stage, self.model_name)
+            result = chain.invoke(inputs)
+            if validator is not None:
+                result = self._repair_sql(chain, inputs, result, validator)
+
+            if cache_key is not None:
+                response_cache.set(cache_key, result.model_dump())
+            return result
+
+    async def _ainvoke_cached(
+        self,
+        stage: str,
+        output_model,
+        inputs: Dict[str, Any],
+        cache_parts: Dict[str, Any],
+        use_cache: bool = True,
+        validator: Optional[Callable] = None
+    ):
+        """Async counterpart of _invoke_cached built on ainvoke."""
+        with metrics.stage(stage), tracer.span(stage, stage=stage, session_id=self.session_id) as span:
+            cache_key, cached = await self._alookup_cache(stage, output_model, cache_parts, use_cache)
+            span.set_attribute("cache_hit", cached is not None)
+            if cached is not None:
+                return cached
+
+            chain = chain_cache.get(stage, self.model_name)
+            result = await chain.ainvoke(inputs)
+            if validator is not None:
+                result = await self._arepair_sql(chain, inputs, result, validator)
+
+            if cache_key is not None:
+                await response_cache.aset(cache_key, result.model_dump())
+            return result
+
+    async def _astream_stage(
+        self,
+        stage: str,
+        output_model,
+        inputs: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream a stage's structured output.
 
+        Yields:
+            ("partial", dict) each time more fields arrive, then ("parsed", output_model)
+        """
+        last: Optional[Dict[str, Any]] = None
+        # 流式阶段跨越多次yield，直接记录首尾耗时
+        start = time.perf_counter()
+        async for chunk in chain_cache.get_stream(stage, self.model_name).astream(inputs):
+            if chunk and chunk != last:
+                last = chunk
+                yield "partial", chunk
+        metrics.observe(stage, time.perf_counter() - start)
+        yield "parsed", output_model(**(last or {}))
+
+    def _intent_inputs(self, query: str) -> Dict[str, Any]:
+        return {
+            "chat_history": self._get_chat_history("intent"),
+            "query": query
+        }
+
+    def _finish_intent(self, query: str, result: IntentOutput) -> str:
+        self._append_turn("intent", query, str(result))
+        return result.intent
+
+    @tracer.traced("intent")
+    @metrics.timed("intent")
     def generate_intent(self, query: str) -> str:
         """
         生成意图
@@ -207,47 +548,86 @@ class DataVisualizer:
         if not self.intent_messages:
             return "yes"
         try:
-            # 1. Define output schema using Pydantic
-            class IntentOutput(BaseModel):
-                intent: str = Field(description="意图判断结果，yes表示需要重新生成SQL，no表示不需要")
-                explanation: str = Field(description="意图判断的解释说明")
-
-            # 2. Construct the prompt template with chat history
-            chat_history = self._get_chat_history(self.intent_messages)
-            template = self.intent_system_message + """
-            
-            Previous conversation:
-            {chat_history}
-            
-            User Query: {query}
-            
-            判断是否需要重新生成SQL查询。
-            """
+            # 本地分类器足够自信时直接返回，跳过LLM调用
+            decision = classify_intent(query)
+            if decision.confident:
+                intent_stats.record_local()
+                tracer.annotate(intent_local=True)
+                return self._finish_intent(query, IntentOutput(intent=decision.intent, explanation=decision.reason))
+
+            chain = chain_cache.get("intent", self.model_name)
+            result = chain.invoke(self._intent_inputs(query))
+            intent_stats.record_fallback(decision, result.intent)
+            return self._finish_intent(query, result)
 
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", template),
-                ("human", "{input}")
-            ])
+        except Exception as e:
+            raise Exception(f"Failed to generate intent: {str(e)}")
 
-            # 3. Set up the LLM with structured output
-            model = ChatDeepSeek(model=self.model_name, api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0)
-            chain = prompt | model.with_structured_output(IntentOutput)
+    @tracer.traced("intent")
+    @metrics.timed("intent")
+    async def agenerate_intent(self, query: str) -> str:
+        """生成意图（异步版本，不阻塞事件循环）"""
+        if not self.intent_messages:
+            return "yes"
+        try:
+            inputs = self._intent_inputs(query)
+            chain = chain_cache.get("intent", self.model_name)
+
+            decision = classify_intent(query)
+            if decision.confident:
+                intent_stats.record_local()
+                tracer.annotate(intent_local=True)
+                if should_shadow():
+                    # 抽样在后台调用LLM统计一致率，不增加请求延迟
+                    task = asyncio.create_task(self._shadow_intent(chain, inputs, decision))
+                    _background_tasks.add(task)
+                    task.add_done_callback(_background_tasks.discard)
+                return self._finish_intent(query, IntentOutput(intent=decision.intent, explanation=decision.reason))
+
+            result = await chain.ainvoke(inputs)
+            intent_stats.record_fallback(decision, result.intent)
+            return self._finish_intent(query, result)
 
-            # 4. Execute the chain
-            result = chain.invoke({
+        except Exception as e:
+            raise Exception(f"Failed to generate intent: {str(e)}")
+
+    def intent_needs_llm(self, query: str) -> bool:
+        """Whether generate_intent would call the LLM for this query."""
+        return bool(self.intent_messages) and not classify_intent(query).confident
+
+    @staticmethod
+    async def _shadow_intent(chain, inputs: Dict[str, Any], decision: IntentDecision) -> None:
+        """Compare a confident local decision with the LLM without touching session history."""
+        try:
+            result = await chain.ainvoke(inputs)
+            intent_stats.record_shadow(decision, result.intent)
+        except Exception:
+            pass
+
+    def _schema_request(self, query: str, datasource: DataSource, **kwargs) -> Dict[str, Any]:
+        chat_history = self._get_chat_history("schema")
+        context = datasource_registry.prompt_context(datasource)
+        return {
+            "stage": "schema",
+            "output_model": SchemaOutput,
+            "inputs": {
+                "datasource": context.blocks["schema"],
                 "chat_history": chat_history,
+                "query": query
+            },
+            "cache_parts": {
+                "datasource": context.id,
                 "query": query,
-                "input": query
-            })
+                "history": chat_history
+            },
+            "use_cache": kwargs.get("use_cache", True)
+        }
 
-            self.intent_messages.extend([
-                HumanMessage(content=query),
-                AIMessage(content=str(result))
-            ])
-            return result.intent
-
-        except Exception as e:
-            raise Exception(f"Failed to generate intent: {str(e)}")
+    def _finish_schema(self, query: str, result: SchemaOutput) -> Dict[str, Any]:
+        self._append_turn("schema", query, str(result))
+        return {
+            "create_table_sql": result.sql,
+        }
 
     def generate_create_table_sql(
         self,
@@ -261,62 +641,62 @@ class DataVisualizer:
         Args:
             query: Natural language query requesting data
             datasource: Information about the data source
-            **kwargs: Additional parameters
+            **kwargs: Additional parameters (use_cache=False bypasses the response cache)
             
         Returns:
             Dict[str, Any]: Dictionary containing the identified schema information
         """
         try:
-            # 1. Define output schema using Pydantic
-            class SchemaOutput(BaseModel):
-                sql: str = Field(description="The SQL to create the table")
+            result = self._invoke_cached(**self._schema_request(query, datasource, **kwargs))
+            return self._finish_schema(query, result)
 
-            # 2. Construct the prompt template with chat history
-            chat_history = self._get_chat_history(self.schema_messages)
-            template = self.schema_system_message + """
-            
-            Example Data:
-            {example_data}
-            
-            Special Fields:
-            {special_fields}
-            
-            Previous conversation:
-            {chat_history}
-            
-          
-            
-            """
+        except Exception as e:
+            raise Exception(f"Failed to generate schema: {str(e)}")
 
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", template),
-                ("human", "{input}")
-            ])
+    async def agenerate_create_table_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async counterpart of generate_create_table_sql."""
+        try:
+            result = await self._ainvoke_cached(**self._schema_request(query, datasource, **kwargs))
+            return self._finish_schema(query, result)
 
-            # 3. Set up the LLM with structured output
-            model = ChatDeepSeek(model=self.model_name, api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0)
-            chain = prompt | model.with_structured_output(SchemaOutput)
+        except Exception as e:
+            raise Exception(f"Failed to generate schema: {str(e)}")
 
-            # 4. Execute the chain
-            result = chain.invoke({
-                "example_data": datasource.example_data,
-                "special_fields": datasource.special_fields,
+    def _sql_request(self, query: str, datasource: DataSource, **kwargs) -> Dict[str, Any]:
+        chat_history = self._get_chat_history("sql")
+        context = datasource_registry.prompt_context(datasource)
+        return {
+            "stage": "sql",
+            "output_model": SQLQueryOutput,
+            "inputs": {
+                "datasource": context.blocks["sql"],
                 "chat_history": chat_history,
-                "input": query
-            })
-
-            # 5. Update conversation history
-            self.schema_messages.extend([
-                HumanMessage(content=query),
-                AIMessage(content=str(result))
-            ])
-            print(result)
-            return {
-                "create_table_sql": result.sql,
-            }
+                "query": query
+            },
+            "cache_parts": {
+                "datasource": context.id,
+                "query": query,
+                "history": chat_history
+            },
+            "use_cache": kwargs.get("use_cache", True),
+            "validator": partial(validate_sql, schema=datasource.schema)
+        }
 
-        except Exception as e:
-            raise Exception(f"Failed to generate schema: {str(e)}")
+    def _finish_sql(self, query: str, result: SQLQueryOutput) -> Dict[str, Any]:
+        self._append_turn("intent", query, str(result))
+
+        self.last_sql_query = result.sql
+        self.sql_query = result.sql
+
+        return {
+            "query": result.sql,
+            "explanation": result.explanation
+        }
 
     def generate_sql(
         self,
@@ -330,78 +710,122 @@ class DataVisualizer:
         Args:
             query: Natural language query requesting data
             datasource: Information about the data source
-            **kwargs: Additional parameters
+            **kwargs: Additional parameters (use_cache=False bypasses the response cache)
             
         Returns:
             Dict[str, Any]: Dictionary containing the generated SQL query
         """
         try:
-            # 1. Define output schema using Pydantic
-            class SQLQueryOutput(BaseModel):
-                sql: str = Field(description="The SQL query to execute, 也可能是历史sql")
-                explanation: str = Field(description="Explanation of what the SQL query does，如果是历史sql，也进行解释")
-
-            # 2. Construct the prompt template with chat history
-            chat_history = self._get_chat_history(self.sql_messages)
-            template = self.sql_system_message + """
-            
-            Table Schema:
-            {schema}
-            
-            Example Data:
-            {example_data}
-            
-            Special Fields:
-            {special_fields}
-            
-            Previous conversation:
-            {chat_history}
-            
-            User Query: {query}
-            
-            Generate a SQL query to answer this question.
-            """
-
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", template),
-                ("human", "{input}")
-            ])
-
-            # 3. Set up the LLM with structured output
-            model = ChatDeepSeek(model=self.model_name, api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0)
-            chain = prompt | model.with_structured_output(SQLQueryOutput)
-            # 4. Execute the chain
-            result = chain.invoke({
-                "schema": datasource.schema,
-                "example_data": datasource.example_data,
-                "special_fields": datasource.special_fields,
-                "chat_history": chat_history,
-                "query": query,
-                "input": query
-            })
-            
+            result = self._invoke_cached(**self._sql_request(query, datasource, **kwargs))
+            return self._finish_sql(query, result)
 
-            self.intent_messages.extend([
-                HumanMessage(content=query),
-                AIMessage(content=str(result))
-            ])
-       
-            
-            self.last_sql_query = result.sql
-            self.sql_query = result.sql
+        except Exception as e:
+            raise Exception(f"Failed to generate query: {str(e)}")
 
-           
-            return {
-                "query": result.sql,
-                "explanation": result.explanation
-            }
+    async def agenerate_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async counterpart of generate_sql."""
+        try:
+            result = await self._ainvoke_cached(**self._sql_request(query, datasource, **kwargs))
+            return self._finish_sql(query, result)
+
+        except Exception as e:
+            raise Exception(f"Failed to generate query: {str(e)}")
+
+    async def astream_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming counterpart of agenerate_sql.
+
+        Yields:
+            ("partial", dict) with the fields produced so far (sql arrives before explanation),
+            then ("result", dict) with the same payload as generate_sql
+        """
+        try:
+            request = self._sql_request(query, datasource, **kwargs)
+            cache_key, result = await self._alookup_cache("sql", SQLQueryOutput, request["cache_parts"], request["use_cache"])
+            if result is None:
+                async for event, payload in self._astream_stage("sql", SQLQueryOutput, request["inputs"]):
+                    if event == "partial":
+                        yield event, payload
+                    else:
+                        result = payload
+                # 流式结果同样先本地校验，失败时用非流式调用修复
+                result = await self._arepair_sql(
+                    chain_cache.get("sql", self.model_name), request["inputs"], result, request["validator"]
+                )
+                if cache_key is not None:
+                    await response_cache.aset(cache_key, result.model_dump())
+            yield "result", self._finish_sql(query, result)
+
+        except Exception as e:
+            raise Exception(f"Failed to generate query: {str(e)}")
+
+    async def aspeculate_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> SQLQueryOutput:
+        """
+        Generate SQL without touching session state, for speculative execution.
+        The caller applies the result with commit_sql() or discards it.
+        """
+        try:
+            return await self._ainvoke_cached(**self._sql_request(query, datasource, **kwargs))
 
         except Exception as e:
             raise Exception(f"Failed to generate query: {str(e)}")
 
+    def commit_sql(self, query: str, result: SQLQueryOutput) -> Dict[str, Any]:
+        """Apply a speculative SQL result to the session history."""
+        return self._finish_sql(query, result)
+
+    def _chart_inputs(self, query: str, description: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            **description,
+            "chat_history": self._get_chat_history("chart"),
+            "query": query
+        }
+
+    def _finish_chart(self, query: str, result: ChartConfigOutput) -> Dict[str, Any]:
+        self._append_turn("chart", query, str(result))
+
+        self.last_chart_config = result
+        if result.colors is None:
+            # Generate colors for each y-axis key
+            result.colors = {}
+            for i, key in enumerate(result.yKeys):
+                result.colors[key] = f"hsl(var(--chart-{i + 1}))"
+
+        return {
+            "config": {
+                "description": result.description,
+                "takeaway": result.takeaway,
+                "type": result.type,
+                "title": result.title,
+                "xKey": result.xKey,
+                "yKeys": result.yKeys,
+                "multipleLines": result.multipleLines,
+                "measurementColumn": result.measurementColumn,
+                "lineCategories": result.lineCategories,
+                "colors": result.colors,
+                "legend": result.legend,
+                "explanation": result.explanation
+            }
+        }
+
     def generate_chart_config(
         self,
-        data: List[Dict[str, Any]],
+        data: ChartData,
         query: str,
         **kwargs
     ) -> Dict[str, Any]:
@@ -409,91 +833,59 @@ class DataVisualizer:
         Generate chart configuration based on data, natural language query and conversation history.
         
         Args:
-            data: The dataset to visualize
+            data: The dataset to visualize (rows or ColumnarData)
             query: Natural language query requesting visualization
-            **kwargs: Additional parameters
+            **kwargs: Additional parameters (sample_strategy picks the row sampler)
             
         Returns:
             Dict[str, Any]: Dictionary containing the chart configuration
         """
         try:
-            # 1. Define output schema using Pydantic
-            class ChartConfigOutput(BaseModel):
-                description: str = Field(description="Describe what the chart is showing")
-                takeaway: str = Field(description="The main takeaway from the chart")
-                type: str = Field(description="Type of chart (bar, line, area, pie)")
-                title: str = Field(description="The title of the chart")
-                xKey: str = Field(description="Key for x-axis or category")
-                yKeys: List[str] = Field(description="Key(s) for y-axis values")
-                multipleLines: Optional[bool] = Field(default=False, description="For line charts: whether comparing groups of data")
-                measurementColumn: Optional[str] = Field(default=None, description="For line charts: key for quantitative y-axis column")
-                lineCategories: Optional[List[str]] = Field(default=[], description="For line charts: categories for different lines")
-                colors: Optional[Dict[str, str]] = Field(default={}, description="Mapping of data keys to color values")
-                legend: bool = Field(description="Whether to show legend")
-                explanation: str = Field(description="Explanation of the visualization")
-
-            # 2. Construct the prompt template with chat history
-            chat_history = self._get_chat_history(self.chart_messages)
-            template = self.chart_system_message + """
-
-            Data Sample:
-            {data}
-            
-            Previous conversation:
-            {chat_history}
-            
-            User Query: {query}
-            
-           
-            """
+            description = describe_chart_data(data, kwargs.get("sample_strategy"))
+            chain = chain_cache.get("chart", self.model_name)
+            result = chain.invoke(self._chart_inputs(query, description))
+            return self._finish_chart(query, result)
 
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", template),
-                ("human", "{input}")
-            ])
+        except Exception as e:
+            raise Exception(f"Failed to generate chart configuration: {str(e)}")
+
+    async def agenerate_chart_config(
+        self,
+        data: ChartData,
+        query: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async counterpart of generate_chart_config."""
+        try:
+            description = await adescribe_chart_data(data, kwargs.get("sample_strategy"))
+            chain = chain_cache.get("chart", self.model_name)
+            result = await chain.ainvoke(self._chart_inputs(query, description))
+            return self._finish_chart(query, result)
 
-            # 3. Set up the LLM with structured output
-            model = ChatDeepSeek(model=self.model_name, api_base=os.getenv("DEEPSEEK_BASE_URL"), temperature=0)
-            chain = prompt | model.with_structured_output(ChartConfigOutput)
+        except Exception as e:
+            raise Exception(f"Failed to generate chart configuration: {str(e)}")
 
-            # 4. Execute the chain
-            result = chain.invoke({
-                "data": str(data[:5]),
-                "chat_history": chat_history,
-                "query": query,
-                "input": query
-            })
-            
-            # 5. Update conversation history
-            self.chart_messages.extend([
-                HumanMessage(content=query),
-                AIMessage(content=str(result))
-            ])
+    async def astream_chart_config(
+        self,
+        data: ChartData,
+        query: str,
+        **kwargs
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming counterpart of agenerate_chart_config.
 
-        
-            self.last_chart_config = result
-            if result.colors is None:
-                # Generate colors for each y-axis key
-                result.colors = {}
-                for i, key in enumerate(result.yKeys):
-                    result.colors[key] = f"hsl(var(--chart-{i + 1}))"
-          
-            return {
-                "config": {
-                    "description": result.description,
-                    "takeaway": result.takeaway,
-                    "type": result.type,
-                    "title": result.title,
-                    "xKey": result.xKey,
-                    "yKeys": result.yKeys,
-                    "multipleLines": result.multipleLines,
-                    "measurementColumn": result.measurementColumn,
-                    "lineCategories": result.lineCategories,
-                    "colors": result.colors,
-                    "legend": result.legend,
-                    "explanation": result.explanation
-                }
-            }
+        Yields:
+            ("partial", dict) as fields arrive (type/xKey/yKeys before takeaway),
+            then ("result", dict) with the same payload as generate_chart_config
+        """
+        try:
+            description = await adescribe_chart_data(data, kwargs.get("sample_strategy"))
+            inputs = self._chart_inputs(query, description)
+            async for event, payload in self._astream_stage("chart", ChartConfigOutput, inputs):
+                if event == "partial":
+                    yield event, payload
+                else:
+                    yield "result", self._finish_chart(query, payload)
 
         except Exception as e:
             raise Exception(f"Failed to generate chart configuration: {str(e)}")
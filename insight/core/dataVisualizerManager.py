@@ -1,22 +1,82 @@
-from typing import Dict, Any, Optional, List, Tuple
-from langchain_core.messages import BaseMessage
-
-from dataVisualizer import DataVisualizer
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple, AsyncIterator
+
+from dataVisualizer import SESSION_STAGES, DataVisualizer, ChartData
+from sessionStore import SessionStore
+from sessionSnapshot import SnapshotStore, create_snapshot_store
+from concurrency import RequestCoordinator, request_key, data_fingerprint
+from serviceMetrics import metrics
+from tracing import tracer
 from  interfaces import DataSource
 from utils import print_section, print_json
 
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+def _discard_task(task: asyncio.Task) -> None:
+    """
+    Cancel a task whose result is no longer needed without waiting for it. The
+    exception it may already have failed with is retrieved in a done-callback,
+    so asyncio does not log "Task exception was never retrieved".
+    """
+    task.add_done_callback(_retrieve_exception)
+    task.cancel()
 
 
 class DataVisualizerManager:
     """
     Manager class for DataVisualizer instances.
-    Maintains a registry of visualizers by session ID.
+    Maintains a bounded registry of visualizers by session ID.
     """
     
-    def __init__(self):
-        """Initialize the manager with an empty registry."""
-        self.visualizers: Dict[str, DataVisualizer] = {}
+    def __init__(
+        self,
+        speculative_sql: Optional[bool] = None,
+        session_store: Optional[SessionStore] = None,
+        snapshot_store: Optional[SnapshotStore] = None
+    ):
+        """
+        Initialize the manager with an empty registry.
+
+        Args:
+            session_store: Store holding the visualizers; defaults to a SessionStore
+                configured from INSIGHT_MAX_SESSIONS / INSIGHT_SESSION_MAX_BYTES /
+                INSIGHT_SESSION_IDLE_TTL
+            speculative_sql: Run intent and SQL generation concurrently when the
+                intent needs the LLM; defaults to INSIGHT_SPECULATIVE_SQL=1.
+                Trades extra tokens (discarded SQL) for roughly one round trip less latency.
+            snapshot_store: Store that persists sessions after each turn so they survive
+                cold starts; defaults to INSIGHT_SESSION_SNAPSHOTS=sqlite (off otherwise)
+        """
+        self.visualizers = session_store if session_store is not None else SessionStore()
+        self.snapshots = snapshot_store if snapshot_store is not None else create_snapshot_store()
+        # 快照写入都交给单个后台线程，按提交顺序执行；淘汰回调只排队不等待SQLite
+        self._snapshot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-writer")
+        # session_id -> 已排队但尚未写入的淘汰快照（None表示待删除）
+        self._pending_snapshots: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._pending_lock = threading.Lock()
+        if self.snapshots is not None:
+            self.visualizers.add_eviction_listener(self._on_evict)
+        # Per-session locks + single-flight coalescing for the async paths
+        self.coordinator = RequestCoordinator()
+        if speculative_sql is None:
+            speculative_sql = os.getenv("INSIGHT_SPECULATIVE_SQL", "0") == "1"
+        self.speculative_sql = speculative_sql
+        self._stats_lock = threading.Lock()
+        self.speculation_stats = {"started": 0, "used": 0, "discarded": 0}
     
+    @tracer.traced("get_visualizer")
     def get_visualizer(self, session_id: Optional[str] = None) -> DataVisualizer:
         """
         Get an existing visualizer by ID or create a new one.
@@ -28,13 +88,84 @@ class DataVisualizerManager:
         Returns:
             DataVisualizer: The requested or newly created visualizer
         """
-        if session_id and session_id in self.visualizers:
-            return self.visualizers[session_id]
+        if session_id:
+            visualizer = self.visualizers.get(session_id) or self._hydrate(session_id)
+            if visualizer is not None:
+                return visualizer
         
         # Create new visualizer with provided ID or auto-generated ID
         visualizer = DataVisualizer(session_id=session_id)
-        self.visualizers[visualizer.session_id] = visualizer
+        self.visualizers.put(visualizer.session_id, visualizer)
+        return visualizer
+
+    def find_visualizer(self, session_id: str) -> Optional[DataVisualizer]:
+        """
+        Get an existing visualizer without creating one for unknown session IDs.
+        """
+        return self.visualizers.get(session_id) or self._hydrate(session_id)
+
+    def _hydrate(self, session_id: str) -> Optional[DataVisualizer]:
+        """
+        Rebuild a session that is not resident from its snapshot, e.g. after a
+        cold start or on another instance. Returns None when there is none.
+        """
+        if self.snapshots is None:
+            return None
+        start = time.perf_counter()
+        with self._pending_lock:
+            pending = session_id in self._pending_snapshots
+            snapshot = self._pending_snapshots.get(session_id)
+        if not pending:
+            snapshot = self.snapshots.load(session_id)
+        if snapshot is None:
+            return None
+        try:
+            visualizer = DataVisualizer.from_snapshot(snapshot)
+        except (KeyError, TypeError, ValueError):
+            # 快照格式不兼容时按新会话处理
+            return None
+        self.visualizers.put(session_id, visualizer)
+        elapsed = time.perf_counter() - start
+        self.snapshots.record_hydration(elapsed)
+        metrics.observe("hydrate", elapsed)
         return visualizer
+
+    def _save(self, visualizer: DataVisualizer) -> None:
+        """Snapshot a session after a turn."""
+        if self.snapshots is not None:
+            self._snapshot_writer.submit(
+                self.snapshots.save, visualizer.session_id, visualizer.to_snapshot()
+            ).result()
+
+    async def _asave(self, visualizer: DataVisualizer) -> None:
+        """Async counterpart of _save; the state is captured on the loop, encoding and the write run on the writer thread."""
+        if self.snapshots is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self._snapshot_writer, self.snapshots.save, visualizer.session_id, visualizer.to_snapshot()
+            )
+
+    def _on_evict(self, session_id: str, visualizer: DataVisualizer, reason: str) -> None:
+        """
+        Queue the snapshot write (or delete) of an evicted session without waiting
+        for it: evictions run inside SessionStore.get/put, often on the event loop.
+        """
+        # LRU/TTL淘汰的会话可能在上次保存后被裁剪过，淘汰前再写一次
+        snapshot = None if reason == "removed" else visualizer.to_snapshot()
+        with self._pending_lock:
+            self._pending_snapshots[session_id] = snapshot
+        self._snapshot_writer.submit(self._write_evicted, session_id, snapshot)
+
+    def _write_evicted(self, session_id: str, snapshot: Optional[Dict[str, Any]]) -> None:
+        try:
+            if snapshot is None:
+                self.snapshots.delete(session_id)
+            else:
+                self.snapshots.save(session_id, snapshot)
+        finally:
+            with self._pending_lock:
+                # 之后又排队了同一会话的写入时保留较新的那条
+                if session_id in self._pending_snapshots and self._pending_snapshots[session_id] is snapshot:
+                    del self._pending_snapshots[session_id]
     
     def remove_visualizer(self, session_id: str) -> bool:
         """
@@ -46,10 +177,7 @@ class DataVisualizerManager:
         Returns:
             bool: True if removed, False if not found
         """
-        if session_id in self.visualizers:
-            del self.visualizers[session_id]
-            return True
-        return False
+        return self.visualizers.remove(session_id)
 
     def generate_create_table_sql(
         self,
@@ -62,7 +190,29 @@ class DataVisualizerManager:
         Generate schema using a specific visualizer instance.
         """
         visualizer = self.get_visualizer(session_id)
-        return visualizer.generate_create_table_sql(query, datasource, **kwargs)
+        result = visualizer.generate_create_table_sql(query, datasource, **kwargs)
+        self._save(visualizer)
+        return result
+
+    async def agenerate_create_table_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of generate_create_table_sql.
+        """
+        async def run():
+            visualizer = self.get_visualizer(session_id)
+            result = await visualizer.agenerate_create_table_sql(query, datasource, **kwargs)
+            await self._asave(visualizer)
+            return result
+
+        key = request_key("schema", session_id, query, datasource, kwargs)
+        with tracer.span("manager", stage="schema", session_id=session_id):
+            return await self.coordinator.run(session_id, key, run)
 
     def generate_sql(
         self,
@@ -87,19 +237,63 @@ class DataVisualizerManager:
         visualizer = self.get_visualizer(session_id)
         intent = visualizer.generate_intent(query)
         if intent == "yes":
-            return visualizer.generate_sql(query, datasource, **kwargs)
+            result = visualizer.generate_sql(query, datasource, **kwargs)
         else:
             sql = visualizer.get_sql_query()
             print("sql", sql)
-            return {
+            result = {
                 "query": sql,
                 "explanation": intent
             }
-            
-        
+        self._save(visualizer)
+        return result
+
+    async def agenerate_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of generate_sql; the intent and SQL calls use ainvoke
+        so the event loop keeps serving other requests while waiting on the LLM.
+        Requests for the same session run one at a time, and identical concurrent
+        requests (double clicks, client retries) share one computation.
+        """
+        async def run():
+            visualizer = self.get_visualizer(session_id)
+            result = await self._arun_sql(visualizer, query, datasource, **kwargs)
+            await self._asave(visualizer)
+            return result
+
+        key = request_key("sql", session_id, query, datasource, kwargs)
+        # 包含会话锁等待和重复请求合并的耗时
+        with tracer.span("manager", stage="sql", session_id=session_id):
+            return await self.coordinator.run(session_id, key, run)
+
+    async def _arun_sql(
+        self,
+        visualizer: DataVisualizer,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> Dict[str, Any]:
+        if self.speculative_sql and visualizer.intent_needs_llm(query):
+            return await self._aspeculative_sql(visualizer, query, datasource, **kwargs)
+
+        intent = await visualizer.agenerate_intent(query)
+        if intent == "yes":
+            return await visualizer.agenerate_sql(query, datasource, **kwargs)
+        else:
+            return {
+                "query": visualizer.get_sql_query(),
+                "explanation": intent
+            }
+
     def generate_chart_config(
         self,
-        data: List[Dict[str, Any]],
+        data: ChartData,
         query: str,
         session_id: Optional[str] = None,
         **kwargs
@@ -118,9 +312,164 @@ class DataVisualizerManager:
             Dict[str, Any]: Chart configuration compatible with visualization libraries
         """
         visualizer = self.get_visualizer(session_id)
-        return visualizer.generate_chart_config(data, query, **kwargs)
+        result = visualizer.generate_chart_config(data, query, **kwargs)
+        self._save(visualizer)
+        return result
+
+    async def astream_sql(
+        self,
+        query: str,
+        datasource: DataSource,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming counterpart of agenerate_sql: yields ("partial", dict) events
+        followed by a single ("result", dict) with the agenerate_sql payload.
+        Streams hold the session lock but are not coalesced.
+        """
+        async with self.coordinator.locks.hold(session_id):
+            visualizer = self.get_visualizer(session_id)
+            intent = await visualizer.agenerate_intent(query)
+            if intent == "yes":
+                async for event in visualizer.astream_sql(query, datasource, **kwargs):
+                    yield event
+            else:
+                yield "result", {
+                    "query": visualizer.get_sql_query(),
+                    "explanation": intent
+                }
+            await self._asave(visualizer)
+
+    async def _aspeculative_sql(
+        self,
+        visualizer: DataVisualizer,
+        query: str,
+        datasource: DataSource,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Start intent and SQL generation together. The SQL result is only committed
+        to session history when intent comes back "yes"; otherwise it is cancelled.
+        """
+        self._count_speculation("started")
+        sql_task = asyncio.create_task(visualizer.aspeculate_sql(query, datasource, **kwargs))
+        try:
+            intent = await visualizer.agenerate_intent(query)
+        except BaseException:
+            _discard_task(sql_task)
+            raise
+
+        if intent == "yes":
+            result = await sql_task
+            self._count_speculation("used")
+            return visualizer.commit_sql(query, result)
+
+        _discard_task(sql_task)
+        self._count_speculation("discarded")
+        return {
+            "query": visualizer.get_sql_query(),
+            "explanation": intent
+        }
+
+    def _count_speculation(self, name: str) -> None:
+        with self._stats_lock:
+            self.speculation_stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get manager statistics: session store counters and speculative SQL outcomes.
+        """
+        with self._stats_lock:
+            speculation = dict(self.speculation_stats)
+        return {
+            "sessions": self.visualizers.get_stats(),
+            "concurrency": self.coordinator.get_stats(),
+            "speculative_sql": self.speculative_sql,
+            "speculation": speculation,
+            "snapshots": self.snapshots.get_stats() if self.snapshots is not None else None
+        }
+
+    def close(self) -> None:
+        """Flush queued snapshot writes and release the snapshot store."""
+        self._snapshot_writer.shutdown(wait=True)
+        if self.snapshots is not None:
+            self.snapshots.close()
+
+    async def agenerate_chart_config(
+        self,
+        data: ChartData,
+        query: str,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of generate_chart_config.
+        """
+        async def run():
+            visualizer = self.get_visualizer(session_id)
+            result = await visualizer.agenerate_chart_config(data, query, **kwargs)
+            await self._asave(visualizer)
+            return result
+
+        # 大数据集只取抽样指纹参与去重键计算
+        key = request_key("chart", session_id, query, data_fingerprint(data), kwargs)
+        with tracer.span("manager", stage="chart", session_id=session_id):
+            return await self.coordinator.run(session_id, key, run)
+
+    async def astream_chart_config(
+        self,
+        data: ChartData,
+        query: str,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming counterpart of agenerate_chart_config.
+        """
+        async with self.coordinator.locks.hold(session_id):
+            visualizer = self.get_visualizer(session_id)
+            async for event in visualizer.astream_chart_config(data, query, **kwargs):
+                yield event
+            await self._asave(visualizer)
+
+    async def agenerate_chart_configs(
+        self,
+        items: List[Dict[str, Any]],
+        max_concurrency: int = 4
+    ) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """
+        Generate chart configurations for many items with bounded concurrency.
 
-    def get_messages(self, session_id: str) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        Args:
+            items: Dicts with data, query and session_id
+            max_concurrency: Maximum number of in-flight LLM calls
+
+        Yields:
+            (index, result, error) for each item as soon as it completes
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run(index: int, item: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    result = await self.agenerate_chart_config(
+                        item["data"], item["query"], item.get("session_id")
+                    )
+                    return index, result, None
+                except Exception as e:
+                    return index, None, e
+
+        tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            # 客户端断开时取消尚未完成的任务
+            for task in tasks:
+                task.cancel()
+
+    def get_messages(self, session_id: str) -> Tuple[List["BaseMessage"], List["BaseMessage"]]:
         """
         Get the SQL and chart messages for a specific session.
         
@@ -130,19 +479,24 @@ class DataVisualizerManager:
         Returns:
             Tuple[List[BaseMessage], List[BaseMessage]]: SQL and chart messages
         """
-        visualizer = self.get_visualizer(session_id)
+        # 只读接口不为未知的session_id创建会话
+        visualizer = self.find_visualizer(session_id)
+        if visualizer is None:
+            return [], []
         return visualizer.get_messages()
     
     def get_sql_query(self, session_id: str) -> str:
         """
         Get the SQL query for a specific session.
         """
-        visualizer = self.get_visualizer(session_id)
-        return visualizer.get_sql_query()
+        visualizer = self.find_visualizer(session_id)
+        return visualizer.get_sql_query() if visualizer else ""
     
 
 # Global manager instance for convenience
 visualizer_manager = DataVisualizerManager()
+# 会话数在/metrics抓取时读取，不在每次创建/淘汰时更新
+metrics.track_sessions(lambda: len(visualizer_manager.visualizers))
 
 
 def  generate_create_table_sql(
@@ -157,11 +511,23 @@ def  generate_create_table_sql(
     return visualizer_manager.generate_create_table_sql(query, datasource, session_id, **kwargs)
 
 
+async def agenerate_create_table_sql(
+    query: str,
+    datasource: DataSource,
+    session_id: Optional[str] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Async counterpart of generate_create_table_sql.
+    """
+    return await visualizer_manager.agenerate_create_table_sql(query, datasource, session_id, **kwargs)
+
+
 def generate_sql(
     query: str,
     datasource: DataSource,
     session_id: Optional[str] = None,
-    messages: Optional[List[BaseMessage]] = None,
+    messages: Optional[List["BaseMessage"]] = None,
     **kwargs
 ) -> Dict[str, Any]:
     """
@@ -180,8 +546,20 @@ def generate_sql(
     return visualizer_manager.generate_sql(query, datasource, session_id, **kwargs)
 
 
+async def agenerate_sql(
+    query: str,
+    datasource: DataSource,
+    session_id: Optional[str] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Async counterpart of generate_sql.
+    """
+    return await visualizer_manager.agenerate_sql(query, datasource, session_id, **kwargs)
+
+
 def generate_chart_config(
-    data: List[Dict[str, Any]],
+    data: ChartData,
     query: str,
     session_id: Optional[str] = None,
     **kwargs
@@ -202,13 +580,95 @@ def generate_chart_config(
     return visualizer_manager.generate_chart_config(data, query, session_id, **kwargs)
 
 
-def get_messages(session_id: str) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+async def agenerate_chart_config(
+    data: ChartData,
+    query: str,
+    session_id: Optional[str] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Async counterpart of generate_chart_config.
+    """
+    return await visualizer_manager.agenerate_chart_config(data, query, session_id, **kwargs)
+
+
+def astream_sql(
+    query: str,
+    datasource: DataSource,
+    session_id: Optional[str] = None,
+    **kwargs
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream SQL generation as ("partial", dict) events and a final ("result", dict).
+    """
+    return visualizer_manager.astream_sql(query, datasource, session_id, **kwargs)
+
+
+def astream_chart_config(
+    data: ChartData,
+    query: str,
+    session_id: Optional[str] = None,
+    **kwargs
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream chart configuration as ("partial", dict) events and a final ("result", dict).
+    """
+    return visualizer_manager.astream_chart_config(data, query, session_id, **kwargs)
+
+
+def agenerate_chart_configs(
+    items: List[Dict[str, Any]],
+    max_concurrency: int = 4
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Generate chart configurations for a batch, yielding (index, result, error) as items complete.
+    """
+    return visualizer_manager.agenerate_chart_configs(items, max_concurrency)
+
+
+def get_messages(session_id: str) -> Tuple[List["BaseMessage"], List["BaseMessage"]]:
     """
     Get the SQL and chart messages for a specific session.
     """
     return visualizer_manager.get_messages(session_id)
 
 
+def get_manager_stats() -> Dict[str, Any]:
+    """
+    Get session and speculative execution statistics of the global manager.
+    """
+    return visualizer_manager.get_stats()
+
+
+
+def close_manager() -> None:
+    """
+    Release resources held by the global manager at shutdown.
+    """
+    visualizer_manager.close()
+
+
+def prewarm() -> None:
+    """
+    Do the work the first request would otherwise pay for: import the LLM
+    client stack, build the pooled clients and every stage chain, and load the
+    SQL validator. Runs in a background thread at startup when INSIGHT_PREWARM=1.
+    """
+    from chainCache import chain_cache
+    from llmRegistry import llm_registry
+    from sqlValidator import validate_sql
+
+    start = time.perf_counter()
+    llm_registry.warm_up()
+    model_name = os.getenv("BASE_MODEL_NAME")
+    for stage in SESSION_STAGES:
+        chain_cache.get(stage, model_name)
+    # 只有SQL和图表阶段提供流式接口
+    for stage in ("sql", "chart"):
+        chain_cache.get_stream(stage, model_name)
+    validate_sql("SELECT 1")
+    metrics.observe("prewarm", time.perf_counter() - start)
+
 if __name__ == "__main__":
     # 测试
     # 创建测试数据源
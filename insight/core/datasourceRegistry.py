@@ -0,0 +1,151 @@
+# Registry of datasources addressed by content hash, with pre-rendered prompt blocks
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from interfaces import DataSource
+
+
+DEFAULT_MAX_DATASOURCES = int(os.getenv("INSIGHT_MAX_DATASOURCES", "1000"))
+ID_PREFIX = "ds_"
+
+
+def datasource_id(datasource: DataSource) -> str:
+    """
+    Content-hash ID of a datasource: identical definitions always map to the same ID.
+
+    Args:
+        datasource: The datasource definition
+
+    Returns:
+        str: "ds_" followed by 24 hex chars of the sha256 of its canonical JSON
+    """
+    raw = json.dumps(asdict(datasource), sort_keys=True, ensure_ascii=False, default=str)
+    return ID_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def render_blocks(datasource: DataSource) -> Dict[str, str]:
+    """
+    Render the per-stage prompt fragments for a datasource.
+
+    Returns:
+        Dict[str, str]: stage name -> text substituted for `{datasource}` in the stage template
+    """
+    # 与原模板中逐字段替换的结果一致（非字符串字段按 str() 渲染）
+    example_data = f"Example Data:\n{datasource.example_data}"
+    special_fields = f"Special Fields:\n{datasource.special_fields}"
+    return {
+        "schema": f"{example_data}\n\n{special_fields}",
+        "sql": f"Table Schema:\n{datasource.schema}\n\n{example_data}\n\n{special_fields}",
+    }
+
+
+@dataclass
+class RegisteredDataSource:
+    """A datasource together with its content-hash ID and rendered prompt blocks."""
+    id: str
+    datasource: DataSource
+    blocks: Dict[str, str]
+
+    @property
+    def bytes(self) -> int:
+        return sum(len(block.encode("utf-8")) for block in self.blocks.values())
+
+
+def build_entry(datasource: DataSource) -> RegisteredDataSource:
+    return RegisteredDataSource(datasource_id(datasource), datasource, render_blocks(datasource))
+
+
+class DataSourceRegistry:
+    """
+    Bounded LRU of registered datasources.
+
+    Clients register a datasource once and then reference it by ID; the parsed
+    DataSource and its rendered prompt blocks are reused by every request.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_DATASOURCES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, RegisteredDataSource]" = OrderedDict()
+        # id(DataSource) -> datasource_id，用于识别已注册的实例而无需重新计算哈希
+        self._by_object: Dict[int, str] = {}
+        self.registrations = 0
+        self.evictions = 0
+        self.render_hits = 0
+        self.render_misses = 0
+
+    def register(self, datasource: DataSource) -> Tuple[RegisteredDataSource, bool]:
+        """
+        Register a datasource (idempotent).
+
+        Returns:
+            Tuple[RegisteredDataSource, bool]: The entry and whether it was newly created
+        """
+        entry = build_entry(datasource)
+        with self._lock:
+            existing = self._entries.get(entry.id)
+            if existing is not None:
+                self._entries.move_to_end(entry.id)
+                return existing, False
+            self._entries[entry.id] = entry
+            self._by_object[id(datasource)] = entry.id
+            self.registrations += 1
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._by_object.pop(id(evicted.datasource), None)
+                self.evictions += 1
+            return entry, True
+
+    def get(self, ds_id: str) -> Optional[RegisteredDataSource]:
+        """Return the registered entry for an ID, or None if unknown/evicted."""
+        with self._lock:
+            entry = self._entries.get(ds_id)
+            if entry is not None:
+                self._entries.move_to_end(ds_id)
+            return entry
+
+    def remove(self, ds_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(ds_id, None)
+            if entry is None:
+                return False
+            self._by_object.pop(id(entry.datasource), None)
+            return True
+
+    def prompt_context(self, datasource: DataSource) -> RegisteredDataSource:
+        """
+        Return the ID and rendered blocks for a datasource. Registered instances
+        are served from the registry; inline datasources are rendered on the fly.
+        """
+        ds_id = self._by_object.get(id(datasource))
+        if ds_id is not None:
+            entry = self._entries.get(ds_id)
+            if entry is not None and entry.datasource is datasource:
+                self.render_hits += 1
+                return entry
+        self.render_misses += 1
+        return build_entry(datasource)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "registered": len(self._entries),
+                "bytes": sum(entry.bytes for entry in self._entries.values()),
+                "registrations": self.registrations,
+                "evictions": self.evictions,
+                "render_hits": self.render_hits,
+                "render_misses": self.render_misses,
+                "max_entries": self.max_entries,
+            }
+
+
+# Global registry shared by all sessions
+datasource_registry = DataSourceRegistry()
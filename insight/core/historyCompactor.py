@@ -0,0 +1,104 @@
+# Token-budgeted chat history with an incrementally maintained rendered string
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+
+# 每条消息的固定开销（角色标记、换行等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 各阶段历史记录的token预算，可通过环境变量覆盖
+DEFAULT_STAGE_BUDGETS: Dict[str, int] = {
+    "intent": int(os.getenv("INSIGHT_HISTORY_BUDGET_INTENT", "800")),
+    "sql": int(os.getenv("INSIGHT_HISTORY_BUDGET_SQL", "2000")),
+    "chart": int(os.getenv("INSIGHT_HISTORY_BUDGET_CHART", "2000")),
+    "schema": int(os.getenv("INSIGHT_HISTORY_BUDGET_SCHEMA", "2000")),
+}
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the token count of a message without a tokenizer round trip.
+    CJK characters are roughly one token each; other text averages ~4 chars per token.
+
+    Args:
+        text: Message text
+
+    Returns:
+        int: Estimated token count including per-message overhead
+    """
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class CompactHistory:
+    """
+    Rolling window of "Role: content" lines kept under a token budget.
+    The most recent message is always kept. The rendered string is updated in
+    place on append/evict, so adding a turn never re-renders the whole history.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._lines: Deque[Tuple[str, int]] = deque()
+        self._tokens = 0
+        self._rendered = ""
+
+    def append(self, role: str, content: str) -> None:
+        line = f"{role}: {content}"
+        tokens = count_tokens(line)
+        self._lines.append((line, tokens))
+        self._tokens += tokens
+        self._rendered = f"{self._rendered}\n{line}" if len(self._lines) > 1 else line
+
+        while self._tokens > self.budget and len(self._lines) > 1:
+            old_line, old_tokens = self._lines.popleft()
+            self._tokens -= old_tokens
+            self._rendered = self._rendered[len(old_line) + 1:]
+
+    def render(self) -> str:
+        return self._rendered
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def keep_last(self, count: int) -> None:
+        """Drop the oldest lines until at most `count` remain."""
+        while len(self._lines) > max(count, 0):
+            old_line, old_tokens = self._lines.popleft()
+            self._tokens -= old_tokens
+            self._rendered = self._rendered[len(old_line) + 1:]
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._tokens = 0
+        self._rendered = ""
+
+    def to_snapshot(self) -> List[Tuple[str, int]]:
+        """Return the kept (line, tokens) pairs; token counts are stored so restoring skips re-counting."""
+        return list(self._lines)
+
+    @classmethod
+    def from_snapshot(cls, budget: int, lines: List[Tuple[str, int]]) -> "CompactHistory":
+        """Rebuild a history from to_snapshot() output, re-applying the (possibly changed) budget."""
+        history = cls(budget)
+        history._lines = deque((line, tokens) for line, tokens in lines)
+        history._tokens = sum(tokens for _, tokens in history._lines)
+        while history._tokens > budget and len(history._lines) > 1:
+            history._tokens -= history._lines.popleft()[1]
+        history._rendered = "\n".join(line for line, _ in history._lines)
+        return history
+
+
+def create_stage_histories(budgets: Dict[str, int] = None) -> Dict[str, CompactHistory]:
+    """Create one CompactHistory per stage using the configured token budgets."""
+    budgets = budgets or DEFAULT_STAGE_BUDGETS
+    return {stage: CompactHistory(budget) for stage, budget in budgets.items()}
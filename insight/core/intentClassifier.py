@@ -0,0 +1,144 @@
+# Local fast-path intent classifier in front of the LLM intent stage
+import os
+import random
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
+
+
+CONFIDENCE_THRESHOLD = float(os.getenv("INSIGHT_INTENT_CONFIDENCE", "0.75"))
+# 对本地高置信度判断按比例抽样调用LLM，用于统计一致率（0表示关闭）
+SHADOW_RATE = float(os.getenv("INSIGHT_INTENT_SHADOW_RATE", "0"))
+
+# Lexicon of (pattern, weight). "no" = chart-only edit, "yes" = data must be re-queried.
+CHART_LEXICON: List[Tuple[str, float]] = [
+    (r"柱状图|条形图|折线图|饼图|面积图|散点图|雷达图|环形图|直方图|堆叠图?", 2.0),
+    (r"图表|图形|图例|标题|坐标轴?|横轴|纵轴|[xy]轴|刻度|标签|配色|主题|字体|样式|排版", 1.5),
+    (r"(红|橙|黄|绿|青|蓝|紫|粉|灰|黑|白|金|银)色|颜色|色系|渐变|深色|浅色|亮色|暗色", 2.0),
+    (r"\b(bar|line|pie|area|scatter|radar|legend|colou?r|title|chart|theme)\b", 1.5),
+    (r"显示|隐藏|去掉|加上|放大|缩小|好看|美观", 0.5),
+]
+DATA_LEXICON: List[Tuple[str, float]] = [
+    (r"查询|查一下|查看|筛选|过滤|排除|只看|只要|统计|汇总|分组|排序|排名", 2.0),
+    (r"\d{4}\s*年|今年|去年|前年|本月|上月|上个月|本周|上周|季度|最近\s*\d*\s*(天|周|月|年)|近\s*\d+", 2.0),
+    (r"每个|每一|按照?|总和|总数|合计|平均|均值|最大|最小|最高|最低|占比|比例|增长|同比|环比", 1.5),
+    (r"前\s*\d+|top\s*\d+|多少|数量|字段|数据|条件|范围|明细", 1.0),
+    (r"\b(select|where|group\s+by|order\s+by|join|sql)\b", 2.0),
+]
+# 明确的"只改图表"句式，如"改成柱状图""换成蓝色"
+CHART_EDIT_RE = re.compile(
+    r"^(请|帮我|麻烦)?\s*(把|将)?\s*(图表?|它|颜色)?\s*(改成|换成|变成|改为|换为|切换成?|用)\s*.{0,6}"
+    r"(柱状图|条形图|折线图|饼图|面积图|散点图|雷达图|色|颜色|主题)\s*(吧|呢)?[。!！.]*$"
+)
+
+_CHART = [(re.compile(p, re.IGNORECASE), w) for p, w in CHART_LEXICON]
+_DATA = [(re.compile(p, re.IGNORECASE), w) for p, w in DATA_LEXICON]
+
+
+@dataclass
+class IntentDecision:
+    """Local classifier output: intent is 'yes' (re-generate SQL) or 'no' (chart-only)."""
+    intent: str
+    confidence: float
+    reason: str
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= CONFIDENCE_THRESHOLD
+
+
+def _score(query: str, lexicon) -> Tuple[float, List[str]]:
+    score = 0.0
+    hits = []
+    for pattern, weight in lexicon:
+        matches = pattern.findall(query)
+        if matches:
+            score += weight * len(matches)
+            hits.append(pattern.search(query).group(0))
+    return score, hits
+
+
+def classify_intent(query: str) -> IntentDecision:
+    """
+    Classify a follow-up query with rules and a weighted lexicon.
+
+    Args:
+        query: The user's follow-up input
+
+    Returns:
+        IntentDecision: Local decision with a confidence in [0, 1]
+    """
+    text = query.strip()
+    chart_score, chart_hits = _score(text, _CHART)
+    data_score, data_hits = _score(text, _DATA)
+
+    if CHART_EDIT_RE.match(text) and not data_hits:
+        return IntentDecision("no", 0.95, f"local rule: chart edit ({', '.join(chart_hits)})")
+
+    total = chart_score + data_score
+    if total == 0:
+        return IntentDecision("yes", 0.0, "local lexicon: no signal")
+
+    # 置信度 = 分差占比，并按总信号强度缩放（信号弱时不自信）
+    margin = abs(chart_score - data_score) / total
+    strength = min(total / 4.0, 1.0)
+    confidence = round(margin * strength, 4)
+    if chart_score > data_score:
+        return IntentDecision("no", confidence, f"local lexicon: chart terms ({', '.join(chart_hits)})")
+    return IntentDecision("yes", confidence, f"local lexicon: data terms ({', '.join(data_hits)})")
+
+
+class IntentClassifierStats:
+    """Hit-rate and agreement counters for the local classifier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.fallbacks = 0
+        self.compared = 0
+        self.agreements = 0
+        self.shadow_compared = 0
+        self.shadow_agreements = 0
+
+    def record_local(self) -> None:
+        with self._lock:
+            self.local_hits += 1
+
+    def record_fallback(self, decision: IntentDecision, llm_intent: str) -> None:
+        """Count an LLM fallback and whether the low-confidence local guess agreed."""
+        with self._lock:
+            self.fallbacks += 1
+            self.compared += 1
+            self.agreements += decision.intent == llm_intent
+
+    def record_shadow(self, decision: IntentDecision, llm_intent: str) -> None:
+        """Count a sampled LLM check of a confident local decision."""
+        with self._lock:
+            self.shadow_compared += 1
+            self.shadow_agreements += decision.intent == llm_intent
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.local_hits + self.fallbacks
+            return {
+                "local_hits": self.local_hits,
+                "fallbacks": self.fallbacks,
+                "hit_rate": round(self.local_hits / total, 4) if total else 0.0,
+                "fallback_agreement": round(self.agreements / self.compared, 4) if self.compared else None,
+                "shadow_checks": self.shadow_compared,
+                "shadow_agreement": (
+                    round(self.shadow_agreements / self.shadow_compared, 4) if self.shadow_compared else None
+                ),
+                "confidence_threshold": CONFIDENCE_THRESHOLD,
+                "shadow_rate": SHADOW_RATE,
+            }
+
+
+# Global stats shared by all DataVisualizer instances
+intent_stats = IntentClassifierStats()
+
+
+def should_shadow() -> bool:
+    """Whether a confident local decision should also be checked against the LLM."""
+    return SHADOW_RATE > 0 and random.random() < SHADOW_RATE
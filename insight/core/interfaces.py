@@ -11,3 +11,21 @@ class DataSource:
     special_fields: Optional[Dict[str, Any]] = None  # Any special fields or constraints
 
 
+
+
+@dataclass
+class ColumnarData:
+    """Column-oriented chart data: values[i] holds every value of columns[i]."""
+    columns: List[str]
+    values: List[List[Any]]
+
+    def __len__(self) -> int:
+        return len(self.values[0]) if self.values else 0
+
+    def as_dict(self) -> Dict[str, List[Any]]:
+        """Column name to value array (no copies)."""
+        return dict(zip(self.columns, self.values))
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """Row-oriented view, for code paths that need List[Dict]."""
+        return [dict(zip(self.columns, row)) for row in zip(*self.values)]
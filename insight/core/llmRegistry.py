@@ -0,0 +1,226 @@
+# Process-wide registry of pooled LLM clients shared by every DataVisualizer
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    # langchain_deepseek拉起openai SDK，导入较慢；首次创建客户端时再导入
+    from langchain_deepseek import ChatDeepSeek
+
+from serviceMetrics import cassette_transports
+
+
+# 连接池配置，可通过环境变量调整
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+
+RegistryKey = Tuple[Optional[str], Optional[str], float]
+
+
+class PoolStats:
+    """
+    Counters describing how the shared HTTP pools are used.
+    Connection reuse is measured from httpcore trace events: every request
+    that does not open a new TCP connection was served from the pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.registry_hits = 0
+        self.registry_misses = 0
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(self.requests - self.connections_opened, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "connections_reused": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+                "registry_hits": self.registry_hits,
+                "registry_misses": self.registry_misses,
+            }
+
+
+class LLMClientRegistry:
+    """
+    Registry of ChatDeepSeek clients keyed by (model, base_url, temperature).
+    All clients share one keep-alive sync pool and one async pool, so the
+    TCP/TLS setup cost is paid once per connection instead of once per call.
+
+    Args:
+        transports: Optional (sync, async) httpx transports for the pools;
+            defaults to the LLM cassette transports when LLM_CASSETTE_MODE is set
+    """
+
+    def __init__(self, transports: Optional[Tuple[Any, Any]] = None):
+        if transports is None:
+            transports = cassette_transports()
+        self._transport, self._async_transport = transports
+        self._lock = threading.Lock()
+        self._clients: Dict[RegistryKey, "ChatDeepSeek"] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self.stats = PoolStats()
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.incr("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self.stats.incr("tls_handshakes")
+
+    async def _atrace(self, event_name: str, info: Dict[str, Any]) -> None:
+        self._trace(event_name, info)
+
+    def _on_request(self, request: httpx.Request) -> None:
+        self.stats.incr("requests")
+        request.extensions["trace"] = self._trace
+
+    async def _aon_request(self, request: httpx.Request) -> None:
+        self.stats.incr("requests")
+        request.extensions["trace"] = self._atrace
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+
+    def _get_http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        # 调用方已持有 self._lock
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                limits=self._limits(),
+                timeout=REQUEST_TIMEOUT,
+                event_hooks={"request": [self._on_request]},
+                transport=self._transport,
+            )
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=REQUEST_TIMEOUT,
+                event_hooks={"request": [self._aon_request]},
+                transport=self._async_transport,
+            )
+        return self._http_client, self._http_async_client
+
+    def get(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        temperature: float = 0,
+    ) -> "ChatDeepSeek":
+        """
+        Get the shared client for (model, base_url, temperature), creating it on first use.
+
+        Args:
+            model: Model name, defaults to BASE_MODEL_NAME
+            base_url: API base url, defaults to DEEPSEEK_BASE_URL
+            temperature: Sampling temperature
+
+        Returns:
+            ChatDeepSeek: A client backed by the shared connection pools
+        """
+        model = model or os.getenv("BASE_MODEL_NAME")
+        base_url = base_url or os.getenv("DEEPSEEK_BASE_URL")
+        key = (model, base_url, float(temperature))
+
+        client = self._clients.get(key)
+        if client is not None:
+            self.stats.incr("registry_hits")
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                from langchain_deepseek import ChatDeepSeek
+
+                http_client, http_async_client = self._get_http_clients()
+                client = ChatDeepSeek(
+                    model=model,
+                    api_base=base_url,
+                    temperature=temperature,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    # 流式响应的最后一块携带token用量（含缓存命中数）
+                    stream_usage=True,
+                )
+                self._clients[key] = client
+                self.stats.incr("registry_misses")
+            else:
+                self.stats.incr("registry_hits")
+        return client
+
+    def warm_up(self, preconnect: Optional[bool] = None) -> None:
+        """
+        Build the default client at startup. With preconnect (or LLM_PRECONNECT=1)
+        a lightweight request is sent so the first user request finds an
+        established TLS connection in the pool.
+        """
+        self.get()
+        if preconnect is None:
+            preconnect = os.getenv("LLM_PRECONNECT", "0") == "1"
+        base_url = os.getenv("DEEPSEEK_BASE_URL")
+        if not preconnect or not base_url:
+            return
+        try:
+            self._http_client.get(base_url, timeout=5)
+        except httpx.HTTPError:
+            # 预连接失败不影响服务启动
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return registry and connection pool statistics."""
+        stats = self.stats.snapshot()
+        stats["clients"] = len(self._clients)
+        stats["pool"] = {
+            "max_connections": MAX_CONNECTIONS,
+            "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": KEEPALIVE_EXPIRY,
+        }
+        return stats
+
+    def close(self) -> None:
+        """Close the shared sync pool; the async pool is closed by aclose()."""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            self._clients.clear()
+
+    async def aclose(self) -> None:
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        self.close()
+
+
+# Global registry instance shared by all DataVisualizer instances
+llm_registry = LLMClientRegistry()
+
+
+def get_llm(
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    temperature: float = 0,
+) -> "ChatDeepSeek":
+    """Get a pooled ChatDeepSeek client from the global registry."""
+    return llm_registry.get(model, base_url, temperature)
+
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Get pool and connection reuse statistics from the global registry."""
+    return llm_registry.get_stats()
@@ -0,0 +1,171 @@
+"""
+Non-blocking structured request logging.
+
+Request handlers only append a record to a bounded in-memory queue. A
+background thread truncates large fields, serializes each record to a single
+JSON line and hands it to the writer (loguru in app.py). When the queue is
+full the oldest record is dropped, so a slow disk or a log burst never blocks
+the event loop; drops are counted and reported.
+"""
+import datetime
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from serialization import dumps
+
+
+DEFAULT_QUEUE_SIZE = int(os.getenv("INSIGHT_LOG_QUEUE_SIZE", "10000"))
+# 单个字段序列化后的最大字符数，超出部分截断
+DEFAULT_MAX_FIELD_CHARS = int(os.getenv("INSIGHT_LOG_MAX_FIELD_CHARS", "2000"))
+# 成功日志的采样率（1表示全部记录）；错误日志总是记录
+DEFAULT_SUCCESS_SAMPLE_RATE = float(os.getenv("INSIGHT_LOG_SUCCESS_SAMPLE", "1.0"))
+
+# writer(level, line)
+LogWriter = Callable[[str, str], None]
+# (level, event, message, data, timestamp)
+LogRecord = Tuple[str, str, str, Dict[str, Any], datetime.datetime]
+
+
+def truncate_field(value: Any, max_chars: int) -> Any:
+    """
+    Bound the serialized size of one log field. Short scalars are kept as-is;
+    long strings and large structures are replaced by a truncated string.
+    """
+    if max_chars <= 0 or value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        text = value
+    else:
+        try:
+            text = dumps(value).decode("utf-8")
+        except TypeError:
+            text = str(value)
+        if len(text) <= max_chars:
+            return value
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}…(+{len(text) - max_chars} chars)"
+
+
+def format_record(record: LogRecord, max_field_chars: int) -> str:
+    """Render a record as one compact JSON line."""
+    level, event, message, data, timestamp = record
+    line = {
+        "ts": timestamp.isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+        "msg": message,
+    }
+    for key, value in data.items():
+        line[key] = truncate_field(value, max_field_chars)
+    return dumps(line).decode("utf-8")
+
+
+class RequestLogger:
+    """
+    Bounded, drop-oldest log queue drained by a daemon writer thread.
+
+    Args:
+        writer: Called on the background thread with (level, line)
+        queue_size: Maximum number of pending records
+        max_field_chars: Per-field truncation limit
+        success_sample_rate: Fraction of INFO records that are kept
+    """
+
+    def __init__(
+        self,
+        writer: LogWriter,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_field_chars: int = DEFAULT_MAX_FIELD_CHARS,
+        success_sample_rate: float = DEFAULT_SUCCESS_SAMPLE_RATE
+    ):
+        self.writer = writer
+        self.max_field_chars = max_field_chars
+        self.success_sample_rate = success_sample_rate
+        self._queue: Deque[LogRecord] = deque(maxlen=max(1, queue_size))
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.write_errors = 0
+
+    def _ensure_thread(self) -> None:
+        # 首次写日志时才启动线程（调用方已持有锁）
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="request-logger", daemon=True)
+            self._thread.start()
+
+    def log(self, level: str, event: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Enqueue a record without blocking; the oldest record is dropped when full."""
+        if level == "INFO" and self.success_sample_rate < 1 and random.random() >= self.success_sample_rate:
+            self.sampled_out += 1
+            return
+        record = (level, event, message, data or {}, datetime.datetime.now())
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(record)
+            self.enqueued += 1
+            self._ensure_thread()
+            self._cond.notify()
+
+    def info(self, event: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+        self.log("INFO", event, message, data)
+
+    def error(self, event: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+        self.log("ERROR", event, message, data)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue and self._closed:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            for record in batch:
+                try:
+                    self.writer(record[0], format_record(record, self.max_field_chars))
+                    self.written += 1
+                except Exception:
+                    # 日志写入失败不能影响请求
+                    self.write_errors += 1
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued record has been written; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out pending records and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "write_errors": self.write_errors,
+            "pending": len(self._queue),
+            "queue_size": self._queue.maxlen,
+            "success_sample_rate": self.success_sample_rate,
+        }
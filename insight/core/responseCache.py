@@ -0,0 +1,252 @@
+# Optional response cache for LLM stages with LRU + TTL eviction and a SQLite backend
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from serviceMetrics import metrics
+
+
+DEFAULT_TTL = float(os.getenv("INSIGHT_RESPONSE_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("INSIGHT_RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+DEFAULT_PATH = os.getenv("INSIGHT_RESPONSE_CACHE_PATH", "cache/response_cache.sqlite3")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize whitespace so trivially different spellings share a cache entry.
+    Case is kept: "Apple" and "apple" can end up as different SQL literals.
+    """
+    return re.sub(r"\s+", " ", query or "").strip()
+
+
+def make_cache_key(stage: str, **parts: Any) -> str:
+    """
+    Build a stable cache key from the stage name and the prompt inputs.
+
+    Args:
+        stage: Generation stage (sql, schema, ...)
+        **parts: Prompt inputs; `query` is normalized and `history` is digested
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    payload = dict(parts)
+    if "query" in payload:
+        payload["query"] = normalize_query(payload["query"])
+    if "history" in payload:
+        payload["history"] = hashlib.sha256((payload["history"] or "").encode("utf-8")).hexdigest()
+    raw = json.dumps([stage, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store of (expires_at, value) entries."""
+
+    # 纯内存操作，可直接在事件循环中调用
+    blocking = False
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str, now: float) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Return (value, evicted) where evicted counts an expired entry dropped on read."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, 0
+            if entry[0] <= now:
+                del self._data[key]
+                return None, 1
+            self._data.move_to_end(key)
+            return entry[1], 0
+
+    def set(self, key: str, value: Dict[str, Any], expires_at: float) -> int:
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """On-disk store that survives restarts; LRU order is tracked with accessed_at."""
+
+    # 读写都要提交SQLite事务，异步路径中放到工作线程执行
+    blocking = True
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float) -> Tuple[Optional[Dict[str, Any]], int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, 0
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None, 1
+            self._conn.execute(
+                "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return json.loads(row[0]), 0
+
+    def set(self, key: str, value: Dict[str, Any], expires_at: float) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            cursor = self._conn.execute(
+                "DELETE FROM response_cache WHERE expires_at <= ? OR key IN ("
+                "SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_entries),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Cache of structured LLM outputs keyed by make_cache_key().
+    Disabled unless a backend is configured (INSIGHT_RESPONSE_CACHE=memory|sqlite).
+    """
+
+    def __init__(self, backend=None, ttl: float = DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        value, evicted = self.backend.get(key, time.time())
+        if evicted:
+            self._count("evictions", evicted)
+        self._count("hits" if value is not None else "misses")
+        metrics.record_cache("response", value is not None)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        evicted = self.backend.set(key, value, time.time() + self.ttl)
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """Async get; blocking backends run in a worker thread so the event loop keeps serving."""
+        if self.enabled and self.backend.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        """Async counterpart of set()."""
+        if self.enabled and self.backend.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.backend.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "entries": len(self.backend) if self.backend else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "ttl": self.ttl,
+        }
+
+
+def create_response_cache(kind: Optional[str] = None) -> ResponseCache:
+    """
+    Create a response cache from configuration.
+
+    Args:
+        kind: "memory", "sqlite" or "off"; defaults to INSIGHT_RESPONSE_CACHE
+
+    Returns:
+        ResponseCache: The configured cache (disabled for "off")
+    """
+    kind = (kind or os.getenv("INSIGHT_RESPONSE_CACHE", "off")).lower()
+    if kind == "memory":
+        return ResponseCache(MemoryBackend())
+    if kind == "sqlite":
+        return ResponseCache(SQLiteBackend())
+    if kind in ("off", "none", ""):
+        return ResponseCache()
+    raise ValueError(f"Unknown response cache type: {kind}")
+
+
+# Global response cache shared by all DataVisualizer instances
+response_cache = create_response_cache()
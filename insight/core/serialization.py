@@ -0,0 +1,55 @@
+# Fast JSON encoding of API responses (orjson when installed, stdlib json otherwise)
+import json
+from typing import Any, Dict, Iterable, List
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # Pydantic模型（如LangChain消息、结构化输出）
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize a response body to compact UTF-8 JSON.
+
+    orjson handles dicts, lists, dataclasses, datetimes and non-string dict keys
+    natively; anything else with `model_dump()` is converted on the fly.
+
+    Args:
+        content: JSON-compatible response content
+
+    Returns:
+        bytes: Encoded body
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def message_dicts(messages: Iterable[Any], compact: bool = False) -> List[Dict[str, Any]]:
+    """
+    Serialize chat history messages for the /messages response.
+
+    Args:
+        messages: LangChain messages
+        compact: Return only {"type", "content"} per message. Reading the two
+            attributes directly skips a pydantic model_dump() per message, which
+            dominates the cost of long histories.
+
+    Returns:
+        List[Dict[str, Any]]: model_dump() of each message, or the compact dicts
+    """
+    if compact:
+        return [{"type": msg.type, "content": msg.content} for msg in messages]
+    return [msg.model_dump() for msg in messages]
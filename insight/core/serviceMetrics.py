@@ -0,0 +1,49 @@
+# This service's handle on the shared ai_service modules (ai_service/service_shim.py),
+# falling back to no-ops when ai_service is not deployed alongside the service
+import os
+import sys
+from contextlib import nullcontext
+
+# 默认与本仓库中的ai_service目录同级部署，可用AI_SERVICE_DIR覆盖
+AI_SERVICE_DIR = os.getenv(
+    "AI_SERVICE_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ai_service"))
+)
+if os.path.isdir(AI_SERVICE_DIR) and AI_SERVICE_DIR not in sys.path:
+    sys.path.append(AI_SERVICE_DIR)
+
+
+class _NoopMetrics:
+    """Stands in for ServiceMetrics when ai_service is missing; every recording call is a no-op."""
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def stage(self, stage: str):
+        return nullcontext()
+
+    def timed(self, stage: str):
+        return lambda func: func
+
+    def render(self) -> str:
+        return ""
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: None
+
+
+try:
+    from service_shim import CONTENT_TYPE, cassette_transports, monitoring, service_metrics  # noqa: F401
+except ImportError:  # 单独部署时（genezio只打包insight/core）没有ai_service：指标为空操作，LLM流量直连不录制
+    monitoring = None
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def cassette_transports(mode=None, path=None):
+        return None, None
+
+    def service_metrics(service: str, enabled=None):
+        return _NoopMetrics(service)
+
+
+# Global metrics handle for this service
+metrics = service_metrics("insight")
@@ -0,0 +1,193 @@
+# Compact SQLite snapshots of DataVisualizer sessions, loaded lazily after cold starts
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from serialization import dumps
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:  # 未安装orjson时退回标准库
+    loads = json.loads
+
+
+# Bump when the DataVisualizer.to_snapshot() layout changes; older rows are ignored
+SNAPSHOT_VERSION = 1
+DEFAULT_PATH = os.getenv("INSIGHT_SESSION_SNAPSHOT_PATH", "cache/sessions.sqlite3")
+DEFAULT_TTL = float(os.getenv("INSIGHT_SESSION_SNAPSHOT_TTL", str(7 * 24 * 3600)))
+# 小于该大小的快照不压缩，压缩收益抵不过解压开销
+COMPRESS_MIN_BYTES = 1024
+# 每保存多少次清理一次过期快照
+PURGE_EVERY = 500
+
+
+def encode_snapshot(snapshot: Dict[str, Any]) -> bytes:
+    """
+    Encode a snapshot as JSON, zlib-compressed once it is large enough to matter.
+    The first byte tags the format: b"j" raw JSON, b"z" compressed JSON.
+    """
+    data = dumps(snapshot)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data, 1)
+    return b"j" + data
+
+
+def decode_snapshot(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_snapshot."""
+    tag, data = blob[:1], blob[1:]
+    if tag == b"z":
+        data = zlib.decompress(data)
+    elif tag != b"j":
+        raise ValueError(f"Unknown snapshot encoding: {tag!r}")
+    return loads(data)
+
+
+class SnapshotStore:
+    """
+    SQLite table of session_id -> encoded snapshot.
+
+    Sessions are written after every turn and read back only when a session_id
+    that is not resident in memory is first touched, so a cold start pays
+    nothing up front and each returning session costs one indexed read.
+
+    Args:
+        path: SQLite file
+        ttl: Snapshots not updated for this many seconds are ignored and purged (<= 0 keeps them)
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL下NORMAL只在检查点fsync，单次提交不再等待磁盘
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_snapshots ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.saved_bytes = 0
+        self.hydrations = 0
+        self.hydrate_seconds = 0.0
+        self.hydrate_max_seconds = 0.0
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - updated_at > self.ttl
+
+    def save(self, session_id: str, snapshot: Dict[str, Any]) -> None:
+        """Insert or replace the snapshot of a session. Storage errors are counted, not raised."""
+        blob = encode_snapshot(snapshot)
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO session_snapshots (session_id, data, updated_at) VALUES (?, ?, ?)",
+                    (session_id, blob, now),
+                )
+                self.saves += 1
+                self.saved_bytes += len(blob)
+                if self.ttl > 0 and self.saves % PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM session_snapshots WHERE updated_at < ?", (now - self.ttl,))
+                self._conn.commit()
+            except sqlite3.Error:
+                self.errors += 1
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the snapshot of a session.
+
+        Returns:
+            The decoded snapshot, or None if absent, expired, unreadable or from another SNAPSHOT_VERSION
+        """
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT data, updated_at FROM session_snapshots WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            except sqlite3.Error:
+                self.errors += 1
+                return None
+            if row is None or self._expired(row[1], time.time()):
+                self.misses += 1
+                return None
+        try:
+            snapshot = decode_snapshot(row[0])
+        except (ValueError, zlib.error):
+            snapshot = None
+        if snapshot is None or snapshot.get("v") != SNAPSHOT_VERSION:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return snapshot
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM session_snapshots WHERE session_id = ?", (session_id,))
+                self._conn.commit()
+            except sqlite3.Error:
+                self.errors += 1
+
+    def record_hydration(self, seconds: float) -> None:
+        """Record the time taken to load and rebuild one session."""
+        with self._lock:
+            self.hydrations += 1
+            self.hydrate_seconds += seconds
+            self.hydrate_max_seconds = max(self.hydrate_max_seconds, seconds)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM session_snapshots").fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "saves": self.saves,
+                "avg_snapshot_bytes": round(self.saved_bytes / self.saves) if self.saves else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hydrations": self.hydrations,
+                "hydrate_avg_ms": round(self.hydrate_seconds / self.hydrations * 1000, 3) if self.hydrations else 0.0,
+                "hydrate_max_ms": round(self.hydrate_max_seconds * 1000, 3),
+                "ttl": self.ttl,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_snapshot_store(kind: Optional[str] = None) -> Optional[SnapshotStore]:
+    """
+    Create a session snapshot store from configuration.
+
+    Args:
+        kind: "sqlite" or "off"; defaults to INSIGHT_SESSION_SNAPSHOTS
+
+    Returns:
+        SnapshotStore, or None when snapshots are disabled
+    """
+    kind = (kind or os.getenv("INSIGHT_SESSION_SNAPSHOTS", "off")).lower()
+    if kind == "sqlite":
+        return SnapshotStore()
+    if kind in ("off", "none", ""):
+        return None
+    raise ValueError(f"Unknown session snapshot store: {kind}")
@@ -0,0 +1,163 @@
+# Bounded session store with LRU / idle-TTL eviction and a per-session byte budget
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_MAX_SESSIONS = int(os.getenv("INSIGHT_MAX_SESSIONS", "10000"))
+DEFAULT_MAX_SESSION_BYTES = int(os.getenv("INSIGHT_SESSION_MAX_BYTES", str(1024 * 1024)))
+DEFAULT_IDLE_TTL = float(os.getenv("INSIGHT_SESSION_IDLE_TTL", "3600"))
+# 过期会话的全量清理间隔（秒）
+SWEEP_INTERVAL = 60.0
+
+# on_evict(session_id, session, reason); reason is "lru", "ttl" or "removed"
+EvictionCallback = Callable[[str, Any, str], None]
+
+
+class SessionStore:
+    """
+    Mapping of session_id -> session object (a DataVisualizer) with bounded memory.
+
+    - LRU: at most max_sessions are resident; the least recently used is evicted.
+    - Idle TTL: sessions untouched for idle_ttl seconds are evicted on access/sweep.
+    - Byte budget: sessions whose `estimated_bytes` exceeds max_session_bytes are
+      asked to `trim_history(max_bytes)` when stored and when next accessed.
+
+    Eviction listeners run after the store lock is released, so a slow listener
+    (e.g. one that snapshots the session to disk) never blocks other requests.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_session_bytes: int = DEFAULT_MAX_SESSION_BYTES,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        on_evict: Optional[EvictionCallback] = None
+    ):
+        self.max_sessions = max_sessions
+        self.max_session_bytes = max_session_bytes
+        self.idle_ttl = idle_ttl
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._listeners: List[EvictionCallback] = [on_evict] if on_evict else []
+        self._last_sweep = time.monotonic()
+        self.evictions: Dict[str, int] = {"lru": 0, "ttl": 0, "removed": 0}
+        self.trims = 0
+        # 裁剪后仍超出预算的次数（只剩每个阶段最新一轮时无法再裁剪）
+        self.over_budget = 0
+
+    def add_eviction_listener(self, callback: EvictionCallback) -> None:
+        """Register a hook called with (session_id, session, reason) after eviction."""
+        self._listeners.append(callback)
+
+    def _evict(self, session_id: str, reason: str, evicted: List[Tuple[str, Any, str]]) -> Optional[Any]:
+        # 调用方已持有锁；回调记入evicted，由调用方释放锁后调用_notify
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return None
+        self.evictions[reason] += 1
+        evicted.append((session_id, entry[0], reason))
+        return entry[0]
+
+    def _notify(self, evicted: List[Tuple[str, Any, str]]) -> None:
+        # 不持有锁时调用
+        for session_id, session, reason in evicted:
+            for listener in self._listeners:
+                try:
+                    listener(session_id, session, reason)
+                except Exception:
+                    # 回调失败不影响淘汰
+                    pass
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.idle_ttl > 0 and now - last_access > self.idle_ttl
+
+    def _sweep(self, now: float, evicted: List[Tuple[str, Any, str]]) -> None:
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        # OrderedDict 按最近访问排序，从最旧的开始检查
+        for session_id, (_, last_access) in list(self._sessions.items()):
+            if not self._expired(last_access, now):
+                break
+            self._evict(session_id, "ttl", evicted)
+
+    def _enforce_budget(self, session: Any) -> None:
+        if self.max_session_bytes <= 0:
+            return
+        if getattr(session, "estimated_bytes", 0) > self.max_session_bytes:
+            session.trim_history(self.max_session_bytes)
+            self.trims += 1
+            if getattr(session, "estimated_bytes", 0) > self.max_session_bytes:
+                self.over_budget += 1
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """Return the session and mark it as recently used, or None if absent/expired."""
+        now = time.monotonic()
+        evicted: List[Tuple[str, Any, str]] = []
+        with self._lock:
+            self._sweep(now, evicted)
+            entry = self._sessions.get(session_id)
+            if entry is not None and self._expired(entry[1], now):
+                self._evict(session_id, "ttl", evicted)
+                entry = None
+            session = None
+            if entry is not None:
+                session = entry[0]
+                self._sessions[session_id] = (session, now)
+                self._sessions.move_to_end(session_id)
+                self._enforce_budget(session)
+        self._notify(evicted)
+        return session
+
+    def peek(self, session_id: str) -> Optional[Any]:
+        """Return the session without touching its LRU position or TTL."""
+        entry = self._sessions.get(session_id)
+        return entry[0] if entry else None
+
+    def put(self, session_id: str, session: Any) -> None:
+        now = time.monotonic()
+        evicted: List[Tuple[str, Any, str]] = []
+        with self._lock:
+            self._sweep(now, evicted)
+            self._enforce_budget(session)
+            self._sessions[session_id] = (session, now)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self._evict(oldest, "lru", evicted)
+        self._notify(evicted)
+
+    def remove(self, session_id: str) -> bool:
+        evicted: List[Tuple[str, Any, str]] = []
+        with self._lock:
+            self._evict(session_id, "removed", evicted)
+        self._notify(evicted)
+        return bool(evicted)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._sessions))
+
+    def estimated_bytes(self) -> int:
+        with self._lock:
+            return sum(getattr(s, "estimated_bytes", 0) for s, _ in self._sessions.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "resident": len(self._sessions),
+            "estimated_bytes": self.estimated_bytes(),
+            "evictions": dict(self.evictions),
+            "trims": self.trims,
+            "over_budget": self.over_budget,
+            "max_sessions": self.max_sessions,
+            "max_session_bytes": self.max_session_bytes,
+            "idle_ttl": self.idle_ttl,
+        }
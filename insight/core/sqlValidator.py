@@ -0,0 +1,208 @@
+# Local PostgreSQL validation of generated SQL against the datasource schema
+import importlib.util
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# sqlglot导入需100ms以上，首次校验时再加载（见_load_sqlglot）；未安装时跳过本地校验
+SQLGLOT_AVAILABLE = importlib.util.find_spec("sqlglot") is not None
+sqlglot = exp = SqlglotError = ParseError = OptimizeError = qualify = None
+
+
+SQL_VALIDATION_ENABLED = os.getenv("INSIGHT_SQL_VALIDATION", "on").lower() not in ("0", "off", "false")
+# 校验失败后带着具体错误重新请求LLM的最大次数
+SQL_REPAIR_RETRIES = int(os.getenv("INSIGHT_SQL_REPAIR_RETRIES", "2"))
+DIALECT = "postgres"
+
+# table -> {column: type}
+TableSchema = Dict[str, Dict[str, str]]
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of validating one SQL string; skipped when validation is unavailable."""
+    valid: bool
+    errors: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    skipped: bool = False
+
+
+def _load_sqlglot() -> bool:
+    """Import sqlglot on first use; returns False when it is not installed."""
+    global sqlglot, exp, SqlglotError, ParseError, OptimizeError, qualify
+    if sqlglot is None and SQLGLOT_AVAILABLE:
+        from sqlglot import exp as exp_module
+        from sqlglot.errors import SqlglotError as base_error, ParseError as parse_error, OptimizeError as optimize_error
+        from sqlglot.optimizer.qualify import qualify as qualify_fn
+        import sqlglot as module
+
+        exp, qualify = exp_module, qualify_fn
+        SqlglotError, ParseError, OptimizeError = base_error, parse_error, optimize_error
+        # 最后赋值sqlglot，其他线程看到它非None时其余名称已就绪
+        sqlglot = module
+    return sqlglot is not None
+
+
+@lru_cache(maxsize=256)
+def _parse_ddl(ddl: str) -> Optional[TableSchema]:
+    try:
+        statements = sqlglot.parse(ddl, read=DIALECT)
+    except SqlglotError:
+        return None
+    tables: TableSchema = {}
+    for statement in statements:
+        if not isinstance(statement, exp.Create) or not isinstance(statement.this, exp.Schema):
+            continue
+        columns = {
+            column.name: column.args["kind"].sql(dialect=DIALECT) if column.args.get("kind") else "TEXT"
+            for column in statement.this.expressions
+            if isinstance(column, exp.ColumnDef)
+        }
+        tables[statement.this.this.name] = columns
+    return tables or None
+
+
+def parse_schema(schema: Any) -> Optional[TableSchema]:
+    """
+    Extract table -> columns from a datasource schema.
+
+    Args:
+        schema: CREATE TABLE DDL string, or a dict of table -> column list / {column: type}
+
+    Returns:
+        Optional[TableSchema]: None if no tables could be recognised (only syntax is checked then)
+    """
+    if not schema or not _load_sqlglot():
+        return None
+    if isinstance(schema, str):
+        return _parse_ddl(schema)
+    if isinstance(schema, dict):
+        tables: TableSchema = {}
+        for table, columns in schema.items():
+            if isinstance(columns, dict):
+                tables[table] = {str(c): str(t) for c, t in columns.items()}
+            elif isinstance(columns, (list, tuple)):
+                tables[table] = {str(c): "TEXT" for c in columns}
+        return tables or None
+    return None
+
+
+def _check_references(statement, tables: TableSchema) -> List[str]:
+    ctes = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    known = {name.lower() for name in tables}
+    errors = []
+    for table in statement.find_all(exp.Table):
+        name = table.name.lower()
+        if name and name not in known and name not in ctes:
+            errors.append(f"Unknown table: {table.name} (available: {', '.join(sorted(tables))})")
+    if errors:
+        return errors
+    try:
+        qualify(statement, schema=tables, dialect=DIALECT, validate_qualify_columns=True)
+    except OptimizeError as e:
+        errors.append(str(e))
+    return errors
+
+
+def validate_sql(sql: str, schema: Any = None) -> ValidationResult:
+    """
+    Parse SQL for the PostgreSQL dialect and check table/column references.
+
+    Args:
+        sql: Generated SQL
+        schema: Datasource schema (see parse_schema); without one only syntax is checked
+
+    Returns:
+        ValidationResult: valid flag, concrete error messages and elapsed time
+    """
+    if not SQL_VALIDATION_ENABLED or not _load_sqlglot():
+        return ValidationResult(valid=True, skipped=True)
+
+    start = time.perf_counter()
+    errors: List[str] = []
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=DIALECT) if s is not None]
+        if not statements:
+            errors.append("Empty SQL")
+        elif len(statements) > 1:
+            errors.append(f"Multiple statements are not allowed ({len(statements)} found); return a single query")
+        tables = parse_schema(schema)
+        if tables:
+            for statement in statements:
+                # qualify会改写表达式，校验时使用副本
+                errors.extend(_check_references(statement.copy(), tables))
+    except ParseError as e:
+        # str(e) 带有终端高亮字符，这里只取错误描述和位置
+        for error in e.errors or [{"description": str(e)}]:
+            location = f" (line {error['line']}, col {error['col']})" if error.get("line") else ""
+            errors.append(f"Syntax error: {error.get('description')}{location}")
+    except SqlglotError as e:
+        # 词法错误（未闭合的字符串、$$等）同样交给修复循环处理
+        errors.append(f"Syntax error: {e}")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return ValidationResult(valid=not errors, errors=errors, elapsed_ms=elapsed_ms)
+
+
+def repair_query(query: str, sql: str, result: ValidationResult) -> str:
+    """Build the follow-up query asking the model to fix a SQL that failed validation."""
+    errors = "\n".join(f"- {error}" for error in result.errors)
+    return (
+        f"{query}\n\n"
+        f"上一次生成的SQL未通过校验:\n{sql}\n\n"
+        f"错误:\n{errors}\n\n"
+        "请只使用表结构中存在的表和字段，修正后重新生成SQL。"
+    )
+
+
+class SQLValidationStats:
+    """Counters for local validation time and repair outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.validations = 0
+        self.skipped = 0
+        self.validation_ms = 0.0
+        self.valid_first_try = 0
+        self.repaired = 0
+        self.unrepaired = 0
+        self.repair_attempts = 0
+
+    def record_validation(self, result: ValidationResult) -> None:
+        with self._lock:
+            if result.skipped:
+                self.skipped += 1
+                return
+            self.validations += 1
+            self.validation_ms += result.elapsed_ms
+
+    def record_outcome(self, attempts: int, valid: bool) -> None:
+        """Record a finished generation that needed `attempts` repair calls."""
+        with self._lock:
+            self.repair_attempts += attempts
+            if attempts == 0 and valid:
+                self.valid_first_try += 1
+            elif valid:
+                self.repaired += 1
+            else:
+                self.unrepaired += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": SQLGLOT_AVAILABLE and SQL_VALIDATION_ENABLED,
+                "validations": self.validations,
+                "skipped": self.skipped,
+                "avg_validation_ms": round(self.validation_ms / self.validations, 3) if self.validations else 0.0,
+                "valid_first_try": self.valid_first_try,
+                "repaired": self.repaired,
+                "unrepaired": self.unrepaired,
+                "repair_attempts": self.repair_attempts,
+                "max_repair_retries": SQL_REPAIR_RETRIES,
+            }
+
+
+# Global stats shared by all DataVisualizer instances
+sql_validation_stats = SQLValidationStats()
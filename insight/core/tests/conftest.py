@@ -0,0 +1,7 @@
+import os
+import sys
+
+# insight/core modules use flat imports (e.g. `from interfaces import DataSource`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Shared modules (metrics, LLM cassettes) live in the repository's ai_service directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "ai_service"))
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+import pytest
+
+from cassette import Cassette, CassetteMiss, request_key
+
+# 回放模式下每轮（intent+sql+chart）允许的应用侧开销
+OVERHEAD_BUDGET_MS = float(os.getenv("INSIGHT_OVERHEAD_BUDGET_MS", "50"))
+# chartSay SQLAgent 回放模式下每轮（parse_question+get_unique_nouns+generate_sql）的开销
+CHARTSAY_OVERHEAD_BUDGET_MS = float(os.getenv("CHARTSAY_OVERHEAD_BUDGET_MS", "50"))
+CHARTSAY_AGENT_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "chartSay", "agent")
+)
+
+
+def test_request_key_ignores_json_field_order():
+    a = json.dumps({"model": "m", "messages": [{"role": "user", "content": "x"}]}).encode()
+    b = json.dumps({"messages": [{"content": "x", "role": "user"}], "model": "m"}).encode()
+    assert request_key("POST", "/v1/chat/completions", a) == request_key("post", "/v1/chat/completions", b)
+    assert request_key("POST", "/v1/chat/completions", a) != request_key("POST", "/v1/models", a)
+    assert request_key("POST", "/x", b"not json") != request_key("POST", "/x", b"not json!")
+
+
+@pytest.mark.parametrize("name", ["llm.jsonl", "llm.jsonl.gz"])
+def test_cassette_round_trip_and_rerecord(tmp_path, name):
+    path = str(tmp_path / name)
+    cassette = Cassette(path)
+    cassette.put("k1", 200, "application/json", '{"a": 1}')
+    cassette.put("k1", 200, "application/json", '{"a": 2}')
+    cassette.put("k2", 200, "text/event-stream", "data: [DONE]\n\n")
+
+    reloaded = Cassette(path)
+    assert len(reloaded) == 2
+    assert reloaded.get("k1")["body"] == '{"a": 2}'
+    assert reloaded.get("missing") is None
+    assert reloaded.get_stats()["hits"] == 1 and reloaded.get_stats()["misses"] == 1
+
+
+def test_transport_records_then_replays_offline(tmp_path):
+    httpx = pytest.importorskip("httpx")
+    from benchmarks.fake_llm_server import FakeLLMServer
+    from cassette import cassette_transports
+
+    path = str(tmp_path / "llm.jsonl")
+    body = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "各类别最高价"}]}
+    with FakeLLMServer(latency="fixed:0") as server:
+        url = f"{server.url}/v1/chat/completions"
+        with httpx.Client(transport=cassette_transports("record", path)[0]) as client:
+            recorded = client.post(url, json=body).json()
+
+    transport, _ = cassette_transports("replay", path)
+    with httpx.Client(transport=transport) as client:
+        assert client.post(url, json=body).json() == recorded
+        with pytest.raises(CassetteMiss):
+            client.post(url, json={**body, "temperature": 1})
+    assert server.requests == 1
+
+
+def test_replayed_overhead_stays_within_budget(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_deepseek")
+    from benchmarks.fake_llm_server import FakeLLMServer
+    from benchmarks.overhead import measure
+
+    path = str(tmp_path / "overhead.jsonl")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "fake")
+    monkeypatch.setenv("BASE_MODEL_NAME", "deepseek-chat")
+    with FakeLLMServer(latency="fixed:0") as server:
+        monkeypatch.setenv("DEEPSEEK_BASE_URL", server.url)
+        measure("record", path, 1)
+    # 服务器已停止：回放不能依赖网络
+    measure("replay", path, 1)
+    result = measure("replay", path, 20)
+
+    assert result["cassette"]["misses"] == 0
+    per_turn = sum(sum(values) for values in result["timings"].values()) / 20
+    assert per_turn * 1000 < OVERHEAD_BUDGET_MS, result["timings"]
+
+
+class FakeDatabase:
+    """Stands in for chartSay's DatabaseManager, which talks to the database service over HTTP."""
+
+    def get_schema(self, uuid):
+        return "CREATE TABLE products (id INTEGER, name VARCHAR(200), price DECIMAL(10,2), category VARCHAR(50))"
+
+    def execute_query(self, uuid, query):
+        return [["电子产品"], ["服装"], ["家居"]]
+
+
+def test_chartsay_sql_agent_replay_overhead_stays_within_budget(tmp_path, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("langchain_deepseek")
+    pytest.importorskip("dotenv")
+    pytest.importorskip("requests")
+    from benchmarks.fake_llm_server import FakeLLMServer
+    from cassette import cassette_transports
+
+    monkeypatch.syspath_prepend(CHARTSAY_AGENT_DIR)
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "fake")
+    monkeypatch.setenv("BASE_MODEL_NAME", "deepseek-chat")
+    import LLMManager
+    from SQLAgent import SQLAgent
+
+    path = str(tmp_path / "chartsay.jsonl")
+    # parse_question 需要JSON回复；generate_sql 原样返回文本
+    parsed = {"is_relevant": True, "relevant_tables": [
+        {"table_name": "products", "columns": ["category", "price"], "noun_columns": ["category"]}
+    ]}
+    state = {"question": "每个类别中价格最高的商品", "uuid": "overhead"}
+
+    def run_turns(mode, iterations):
+        transport, async_transport = cassette_transports(mode, path)
+        clients = {
+            "http_client": httpx.Client(transport=transport),
+            "http_async_client": httpx.AsyncClient(transport=async_transport),
+        }
+        monkeypatch.setattr(LLMManager, "cassette_clients", lambda: clients)
+        agent = SQLAgent()
+        agent.db_manager = FakeDatabase()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            turn = dict(state)
+            for node in (agent.parse_question, agent.get_unique_nouns, agent.generate_sql):
+                turn.update(node(turn))
+            timings.append(time.perf_counter() - start)
+        assert turn["sql_query"] == json.dumps(parsed)
+        return timings, transport.cassette
+
+    with FakeLLMServer(latency="fixed:0", text=json.dumps(parsed)) as server:
+        monkeypatch.setenv("DEEPSEEK_BASE_URL", server.url)
+        run_turns("record", 1)
+    assert server.requests == 2
+    # 服务器已停止：回放不能依赖网络；第一轮包含导入和提示模板构建，不计入
+    run_turns("replay", 1)
+    timings, cassette = run_turns("replay", 20)
+
+    assert cassette.get_stats()["misses"] == 0
+    assert sum(timings) / len(timings) * 1000 < CHARTSAY_OVERHEAD_BUDGET_MS, timings
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from chartPayload import NDJSONChartParser, parse_columnar
+from concurrency import data_fingerprint
+from dataProfiler import profile_columns
+from dataSampler import sample_rows
+from interfaces import ColumnarData
+
+HEADER = {"session_id": "s1", "user_input": "展示各月销售额"}
+
+
+def test_parse_columnar_body():
+    body = json.dumps({
+        **HEADER,
+        "columns": ["month", "sales"],
+        "values": [["2024-01", "2024-02", "2024-03"], [120, 95, 300]]
+    }).encode("utf-8")
+    payload = parse_columnar(body)
+    assert (payload.session_id, payload.user_input) == ("s1", "展示各月销售额")
+    assert len(payload.data) == 3
+    assert payload.data.as_dict()["sales"] == [120, 95, 300]
+    assert payload.data.to_rows()[1] == {"month": "2024-02", "sales": 95}
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"not json", "invalid JSON"),
+    (json.dumps({**HEADER, "columns": ["a"], "values": [[1], [2]]}).encode(), "one array per column"),
+    (json.dumps({**HEADER, "columns": ["a", "b"], "values": [[1, 2], [3]]}).encode(), "same length"),
+    (json.dumps({"user_input": "x", "columns": [], "values": []}).encode(), "session_id"),
+])
+def test_parse_columnar_rejects_inconsistent_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_columnar(body)
+
+
+def test_ndjson_parser_handles_split_chunks_arrays_and_objects():
+    lines = [
+        json.dumps({**HEADER, "columns": ["month", "sales"]}),
+        json.dumps(["2024-01", 120]),
+        json.dumps({"month": "2024-02", "sales": 95, "region": "华东"}),
+        json.dumps({"month": "2024-03"}),
+    ]
+    body = ("\n".join(lines)).encode("utf-8")
+    parser = NDJSONChartParser()
+    for i in range(0, len(body), 7):
+        parser.feed(body[i:i + 7])
+    payload = parser.close()
+
+    columns = payload.data.as_dict()
+    assert payload.data.columns == ["month", "sales", "region"]
+    assert columns["sales"] == [120, 95, None]
+    assert columns["region"] == [None, "华东", None]
+
+
+def test_ndjson_parser_errors_carry_line_numbers():
+    parser = NDJSONChartParser()
+    with pytest.raises(ValueError, match="line 2"):
+        parser.feed(json.dumps({**HEADER, "columns": ["a", "b"]}).encode() + b"\n[1]\n")
+    with pytest.raises(ValueError, match="empty body"):
+        NDJSONChartParser().close()
+
+
+def test_columnar_data_feeds_profiler_sampler_and_fingerprint():
+    data = ColumnarData(columns=["x", "y"], values=[list(range(100)), [i % 7 for i in range(100)]])
+    profile = profile_columns(data.as_dict())
+    assert profile["rows"] == 100 and profile["columns"]["y"]["max"] == 6
+
+    rows = sample_rows(data, "first_last_extremes", max_rows=5)
+    assert rows[0] == {"x": 0, "y": 0} and rows[-1] == {"x": 99, "y": 99 % 7}
+
+    assert data_fingerprint(data) == data_fingerprint(ColumnarData(["x", "y"], [list(v) for v in data.values]))
+    assert data_fingerprint(ColumnarData([], [])) == [0]
@@ -0,0 +1,65 @@
+import asyncio
+import gzip
+
+from compression import CompressionMiddleware, negotiate
+
+
+def test_negotiate_prefers_highest_q_then_server_order():
+    assert negotiate("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("gzip;q=0, identity", ["br", "gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+
+
+def make_app(chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", content_type),
+            (b"content-length", str(sum(map(len, chunks))).encode()),
+        ]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def call(app, accept=b"gzip"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept)]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, None, send))
+    headers = dict(sent[0]["headers"])
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return headers, body
+
+
+def test_large_body_is_gzipped_with_updated_headers():
+    payload = b'{"rows": [' + b",".join(b'{"a": 1}' for _ in range(200)) + b"]}"
+    headers, body = call(make_app([payload]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(body) < len(payload)
+    assert gzip.decompress(body) == payload
+
+
+def test_small_bodies_and_event_streams_pass_through():
+    headers, body = call(make_app([b"{}"]))
+    assert b"content-encoding" not in headers and body == b"{}"
+
+    events = [b"event: partial\ndata: {}\n\n" * 10, b"event: result\ndata: {}\n\n"]
+    headers, body = call(make_app(events, b"text/event-stream"))
+    assert b"content-encoding" not in headers and body == b"".join(events)
+
+    headers, body = call(make_app([b"x" * 500]), accept=b"identity")
+    assert b"content-encoding" not in headers
+
+
+def test_streamed_body_is_compressed_incrementally():
+    chunks = [b"line %d\n" % i * 20 for i in range(5)]
+    headers, body = call(make_app(chunks, b"application/x-ndjson"))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert gzip.decompress(body) == b"".join(chunks)
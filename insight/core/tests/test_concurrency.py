@@ -0,0 +1,85 @@
+import asyncio
+
+from concurrency import RequestCoordinator, SessionLocks, SingleFlight, data_fingerprint, request_key
+
+
+def test_single_flight_coalesces_identical_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["done"] * 5
+    assert len(calls) == 1
+    assert flight.executed == 1 and flight.coalesced == 4
+    assert len(flight) == 0
+
+
+def test_single_flight_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 42
+
+
+def test_session_locks_serialize_same_session_only():
+    locks = SessionLocks()
+    order = []
+
+    async def job(session_id, name):
+        async with locks.hold(session_id):
+            order.append(f"{name}:start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}:end")
+
+    async def main():
+        await asyncio.gather(job("s1", "a"), job("s1", "b"), job("s2", "c"))
+
+    asyncio.run(main())
+    assert order.index("a:end") < order.index("b:start")
+    assert order.index("c:start") < order.index("a:end")
+    assert locks.contended == 1
+    assert len(locks) == 0
+
+
+def test_coordinator_distinct_keys_run_separately():
+    coordinator = RequestCoordinator()
+
+    async def work():
+        await asyncio.sleep(0)
+        return 1
+
+    async def main():
+        return await asyncio.gather(
+            coordinator.run("s1", request_key("sql", "s1", "q1"), work),
+            coordinator.run("s1", request_key("sql", "s1", "q2"), work),
+        )
+
+    assert asyncio.run(main()) == [1, 1]
+    stats = coordinator.get_stats()
+    assert stats["executed"] == 2 and stats["coalesced"] == 0
+
+
+def test_request_key_and_fingerprint():
+    assert request_key("a", {"x": 1, "y": 2}) == request_key("a", {"y": 2, "x": 1})
+    assert request_key("a", 1) != request_key("a", 2)
+    rows = [{"v": i} for i in range(1000)]
+    fp = data_fingerprint(rows)
+    assert fp[0] == 1000 and fp[-1] == {"v": 999}
+    assert data_fingerprint([]) == [0]
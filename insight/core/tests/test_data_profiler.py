@@ -0,0 +1,57 @@
+from dataProfiler import profile_data, render_profile, to_columns
+
+
+ROWS = [
+    {"month": "2024-01", "category": "服装", "sales": 120, "note": None},
+    {"month": "2024-02", "category": "服装", "sales": 80.5, "note": ""},
+    {"month": "2024-03", "category": "电子产品", "sales": 300, "note": "促销"},
+    {"month": "2024-04", "category": "服装", "sales": 95},
+]
+
+
+def test_to_columns_fills_missing_keys():
+    columns = to_columns(ROWS)
+    assert list(columns) == ["month", "category", "sales", "note"]
+    assert columns["note"] == [None, "", "促销", None]
+
+
+def test_profile_data_column_summaries():
+    profile = profile_data(ROWS)
+    columns = profile["columns"]
+    assert profile["rows"] == 4
+
+    assert columns["month"]["temporal"] is True
+    assert (columns["month"]["min"], columns["month"]["max"]) == ("2024-01", "2024-04")
+
+    assert columns["category"]["type"] == "string"
+    assert columns["category"]["distinct"] == 2
+    assert columns["category"]["top"][0] == ["服装", 3]
+
+    assert columns["sales"]["type"] == "number"
+    assert (columns["sales"]["min"], columns["sales"]["max"]) == (80.5, 300)
+
+    assert columns["note"]["null_rate"] == 0.75
+
+
+def test_render_profile_is_one_line_per_column():
+    text = render_profile(profile_data(ROWS))
+    lines = text.split("\n")
+    assert lines[0] == "rows: 4, columns: 4"
+    assert len(lines) == 5
+    assert lines[1].startswith("- month: temporal")
+
+
+def test_profile_empty_data():
+    assert profile_data([]) == {"rows": 0, "columns": {}}
+
+
+def test_late_odd_typed_value_downgrades_to_mixed():
+    numbers = [{"sales": i} for i in range(300)] + [{"sales": "N/A"}]
+    dates = [{"day": f"2024-01-{i % 28 + 1:02d}"} for i in range(300)] + [{"day": 20240101}]
+
+    sales = profile_data(numbers)["columns"]["sales"]
+    day = profile_data(dates)["columns"]["day"]
+    assert sales["type"] == "mixed" and "min" not in sales
+    assert day["type"] == "mixed" and day["temporal"] is False
+    # 仍可渲染为提示文本
+    assert "sales: mixed" in render_profile(profile_data(numbers))
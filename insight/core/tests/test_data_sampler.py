@@ -0,0 +1,70 @@
+import pytest
+
+from dataSampler import (
+    SAMPLERS,
+    register_sampler,
+    render_sample,
+    sample_for_prompt,
+    sample_indices,
+    sample_rows,
+)
+
+# 按时间排序的数据：前几行只覆盖最早的月份
+ROWS = [
+    {"day": f"2024-{m:02d}-{d:02d}", "region": ["华东", "华北", "华南"][d % 3], "sales": (m * 37 + d * 11) % 500}
+    for m in range(1, 13)
+    for d in range(1, 29)
+]
+
+
+@pytest.mark.parametrize("strategy", sorted(SAMPLERS))
+def test_strategies_respect_budget_order_and_seed(strategy):
+    rows = sample_rows(ROWS, strategy, max_rows=10)
+    assert len(rows) == 10
+    positions = [ROWS.index(r) for r in rows]
+    assert positions == sorted(positions)
+    assert rows == sample_rows(ROWS, strategy, max_rows=10)
+
+
+def test_small_payloads_are_returned_whole():
+    for strategy in SAMPLERS:
+        assert sample_rows(ROWS[:3], strategy, max_rows=10) == ROWS[:3]
+
+
+def test_first_last_extremes_covers_range():
+    rows = sample_rows(ROWS, "first_last_extremes", max_rows=6)
+    sales = [r["sales"] for r in ROWS]
+    assert rows[0] == ROWS[0] and rows[-1] == ROWS[-1]
+    assert {min(sales), max(sales)} <= {r["sales"] for r in rows}
+
+
+def test_first_last_extremes_ignores_bools_equal_to_extremes():
+    # False == 0 but must not be taken as the row holding the minimum
+    column = [5, False, 3, 0, 2, True, 1, 4, 3, 2, 3, 2]
+    assert sample_indices({"v": column}, "first_last_extremes", max_rows=2) == [0, 3]
+
+
+def test_stratified_includes_every_category():
+    data = [{"kind": "common", "v": i} for i in range(500)] + [{"kind": "rare", "v": -1}]
+    rows = sample_rows(data, "stratified", max_rows=4)
+    assert {r["kind"] for r in rows} == {"common", "rare"}
+
+
+def test_reservoir_spreads_over_whole_payload():
+    rows = sample_rows(ROWS, "reservoir", max_rows=20)
+    assert any(r["day"] >= "2024-07" for r in rows)
+
+
+def test_render_respects_char_budget_and_custom_sampler():
+    text = render_sample(ROWS, max_chars=200)
+    assert len(text.split("\n")) < 10
+    assert text.endswith("more sampled rows omitted)")
+
+    register_sampler("last_only", lambda columns, max_rows, rng: [len(ROWS) - 1])
+    try:
+        assert sample_for_prompt(ROWS, "last_only").startswith(f"1 of {len(ROWS)} rows, strategy=last_only")
+    finally:
+        SAMPLERS.pop("last_only")
+
+    with pytest.raises(ValueError):
+        sample_rows(ROWS, "unknown")
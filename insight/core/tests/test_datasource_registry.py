@@ -0,0 +1,58 @@
+from datasourceRegistry import DataSourceRegistry, datasource_id, render_blocks
+from interfaces import DataSource
+
+
+def make_ds(name="sales", schema="CREATE TABLE t (id INT)"):
+    return DataSource(
+        name=name,
+        description="desc",
+        schema=schema,
+        example_data='[{"id": 1}]',
+        special_fields="id: primary key"
+    )
+
+
+def test_content_hash_is_stable_and_content_sensitive():
+    assert datasource_id(make_ds()) == datasource_id(make_ds())
+    assert datasource_id(make_ds()) != datasource_id(make_ds(schema="CREATE TABLE t (id BIGINT)"))
+    assert datasource_id(make_ds()).startswith("ds_")
+
+
+def test_render_blocks_match_original_template_fields():
+    blocks = render_blocks(make_ds())
+    assert blocks["sql"].startswith("Table Schema:\nCREATE TABLE t (id INT)")
+    assert "Example Data:\n[{\"id\": 1}]" in blocks["schema"]
+    assert "Table Schema" not in blocks["schema"]
+
+
+def test_register_is_idempotent():
+    registry = DataSourceRegistry()
+    first, created = registry.register(make_ds())
+    second, created_again = registry.register(make_ds())
+    assert created and not created_again
+    assert second is first
+    assert registry.get(first.id).datasource is first.datasource
+    assert len(registry) == 1
+
+
+def test_prompt_context_reuses_registered_render():
+    registry = DataSourceRegistry()
+    entry, _ = registry.register(make_ds())
+    assert registry.prompt_context(entry.datasource) is entry
+
+    inline = registry.prompt_context(make_ds())
+    assert inline is not entry and inline.id == entry.id
+    stats = registry.get_stats()
+    assert stats["render_hits"] == 1 and stats["render_misses"] == 1
+
+
+def test_lru_eviction():
+    registry = DataSourceRegistry(max_entries=2)
+    a, _ = registry.register(make_ds("a"))
+    b, _ = registry.register(make_ds("b"))
+    registry.get(a.id)
+    registry.register(make_ds("c"))
+    assert registry.get(b.id) is None
+    assert registry.get(a.id) is not None
+    assert registry.prompt_context(b.datasource) is not b
+    assert registry.get_stats()["evictions"] == 1
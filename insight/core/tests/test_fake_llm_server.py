@@ -0,0 +1,75 @@
+import json
+import random
+import urllib.request
+
+import pytest
+
+from benchmarks.fake_llm_server import FakeLLMServer, filler_from_schema, parse_latency
+from tokenUsage import extract_usage
+
+SQL_TOOL = {
+    "type": "function",
+    "function": {"name": "SQLQueryOutput", "parameters": {"type": "object", "properties": {}}},
+}
+
+
+def post(server, body, raw=False):
+    request = urllib.request.Request(
+        f"{server.url}/v1/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        data = response.read()
+    return data if raw else json.loads(data)
+
+
+def test_parse_latency_specs():
+    rng = random.Random(0)
+    assert parse_latency("fixed:0.2")(rng) == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.3")(rng) <= 0.3
+    assert parse_latency("lognormal:-1.2,0.4")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+def test_tool_call_with_canned_output_and_prefix_cache_usage():
+    messages = [{"role": "system", "content": "你是SQL专家" * 50}, {"role": "user", "content": "各类别最高价"}]
+    body = {"model": "deepseek-chat", "messages": messages, "tools": [SQL_TOOL],
+            "tool_choice": {"type": "function", "function": {"name": "SQLQueryOutput"}}}
+    with FakeLLMServer(latency="fixed:0") as server:
+        first = post(server, body)
+        second = post(server, body)
+
+    call = first["choices"][0]["message"]["tool_calls"][0]["function"]
+    assert call["name"] == "SQLQueryOutput"
+    assert json.loads(call["arguments"])["sql"].startswith("SELECT category")
+    assert first["usage"]["prompt_cache_hit_tokens"] == 0
+    assert second["usage"]["prompt_cache_hit_tokens"] > 0
+    assert server.requests == 2
+
+
+def test_streamed_tool_call_reassembles_and_reports_usage():
+    body = {"messages": [{"role": "user", "content": "x"}], "tools": [SQL_TOOL], "stream": True,
+            "stream_options": {"include_usage": True}}
+    with FakeLLMServer(latency="fixed:0") as server:
+        raw = post(server, body, raw=True).decode("utf-8")
+
+    events = [line[6:] for line in raw.split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(e) for e in events[:-1]]
+    arguments = "".join(
+        c["choices"][0]["delta"]["tool_calls"][0]["function"]["arguments"]
+        for c in chunks if c["choices"] and "tool_calls" in c["choices"][0]["delta"]
+    )
+    assert json.loads(arguments)["explanation"]
+    usage = extract_usage({"response_metadata": {"token_usage": chunks[-1]["usage"]}})
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+
+
+def test_unknown_tools_get_schema_filler():
+    schema = {"type": "object", "properties": {
+        "title": {"type": "string"}, "keys": {"type": "array"}, "legend": {"type": "boolean"},
+        "limit": {"anyOf": [{"type": "integer"}, {"type": "null"}]},
+    }}
+    assert filler_from_schema(schema) == {"title": "fake", "keys": [], "legend": False, "limit": 0}
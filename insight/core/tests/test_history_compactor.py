@@ -0,0 +1,61 @@
+from historyCompactor import CompactHistory, count_tokens, create_stage_histories
+
+
+def test_count_tokens_cjk_and_ascii():
+    assert count_tokens("查询销售数据") == 6 + 4
+    assert count_tokens("abcdefgh") == 2 + 4
+
+
+def test_history_stays_within_budget():
+    history = CompactHistory(budget=40)
+    for i in range(50):
+        history.append("Human", f"question {i}")
+        history.append("Assistant", f"answer {i}")
+
+    assert history.tokens <= 40
+    rendered = history.render()
+    assert rendered.endswith("Assistant: answer 49")
+    assert "question 0" not in rendered
+    # The incrementally maintained string matches a full re-render
+    assert rendered == "\n".join(line for line, _ in history._lines)
+
+
+def test_history_keeps_latest_oversized_message():
+    history = CompactHistory(budget=5)
+    history.append("Human", "short")
+    history.append("Assistant", "x" * 100)
+    assert len(history) == 1
+    assert history.render() == "Assistant: " + "x" * 100
+
+
+def test_keep_last_drops_oldest_lines():
+    history = CompactHistory(budget=1000)
+    for i in range(5):
+        history.append("Human", f"question {i}")
+    history.keep_last(2)
+    assert history.render() == "Human: question 3\nHuman: question 4"
+    assert history.tokens == count_tokens("Human: question 3") + count_tokens("Human: question 4")
+    history.keep_last(0)
+    assert len(history) == 0 and history.render() == "" and history.tokens == 0
+
+
+def test_stage_histories_use_budgets():
+    histories = create_stage_histories({"intent": 10, "chart": 20})
+    assert set(histories) == {"intent", "chart"}
+    assert histories["chart"].budget == 20
+    assert histories["intent"].render() == ""
+
+
+def test_snapshot_restore_matches_and_reapplies_budget():
+    history = CompactHistory(budget=200)
+    for i in range(10):
+        history.append("Human", f"question {i}")
+        history.append("Assistant", f"answer {i}")
+
+    restored = CompactHistory.from_snapshot(200, history.to_snapshot())
+    assert restored.render() == history.render() and restored.tokens == history.tokens
+
+    smaller = CompactHistory.from_snapshot(30, history.to_snapshot())
+    assert smaller.tokens <= 30
+    assert smaller.render() == "\n".join(line for line, _ in smaller._lines)
+    assert smaller.render().endswith("Assistant: answer 9")
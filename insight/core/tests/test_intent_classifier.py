@@ -0,0 +1,33 @@
+from intentClassifier import IntentClassifierStats, IntentDecision, classify_intent
+
+
+def test_chart_only_edits_are_confident_no():
+    for query in ["改成柱状图", "换成蓝色", "把图表改成折线图吧"]:
+        decision = classify_intent(query)
+        assert decision.intent == "no"
+        assert decision.confident
+
+
+def test_data_requests_are_yes():
+    for query in ["查询每个类别的销售额", "我想看今年的数据"]:
+        decision = classify_intent(query)
+        assert decision.intent == "yes"
+        assert decision.confident
+
+
+def test_mixed_or_unknown_queries_fall_back():
+    assert not classify_intent("改成按月统计的柱状图").confident
+    assert not classify_intent("好的").confident
+
+
+def test_stats_hit_rate_and_agreement():
+    stats = IntentClassifierStats()
+    stats.record_local()
+    stats.record_local()
+    stats.record_fallback(IntentDecision("no", 0.3, ""), "no")
+    stats.record_fallback(IntentDecision("no", 0.3, ""), "yes")
+
+    result = stats.get_stats()
+    assert result["hit_rate"] == 0.5
+    assert result["fallback_agreement"] == 0.5
+    assert result["shadow_agreement"] is None
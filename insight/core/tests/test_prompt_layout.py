@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_deepseek")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+
+from chainCache import chain_cache  # noqa: E402
+from dataVisualizer import DataVisualizer  # noqa: E402
+from interfaces import DataSource  # noqa: E402
+from test_data import EXAMPLE_DATASOURCE  # noqa: E402
+
+
+def _system_prefix(visualizer: DataVisualizer, query: str) -> str:
+    request = visualizer._sql_request(query, DataSource(**EXAMPLE_DATASOURCE))
+    prompt = chain_cache._prompt(chain_cache._stages["sql"])
+    return prompt.format_messages(**request["inputs"])[0].content
+
+
+def test_system_prefix_is_identical_across_sessions():
+    fresh = DataVisualizer(session_id="a")
+    busy = DataVisualizer(session_id="b")
+    busy._append_turn("sql", "查询去年的销售数据", "SELECT 1")
+
+    assert _system_prefix(fresh, "查询销售数据") == _system_prefix(busy, "查询今年的数据")
+    assert "查询去年的销售数据" not in _system_prefix(busy, "查询今年的数据")
@@ -0,0 +1,80 @@
+import json
+import threading
+
+from requestLogger import RequestLogger, truncate_field
+
+
+def test_records_are_written_as_single_json_lines():
+    lines = []
+    request_logger = RequestLogger(writer=lambda level, line: lines.append((level, line)))
+    request_logger.info("generate_sql_query", "SQL generation request", {
+        "session_id": "s1",
+        "user_input": "统计\n各月销售额",
+        "generated_query": {"query": "SELECT 1"},
+    })
+    request_logger.error("generate_sql_query", "SQL generation failed", {"error": "boom"})
+    assert request_logger.flush()
+
+    assert [level for level, _ in lines] == ["INFO", "ERROR"]
+    assert all("\n" not in line for _, line in lines)
+    record = json.loads(lines[0][1])
+    assert record["event"] == "generate_sql_query"
+    assert record["user_input"] == "统计\n各月销售额"
+    assert record["generated_query"] == {"query": "SELECT 1"}
+    request_logger.close()
+
+
+def test_long_fields_are_truncated():
+    assert truncate_field("x" * 50, 10) == "x" * 10 + "…(+40 chars)"
+    assert truncate_field({"a": 1}, 10) == {"a": 1}
+    truncated = truncate_field([{"row": i} for i in range(100)], 20)
+    assert isinstance(truncated, str) and truncated.startswith('[{"row":0}')
+    assert truncate_field(12345, 2) == 12345
+
+
+def test_full_queue_drops_oldest_without_blocking():
+    release = threading.Event()
+    lines = []
+
+    def slow_writer(level, line):
+        release.wait()
+        lines.append(json.loads(line)["n"])
+
+    request_logger = RequestLogger(writer=slow_writer, queue_size=3)
+    request_logger.info("e", "first", {"n": 0})
+    # 等待后台线程取走第一条并阻塞在写入上
+    while request_logger.get_stats()["pending"]:
+        pass
+    for n in range(1, 7):
+        request_logger.info("e", "burst", {"n": n})
+    stats = request_logger.get_stats()
+    assert stats["dropped"] == 3 and stats["pending"] == 3
+
+    release.set()
+    assert request_logger.flush()
+    assert lines == [0, 4, 5, 6]
+    request_logger.close()
+
+
+def test_success_logs_are_sampled_but_errors_are_kept():
+    lines = []
+    request_logger = RequestLogger(writer=lambda level, line: lines.append(level), success_sample_rate=0.0)
+    for _ in range(5):
+        request_logger.info("e", "ok")
+    request_logger.error("e", "failed")
+    request_logger.close()
+
+    assert lines == ["ERROR"]
+    stats = request_logger.get_stats()
+    assert stats["sampled_out"] == 5 and stats["written"] == 1
+
+
+def test_writer_errors_are_counted_not_raised():
+    def broken_writer(level, line):
+        raise OSError("disk full")
+
+    request_logger = RequestLogger(writer=broken_writer)
+    request_logger.info("e", "ok")
+    assert request_logger.flush()
+    assert request_logger.get_stats()["write_errors"] == 1
+    request_logger.close()
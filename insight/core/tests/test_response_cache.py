@@ -0,0 +1,84 @@
+import time
+
+from responseCache import (
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+    create_response_cache,
+    make_cache_key,
+)
+
+
+def test_make_cache_key_normalizes_query():
+    a = make_cache_key("sql", schema="s", query="查询  销售数据 ", history="h")
+    b = make_cache_key("sql", schema="s", query="查询 销售数据", history="h")
+    c = make_cache_key("sql", schema="s", query="查询 销售数据", history="other")
+    assert a == b
+    assert a != c
+    assert a != make_cache_key("schema", schema="s", query="查询 销售数据", history="h")
+
+
+def test_memory_cache_hit_miss_and_lru():
+    cache = ResponseCache(MemoryBackend(max_entries=2), ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", {"sql": "select 1"})
+    cache.set("b", {"sql": "select 2"})
+    assert cache.get("a") == {"sql": "select 1"}
+    cache.set("c", {"sql": "select 3"})  # evicts b, the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == {"sql": "select 3"}
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_memory_cache_ttl_expiry():
+    cache = ResponseCache(MemoryBackend(), ttl=0.01)
+    cache.set("a", {"sql": "select 1"})
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(SQLiteBackend(path, max_entries=2), ttl=60)
+    cache.set("a", {"sql": "select 1"})
+    cache.set("b", {"sql": "select 2"})
+    cache.set("c", {"sql": "select 3"})
+
+    reopened = ResponseCache(SQLiteBackend(path, max_entries=2), ttl=60)
+    assert reopened.get("c") == {"sql": "select 3"}
+    assert len(reopened.backend) == 2
+
+
+def test_disabled_cache_is_noop():
+    cache = create_response_cache("off")
+    cache.set("a", {"sql": "select 1"})
+    assert not cache.enabled
+    assert cache.get("a") is None
+    assert cache.get_stats()["misses"] == 0
+
+
+def test_query_case_is_part_of_the_key():
+    assert make_cache_key("sql", query="Apple 的销量") != make_cache_key("sql", query="apple 的销量")
+
+
+def test_async_access_runs_sqlite_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    cache = ResponseCache(SQLiteBackend(str(tmp_path / "cache.sqlite3")), ttl=60)
+    loop_thread = threading.get_ident()
+    threads = []
+    original = cache.backend.get
+    cache.backend.get = lambda key, now: threads.append(threading.get_ident()) or original(key, now)
+
+    async def run():
+        await cache.aset("k", {"sql": "select 1"})
+        return await cache.aget("k")
+
+    assert asyncio.run(run()) == {"sql": "select 1"}
+    assert threads and loop_thread not in threads
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import serialization
+from serialization import dumps, message_dicts
+
+
+class FakeModel:
+    def model_dump(self):
+        return {"type": "ai", "content": "SELECT 1"}
+
+
+class FakeMessage:
+    def __init__(self, type, content):
+        self.type = type
+        self.content = content
+
+    def model_dump(self):
+        return {"type": self.type, "content": self.content, "id": None, "additional_kwargs": {}}
+
+
+def test_dumps_matches_compact_json():
+    content = {"chart_config": {"config": {"title": "月度销售", "yKeys": ["sales"]}}, "session_id": "s1"}
+    assert json.loads(dumps(content)) == content
+    assert "月度销售".encode("utf-8") in dumps(content)
+
+
+def test_dumps_handles_models_and_non_str_keys():
+    assert json.loads(dumps({"messages": [FakeModel()]})) == {"messages": [{"type": "ai", "content": "SELECT 1"}]}
+    if serialization.orjson is not None:
+        assert json.loads(dumps({1: "a"})) == {"1": "a"}
+
+
+def test_dumps_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        dumps({"x": object()})
+
+
+def test_message_dicts_keeps_full_fields_unless_compact():
+    messages = [FakeMessage("human", "各类别销量"), FakeMessage("ai", "SELECT 1")]
+    assert message_dicts(messages) == [msg.model_dump() for msg in messages]
+    assert message_dicts(messages, compact=True) == [
+        {"type": "human", "content": "各类别销量"}, {"type": "ai", "content": "SELECT 1"}
+    ]
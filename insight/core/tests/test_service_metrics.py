@@ -0,0 +1,121 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from serviceMetrics import monitoring
+from service_shim import NoopMetrics, ServiceMetrics, service_metrics
+
+
+def samples(text):
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            result[series] = float(value)
+    return result
+
+
+def test_stage_histogram_and_tokens_attributed_to_current_stage():
+    metrics = monitoring.ServiceMetrics("test-stage")
+    with metrics.stage("sql"):
+        metrics.record_tokens(prompt=120, completion=30, cached=100)
+    metrics.observe("chart", 0.3)
+    metrics.record_tokens(prompt=5, stage="intent")
+
+    rendered = samples(metrics.render())
+    assert rendered['ai_stage_duration_seconds_count{service="test-stage",stage="sql"}'] == 1
+    assert rendered['ai_stage_duration_seconds_bucket{service="test-stage",stage="chart",le="0.25"}'] == 0
+    assert rendered['ai_stage_duration_seconds_bucket{service="test-stage",stage="chart",le="0.5"}'] == 1
+    assert rendered['ai_stage_duration_seconds_bucket{service="test-stage",stage="chart",le="+Inf"}'] == 1
+    assert rendered['ai_llm_tokens_total{service="test-stage",stage="sql",type="cached"}'] == 100
+    assert rendered['ai_llm_tokens_total{service="test-stage",stage="intent",type="prompt"}'] == 5
+
+
+def test_cache_lookups_and_sessions_collector():
+    metrics = monitoring.ServiceMetrics("test-cache")
+    sessions = ["a", "b"]
+    metrics.track_sessions(lambda: len(sessions))
+    for hit in (True, True, False):
+        metrics.record_cache("response", hit)
+    sessions.append("c")
+
+    rendered = samples(metrics.render())
+    assert rendered['ai_cache_lookups_total{service="test-cache",cache="response",result="hit"}'] == 2
+    assert rendered['ai_cache_lookups_total{service="test-cache",cache="response",result="miss"}'] == 1
+    assert rendered['ai_sessions{service="test-cache"}'] == 3
+
+
+def test_timed_decorator_and_in_flight_middleware():
+    metrics = monitoring.ServiceMetrics("test-flight")
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(samples(metrics.render())['ai_requests_in_flight{service="test-flight"}'])
+
+    middleware = monitoring.InFlightMiddleware(app, service="test-flight")
+
+    @metrics.timed("search")
+    async def search():
+        await middleware({"type": "http"}, None, None)
+
+    asyncio.run(search())
+    rendered = samples(metrics.render())
+    assert seen == [1]
+    assert rendered['ai_requests_in_flight{service="test-flight"}'] == 0
+    assert rendered['ai_stage_duration_seconds_count{service="test-flight",stage="search"}'] == 1
+
+
+def test_metrics_http_server():
+    monitoring.ServiceMetrics("test-http").record_cache("chain", True)
+    server = monitoring.start_http_server(0, addr="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"] == monitoring.CONTENT_TYPE
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+    assert 'ai_cache_lookups_total{service="test-http",cache="chain",result="hit"} 1' in body
+
+
+def test_hot_path_overhead_is_small():
+    metrics = monitoring.ServiceMetrics("test-overhead")
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        with metrics.stage("sql"):
+            pass
+        metrics.record_cache("response", True)
+    per_call = (time.perf_counter() - start) / n
+    # 远小于一次LLM调用（数百毫秒）
+    assert per_call < 50e-6
+
+
+def test_noop_metrics_implements_the_full_interface():
+    public = lambda cls: {name for name in vars(cls) if not name.startswith("_")}
+    assert public(NoopMetrics) == public(ServiceMetrics)
+
+    noop = service_metrics("insight", enabled=False)
+    assert isinstance(noop, NoopMetrics) and noop.render() == ""
+    with noop.stage("sql"):
+        noop.record_llm_usage(object())
+    assert noop.timed("sql")(len)("abc") == 3
+
+
+def test_services_start_without_ai_service(tmp_path):
+    # 模拟只打包insight/core的部署：找不到ai_service时指标和LLM录制都退化为空操作
+    script = (
+        "import serviceMetrics as m\n"
+        "assert m.monitoring is None and m.cassette_transports() == (None, None)\n"
+        "with m.metrics.stage('sql'):\n"
+        "    m.metrics.record_tokens(prompt=1)\n"
+        "assert m.metrics.timed('sql')(len)('abc') == 3 and m.metrics.render() == ''\n"
+    )
+    core_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "AI_SERVICE_DIR": str(tmp_path / "missing")}
+    env.pop("PYTHONPATH", None)
+    result = subprocess.run([sys.executable, "-c", script], cwd=core_dir, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
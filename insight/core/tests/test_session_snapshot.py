@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+import sessionSnapshot
+from sessionSnapshot import SNAPSHOT_VERSION, SnapshotStore, decode_snapshot, encode_snapshot
+
+# 典型会话的水合耗时预算（毫秒）
+HYDRATE_BUDGET_MS = 10
+
+
+def snapshot(session_id="s1", turns=1):
+    return {"v": SNAPSHOT_VERSION, "session_id": session_id, "messages": {"sql": ["问题", "SELECT 1"] * turns}}
+
+
+def test_encoding_compresses_only_large_snapshots():
+    small, large = snapshot(), snapshot(turns=200)
+    assert encode_snapshot(small)[:1] == b"j"
+    encoded = encode_snapshot(large)
+    assert encoded[:1] == b"z" and len(encoded) < len(encode_snapshot(small)) * 20
+    assert decode_snapshot(encoded) == large
+    with pytest.raises(ValueError):
+        decode_snapshot(b"x{}")
+
+
+def test_save_load_delete_and_version_mismatch(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SnapshotStore(path)
+    store.save("s1", snapshot())
+    store.save("s1", snapshot(turns=2))
+    store.save("old", {**snapshot("old"), "v": SNAPSHOT_VERSION - 1})
+    store.close()
+
+    reopened = SnapshotStore(path)
+    assert reopened.load("s1") == snapshot(turns=2)
+    assert reopened.load("old") is None and reopened.load("missing") is None
+    reopened.delete("s1")
+    assert reopened.load("s1") is None
+    stats = reopened.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["errors"] == 0
+    reopened.close()
+
+
+def test_expired_snapshots_are_ignored(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / "sessions.sqlite3"), ttl=60)
+    store.save("s1", snapshot())
+    now = time.time()
+    monkeypatch.setattr(sessionSnapshot.time, "time", lambda: now + 61)
+    assert store.load("s1") is None
+    store.close()
+
+
+def test_manager_hydrates_lazily_after_restart(tmp_path):
+    pytest.importorskip("langchain_deepseek")
+    from dataVisualizer import ChartConfigOutput, DataVisualizer
+    from dataVisualizerManager import DataVisualizerManager
+
+    path = str(tmp_path / "sessions.sqlite3")
+    manager = DataVisualizerManager(snapshot_store=SnapshotStore(path))
+    visualizer = manager.get_visualizer("s1")
+    for i in range(10):
+        visualizer._append_turn("intent", f"查询{i}", "yes")
+        visualizer._append_turn("sql", f"查询{i}", f"SELECT category, MAX(price) FROM products -- {i}")
+        visualizer._append_turn("chart", f"图表{i}", "bar chart " * 20)
+    visualizer.sql_query = visualizer.last_sql_query = "SELECT 1"
+    visualizer.last_chart_config = ChartConfigOutput(
+        description="d", takeaway="t", type="bar", title="t", xKey="category", yKeys=["price"],
+        multipleLines=False, measurementColumn=None, lineCategories=None, colors=None, legend=False,
+        explanation="e",
+    )
+    manager._save(visualizer)
+    manager.close()
+
+    # 模拟冷启动：新进程、空内存
+    restarted = DataVisualizerManager(snapshot_store=SnapshotStore(path))
+    assert "s1" not in restarted.visualizers
+    restored = restarted.find_visualizer("s1")
+    assert restored is not None and "s1" in restarted.visualizers
+    assert restored.to_snapshot() == visualizer.to_snapshot()
+    assert [m.type for m in restored.sql_messages[:2]] == ["human", "ai"]
+    assert restored._get_chat_history("sql") == visualizer._get_chat_history("sql")
+    assert isinstance(restored, DataVisualizer)
+
+    stats = restarted.get_stats()["snapshots"]
+    assert stats["hydrations"] == 1
+    assert stats["hydrate_max_ms"] < HYDRATE_BUDGET_MS
+
+    restarted.remove_visualizer("s1")
+    assert restarted.find_visualizer("s1") is None
+    restarted.close()
+
+
+class BlockingSnapshotStore(SnapshotStore):
+    """Holds every save until `release` is set, like a slow disk."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.release = threading.Event()
+
+    def save(self, session_id, snapshot):
+        self.release.wait(5)
+        super().save(session_id, snapshot)
+
+
+def test_eviction_snapshots_are_written_in_the_background(tmp_path):
+    pytest.importorskip("langchain_deepseek")
+    from dataVisualizerManager import DataVisualizerManager
+    from sessionStore import SessionStore
+
+    store = BlockingSnapshotStore(str(tmp_path / "sessions.sqlite3"))
+    manager = DataVisualizerManager(session_store=SessionStore(max_sessions=1, idle_ttl=0), snapshot_store=store)
+    first = manager.get_visualizer("s1")
+    first._append_turn("sql", "查询", "SELECT 1")
+
+    start = time.perf_counter()
+    manager.get_visualizer("s2")  # LRU淘汰s1，快照写入排队
+    assert time.perf_counter() - start < 1
+    assert len(store) == 0
+
+    # 写入完成前再次访问，从排队中的快照恢复
+    restored = manager.find_visualizer("s1")
+    assert restored.to_snapshot() == first.to_snapshot()
+
+    store.release.set()
+    manager.close()
+    assert SnapshotStore(str(tmp_path / "sessions.sqlite3")).load("s1") is not None
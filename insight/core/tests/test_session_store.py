@@ -0,0 +1,97 @@
+import threading
+import time
+
+import sessionStore
+from sessionStore import SessionStore
+
+
+class FakeSession:
+    def __init__(self, size=0):
+        self.estimated_bytes = size
+        self.trimmed_to = None
+
+    def trim_history(self, max_bytes):
+        self.trimmed_to = max_bytes
+        self.estimated_bytes = max_bytes
+
+
+def test_lru_eviction_and_callback():
+    evicted = []
+    store = SessionStore(max_sessions=2, idle_ttl=0, on_evict=lambda sid, s, reason: evicted.append((sid, reason)))
+    store.put("a", FakeSession())
+    store.put("b", FakeSession())
+    store.get("a")
+    store.put("c", FakeSession())
+
+    assert "b" not in store
+    assert list(store) == ["a", "c"]
+    assert evicted == [("b", "lru")]
+    assert store.get_stats()["evictions"]["lru"] == 1
+
+
+def test_idle_ttl_eviction():
+    store = SessionStore(max_sessions=10, idle_ttl=0.01)
+    store.put("a", FakeSession())
+    time.sleep(0.02)
+    assert store.get("a") is None
+    assert store.get_stats()["evictions"]["ttl"] == 1
+
+
+def test_sweep_evicts_idle_sessions(monkeypatch):
+    monkeypatch.setattr(sessionStore, "SWEEP_INTERVAL", 0)
+    store = SessionStore(max_sessions=10, idle_ttl=0.01)
+    store.put("a", FakeSession())
+    time.sleep(0.02)
+    store.put("b", FakeSession())
+    assert list(store) == ["b"]
+
+
+def test_byte_budget_trims_on_put_and_access():
+    store = SessionStore(max_sessions=10, max_session_bytes=100, idle_ttl=0)
+    session = FakeSession(size=500)
+    store.put("a", session)
+    assert session.trimmed_to == 100
+    assert store.get_stats()["estimated_bytes"] == 100
+
+    # 会话在两次访问之间增长
+    session.estimated_bytes = 300
+    store.get("a")
+    assert store.get_stats()["trims"] == 2
+    assert store.get_stats()["estimated_bytes"] == 100
+
+
+def test_sessions_that_cannot_fit_are_counted():
+    class Untrimmable(FakeSession):
+        def trim_history(self, max_bytes):
+            pass
+
+    store = SessionStore(max_sessions=10, max_session_bytes=100, idle_ttl=0)
+    store.put("a", Untrimmable(size=500))
+    assert store.get_stats()["over_budget"] == 1
+
+
+def test_eviction_listeners_run_without_the_lock():
+    blocked = []
+
+    def listener(session_id, session, reason):
+        # 另一个线程需要拿到store锁；若回调时仍持有锁则会超时
+        worker = threading.Thread(target=store.estimated_bytes, daemon=True)
+        worker.start()
+        worker.join(timeout=1)
+        blocked.append(worker.is_alive())
+
+    store = SessionStore(max_sessions=1, idle_ttl=0, on_evict=listener)
+    store.put("a", FakeSession())
+    store.put("b", FakeSession())
+    store.remove("b")
+    assert blocked == [False, False]
+
+
+def test_peek_and_remove():
+    store = SessionStore(max_sessions=10, idle_ttl=0)
+    session = FakeSession()
+    store.put("a", session)
+    assert store.peek("a") is session
+    assert store.remove("a")
+    assert not store.remove("a")
+    assert store.get_stats()["evictions"]["removed"] == 1
@@ -0,0 +1,92 @@
+import asyncio
+import gc
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("langchain_deepseek")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+
+from chainCache import chain_cache  # noqa: E402
+from dataVisualizer import IntentOutput, SQLQueryOutput  # noqa: E402
+from dataVisualizerManager import DataVisualizerManager  # noqa: E402
+from interfaces import DataSource  # noqa: E402
+from test_data import EXAMPLE_DATASOURCE  # noqa: E402
+
+
+class FakeChain:
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+class FailingChain:
+    async def ainvoke(self, inputs):
+        raise RuntimeError("sql failed")
+
+
+def _install(intent: str):
+    model = os.getenv("BASE_MODEL_NAME")
+    intent_chain = FakeChain(IntentOutput(intent=intent, explanation="fake"), delay=0.01)
+    sql_chain = FakeChain(SQLQueryOutput(sql="SELECT 2", explanation="fake"), delay=0.05)
+    chain_cache.override("intent", model, intent_chain)
+    chain_cache.override("sql", model, sql_chain)
+    return intent_chain, sql_chain
+
+
+def _session(manager: DataVisualizerManager):
+    visualizer = manager.get_visualizer("s1")
+    visualizer.commit_sql("查询销售数据", SQLQueryOutput(sql="SELECT 1", explanation="first"))
+    return visualizer
+
+
+def test_speculative_sql_discarded_when_intent_is_no():
+    _install("no")
+    manager = DataVisualizerManager(speculative_sql=True)
+    visualizer = _session(manager)
+    history_before = len(visualizer.intent_messages)
+
+    # Ambiguous follow-up, so the intent stage goes to the LLM
+    result = asyncio.run(manager.agenerate_sql("好的", DataSource(**EXAMPLE_DATASOURCE), session_id="s1"))
+
+    assert result == {"query": "SELECT 1", "explanation": "no"}
+    # Only the intent turn was recorded; the discarded SQL never touched history
+    assert len(visualizer.intent_messages) == history_before + 2
+    assert manager.get_stats()["speculation"] == {"started": 1, "used": 0, "discarded": 1}
+    chain_cache.clear()
+
+
+def test_speculative_sql_committed_when_intent_is_yes():
+    _install("yes")
+    manager = DataVisualizerManager(speculative_sql=True)
+    visualizer = _session(manager)
+
+    result = asyncio.run(manager.agenerate_sql("好的", DataSource(**EXAMPLE_DATASOURCE), session_id="s1"))
+
+    assert result == {"query": "SELECT 2", "explanation": "fake"}
+    assert visualizer.get_sql_query() == "SELECT 2"
+    assert manager.get_stats()["speculation"]["used"] == 1
+    chain_cache.clear()
+
+
+def test_failed_discarded_speculation_is_retrieved(caplog):
+    _install("no")
+    # SQL fails before intent returns "no", so cancel() alone would leave the exception unretrieved
+    chain_cache.override("sql", os.getenv("BASE_MODEL_NAME"), FailingChain())
+    manager = DataVisualizerManager(speculative_sql=True)
+    _session(manager)
+
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        result = asyncio.run(manager.agenerate_sql("好的", DataSource(**EXAMPLE_DATASOURCE), session_id="s1"))
+        gc.collect()
+
+    assert result["explanation"] == "no"
+    assert "never retrieved" not in caplog.text
+    chain_cache.clear()
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("sqlglot")
+
+from sqlValidator import SQLValidationStats, parse_schema, repair_query, validate_sql  # noqa: E402
+from test_data import EXAMPLE_DATASOURCE  # noqa: E402
+
+SCHEMA = EXAMPLE_DATASOURCE["schema"]
+
+
+def test_parse_schema_from_ddl_and_dict():
+    tables = parse_schema(SCHEMA)
+    assert set(tables["products"]) >= {"id", "name", "price", "category", "created_at"}
+    assert parse_schema({"orders": ["id", "amount"]}) == {"orders": {"id": "TEXT", "amount": "TEXT"}}
+    assert parse_schema(None) is None
+
+
+def test_valid_queries_pass():
+    for sql in (
+        "SELECT category, AVG(price) AS avg_price FROM products GROUP BY category ORDER BY avg_price DESC",
+        "WITH t AS (SELECT category, SUM(stock) AS total FROM products GROUP BY category) SELECT t.total FROM t",
+        "SELECT p.name FROM products p WHERE p.created_at >= date_trunc('year', now()) LIMIT 10",
+    ):
+        result = validate_sql(sql, SCHEMA)
+        assert result.valid, result.errors
+
+
+def test_unknown_references_and_syntax_errors_are_reported():
+    assert "categry" in validate_sql("SELECT categry FROM products", SCHEMA).errors[0]
+    assert "orders" in validate_sql("SELECT id FROM orders", SCHEMA).errors[0]
+    assert validate_sql("SELECT FROM WHERE (", SCHEMA).errors[0].startswith("Syntax error")
+    # 无表结构时只检查语法
+    assert validate_sql("SELECT id FROM orders").valid
+
+
+def test_repair_query_contains_errors():
+    result = validate_sql("SELECT categry FROM products", SCHEMA)
+    prompt = repair_query("各类别平均价格", "SELECT categry FROM products", result)
+    assert prompt.startswith("各类别平均价格") and "categry" in prompt
+
+
+def test_stats_outcomes():
+    stats = SQLValidationStats()
+    stats.record_validation(validate_sql("SELECT id FROM products", SCHEMA))
+    stats.record_outcome(0, True)
+    stats.record_outcome(1, True)
+    stats.record_outcome(2, False)
+    result = stats.get_stats()
+    assert result["validations"] == 1
+    assert (result["valid_first_try"], result["repaired"], result["unrepaired"]) == (1, 1, 1)
+    assert result["repair_attempts"] == 3
+
+
+def test_tokenizer_errors_and_multiple_statements_are_rejected():
+    for sql in ("SELECT 'abc FROM products", "SELECT $$abc"):
+        result = validate_sql(sql, SCHEMA)
+        assert not result.valid and result.errors[0].startswith("Syntax error")
+
+    result = validate_sql("SELECT id FROM products; DELETE FROM products", SCHEMA)
+    assert not result.valid and "Multiple statements" in result.errors[0]
+    assert validate_sql("SELECT id FROM products;", SCHEMA).valid
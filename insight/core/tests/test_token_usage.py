@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from tokenUsage import TokenUsageStats, extract_usage
+
+
+def message(token_usage=None, usage_metadata=None):
+    return SimpleNamespace(
+        response_metadata={"token_usage": token_usage} if token_usage else {},
+        usage_metadata=usage_metadata
+    )
+
+
+def test_extract_deepseek_cache_hit_tokens():
+    usage = extract_usage(message({
+        "prompt_tokens": 1000,
+        "completion_tokens": 50,
+        "prompt_cache_hit_tokens": 768,
+        "prompt_cache_miss_tokens": 232
+    }))
+    assert usage == {"prompt_tokens": 1000, "cached_tokens": 768, "completion_tokens": 50}
+
+
+def test_extract_openai_cached_tokens_and_usage_metadata_fallback():
+    usage = extract_usage(message({
+        "prompt_tokens": 500,
+        "completion_tokens": 10,
+        "prompt_tokens_details": {"cached_tokens": 256}
+    }))
+    assert usage["cached_tokens"] == 256
+
+    chunk = message(usage_metadata={
+        "input_tokens": 300,
+        "output_tokens": 20,
+        "input_token_details": {"cache_read": 128}
+    })
+    assert extract_usage(chunk) == {"prompt_tokens": 300, "cached_tokens": 128, "completion_tokens": 20}
+
+
+def test_messages_without_usage_are_ignored():
+    stats = TokenUsageStats()
+    assert extract_usage(None) is None
+    assert not stats.record("sql", message())
+    assert stats.get_stats() == {"stages": {}, "cache_hit_rate": 0.0}
+
+
+def test_stats_aggregate_per_stage():
+    stats = TokenUsageStats()
+    stats.record("sql", message({"prompt_tokens": 1000, "completion_tokens": 10, "prompt_cache_hit_tokens": 0}))
+    stats.record("sql", message({"prompt_tokens": 1000, "completion_tokens": 10, "prompt_cache_hit_tokens": 900}))
+    stats.record("chart", message({"prompt_tokens": 2000, "completion_tokens": 10, "prompt_cache_hit_tokens": 100}))
+    result = stats.get_stats()
+    assert result["stages"]["sql"]["calls"] == 2
+    assert result["stages"]["sql"]["cache_hit_rate"] == 0.45
+    assert result["cache_hit_rate"] == 0.25
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from tracing import NOOP_SPAN, BatchExporter, JSONLExporter, Tracer, TracingMiddleware, otlp_payload
+
+
+class ListExporter(BatchExporter):
+    def __init__(self):
+        super().__init__(flush_interval=0.01)
+        self.spans = []
+
+    def write(self, spans):
+        self.spans.extend(spans)
+
+
+def test_spans_nest_across_awaits_and_tasks():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    @tracer.traced("intent")
+    async def intent():
+        tracer.annotate(intent_local=True)
+        await asyncio.sleep(0)
+
+    async def handler():
+        with tracer.span("POST /generate/sql") as root:
+            tracer.annotate(session_id="s1")
+            with tracer.span("manager", stage="sql"):
+                await asyncio.gather(intent(), asyncio.create_task(intent()))
+        return root
+
+    root = asyncio.run(handler())
+    assert tracer.flush()
+    by_name = {}
+    for span in exporter.spans:
+        by_name.setdefault(span.name, []).append(span)
+
+    manager = by_name["manager"][0]
+    assert root.attributes == {"session_id": "s1"}
+    assert manager.parent_id == root.span_id and manager.trace_id == root.trace_id
+    assert [s.parent_id for s in by_name["intent"]] == [manager.span_id] * 2
+    assert all(s.attributes == {"intent_local": True} for s in by_name["intent"])
+    tracer.close()
+
+
+def test_errors_are_recorded_and_reraised(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(JSONLExporter(str(path), flush_interval=0.01))
+    with pytest.raises(ValueError):
+        with tracer.span("sql", stage="sql"):
+            raise ValueError("bad sql")
+    tracer.close()
+
+    record = json.loads(path.read_text().strip())
+    assert record["name"] == "sql" and record["parent_id"] is None
+    assert record["error"] == "ValueError: bad sql"
+    assert record["attributes"] == {"stage": "sql"}
+
+
+def test_otlp_payload_shape():
+    tracer = Tracer(ListExporter())
+    with tracer.span("root"):
+        with tracer.span("llm", prompt_tokens=120, cached=True, ratio=0.5, model="deepseek-chat"):
+            pass
+    tracer.flush()
+    spans = tracer.exporter.spans
+    payload = otlp_payload(spans)
+    otlp_spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    llm, root = otlp_spans
+    assert len(llm["traceId"]) == 32 and len(llm["spanId"]) == 16
+    assert llm["parentSpanId"] == root["spanId"] and "parentSpanId" not in root
+    assert {a["key"]: a["value"] for a in llm["attributes"]} == {
+        "prompt_tokens": {"intValue": "120"},
+        "cached": {"boolValue": True},
+        "ratio": {"doubleValue": 0.5},
+        "model": {"stringValue": "deepseek-chat"},
+    }
+    assert int(llm["endTimeUnixNano"]) >= int(llm["startTimeUnixNano"])
+    tracer.close()
+
+
+def test_middleware_opens_root_span_with_status():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    async def app(scope, receive, send):
+        tracer.annotate(session_id="s1")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        pass
+
+    middleware = TracingMiddleware(app, tracer)
+    asyncio.run(middleware({"type": "http", "method": "POST", "path": "/generate/sql"}, None, send))
+    tracer.flush()
+    span = exporter.spans[0]
+    assert span.name == "POST /generate/sql"
+    assert span.attributes["http.status_code"] == 200 and span.attributes["session_id"] == "s1"
+    tracer.close()
+
+
+def test_disabled_tracer_is_nearly_free():
+    tracer = Tracer()
+    assert tracer.span("sql", stage="sql") is NOOP_SPAN
+
+    @tracer.traced("intent")
+    def intent():
+        return "yes"
+
+    n = 50000
+    start = time.perf_counter()
+    for _ in range(n):
+        with tracer.span("sql", stage="sql") as span:
+            span.set_attribute("cache_hit", False)
+        tracer.annotate(session_id="s1")
+        intent()
+    assert (time.perf_counter() - start) / n < 10e-6
@@ -0,0 +1,101 @@
+# Per-stage token usage and provider prompt-cache hit counters
+import threading
+from typing import Any, Dict, Optional
+
+from serviceMetrics import metrics
+
+
+def _get(obj: Any, key: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def extract_usage(message: Any) -> Optional[Dict[str, int]]:
+    """
+    Read token counts from an LLM response message (AIMessage or chunk).
+
+    The cached prompt tokens are taken from, in order: DeepSeek's
+    `prompt_cache_hit_tokens`, OpenAI's `prompt_tokens_details.cached_tokens`,
+    and LangChain's normalized `usage_metadata.input_token_details.cache_read`.
+
+    Args:
+        message: Response message carrying `response_metadata` and/or `usage_metadata`
+
+    Returns:
+        Optional[Dict[str, int]]: prompt/cached/completion token counts, or None if absent
+    """
+    token_usage = _get(_get(message, "response_metadata"), "token_usage")
+    usage_metadata = _get(message, "usage_metadata")
+    if not token_usage and not usage_metadata:
+        return None
+
+    prompt_tokens = _get(token_usage, "prompt_tokens")
+    completion_tokens = _get(token_usage, "completion_tokens")
+    cached = _get(token_usage, "prompt_cache_hit_tokens")
+    if cached is None:
+        cached = _get(_get(token_usage, "prompt_tokens_details"), "cached_tokens")
+    if usage_metadata:
+        if prompt_tokens is None:
+            prompt_tokens = _get(usage_metadata, "input_tokens")
+        if completion_tokens is None:
+            completion_tokens = _get(usage_metadata, "output_tokens")
+        if cached is None:
+            cached = _get(_get(usage_metadata, "input_token_details"), "cache_read")
+
+    return {
+        "prompt_tokens": prompt_tokens or 0,
+        "cached_tokens": cached or 0,
+        "completion_tokens": completion_tokens or 0,
+    }
+
+
+class TokenUsageStats:
+    """Accumulates token usage per stage to measure the prompt prefix-cache hit rate."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, message: Any) -> bool:
+        """Record the usage carried by a response message; returns False if it has none."""
+        usage = extract_usage(message)
+        if usage is None:
+            return False
+        metrics.record_tokens(
+            usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"], stage=stage
+        )
+        with self._lock:
+            totals = self._stages.setdefault(
+                stage, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+            )
+            totals["calls"] += 1
+            for key, value in usage.items():
+                totals[key] += value
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage, totals in self._stages.items():
+                prompt = totals["prompt_tokens"]
+                stages[stage] = {
+                    **totals,
+                    "cache_hit_rate": round(totals["cached_tokens"] / prompt, 4) if prompt else 0.0,
+                }
+            prompt_total = sum(t["prompt_tokens"] for t in self._stages.values())
+            cached_total = sum(t["cached_tokens"] for t in self._stages.values())
+            return {
+                "stages": stages,
+                "cache_hit_rate": round(cached_total / prompt_total, 4) if prompt_total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+# Global usage counters shared by all stages and sessions
+token_usage = TokenUsageStats()
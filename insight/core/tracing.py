@@ -0,0 +1,361 @@
+"""
+Lightweight request tracing for the insight request path.
+
+Spans nest through a context variable, so the tree app.py -> manager ->
+visualizer -> chain steps follows asyncio tasks without passing anything
+around. Finished spans are queued and written by a background thread to a
+JSON-lines file or an OTLP/HTTP (JSON) collector.
+
+Tracing is off unless INSIGHT_TRACING is "jsonl" or "otlp". When it is off,
+`tracer.span()` returns a shared no-op span and `annotate()` returns
+immediately, so instrumented code pays one attribute check per call.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from serialization import dumps
+
+
+TRACE_FILE = os.getenv("INSIGHT_TRACE_FILE", "logs/traces.jsonl")
+OTLP_ENDPOINT = os.getenv("INSIGHT_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+# 待导出span的队列上限，导出跟不上时丢弃最旧的
+TRACE_QUEUE_SIZE = int(os.getenv("INSIGHT_TRACE_QUEUE_SIZE", "4096"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("INSIGHT_TRACE_FLUSH_INTERVAL", "1.0"))
+SERVICE_NAME = "insight"
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("insight_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes; use as a context manager via Tracer.span()."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        if parent is None:
+            self.trace_id = f"{random.getrandbits(128):032x}"
+            self.parent_id = None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer.exporter.export(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned by a disabled tracer; every operation does nothing."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class BatchExporter:
+    """
+    Queues finished spans and writes them in batches from a daemon thread.
+    Subclasses implement write(spans).
+    """
+
+    def __init__(self, queue_size: int = TRACE_QUEUE_SIZE, flush_interval: float = TRACE_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._queue: Deque[Span] = deque(maxlen=max(1, queue_size))
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def export(self, span: Span) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+            if len(self._queue) >= 512:
+                self._cond.notify()
+
+    def write(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._queue and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                if not self._queue:
+                    if self._closed:
+                        return
+                    continue
+                batch = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            try:
+                self.write(batch)
+                self.exported += len(batch)
+            except Exception:
+                # 导出失败只计数，不影响请求
+                self.errors += 1
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write queued spans now; returns False on timeout."""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "exporter": type(self).__name__,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "pending": len(self._queue),
+        }
+
+
+class JSONLExporter(BatchExporter):
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: str = TRACE_FILE, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, spans: List[Span]) -> None:
+        with open(self.path, "ab") as f:
+            f.write(b"".join(dumps(span.to_dict()) + b"\n" for span in spans))
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value if isinstance(value, str) else str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = SERVICE_NAME) -> Dict[str, Any]:
+    """Build an OTLP/JSON ExportTraceServiceRequest body."""
+    otlp_spans = []
+    for span in spans:
+        item = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            # STATUS_CODE_OK=1, STATUS_CODE_ERROR=2
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "insight.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class OTLPExporter(BatchExporter):
+    """Posts span batches to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, timeout: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def write(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=dumps(otlp_payload(spans)),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter.
+
+    Args:
+        exporter: Span exporter; None disables tracing
+    """
+
+    def __init__(self, exporter: Optional[BatchExporter] = None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, **attributes: Any):
+        """Open a child of the current span (or a new trace): `with tracer.span("sql", stage="sql"):`."""
+        if self.exporter is None:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def annotate(self, **attributes: Any) -> None:
+        """Add attributes to the current span, if any."""
+        if self.exporter is None:
+            return
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def traced(self, name: str) -> Callable:
+        """Decorator wrapping a sync or async function in a span."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if self.exporter is None:
+                        return await func(*args, **kwargs)
+                    with Span(self, name, {}):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.exporter is None:
+                    return func(*args, **kwargs)
+                with Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return self.exporter.flush(timeout) if self.exporter else True
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self.exporter is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.exporter.get_stats()}
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening the root span of every HTTP request."""
+
+    def __init__(self, app, tracer: "Tracer"):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        with self.tracer.span(f"{scope['method']} {scope['path']}",
+                              **{"http.method": scope["method"], "http.target": scope["path"]}) as span:
+            async def traced_send(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, traced_send)
+
+
+def create_tracer(kind: Optional[str] = None) -> Tracer:
+    """
+    Create a tracer from configuration.
+
+    Args:
+        kind: "jsonl", "otlp" or "off"; defaults to INSIGHT_TRACING
+
+    Returns:
+        Tracer: The configured tracer (disabled for "off")
+    """
+    kind = (kind or os.getenv("INSIGHT_TRACING", "off")).lower()
+    if kind == "jsonl":
+        return Tracer(JSONLExporter())
+    if kind == "otlp":
+        return Tracer(OTLPExporter())
+    if kind in ("off", "none", ""):
+        return Tracer()
+    raise ValueError(f"Unknown INSIGHT_TRACING value: {kind}")
+
+
+# Global tracer shared by the API, manager and visualizers
+tracer = create_tracer()
@@ -11,4 +11,11 @@ def print_json(title, obj):
         formatted = json.dumps(obj, indent=2, ensure_ascii=False)
         # 为每行添加缩进
         formatted = "\n".join(f"    {line}" for line in formatted.split("\n"))
-        print(formatted)
\ No newline at end of file
+        print(formatted)
+
+
+def format_sse(event, data):
+        """将事件编码为 Server-Sent Events 格式"""
+        import json
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        return f"event: {event}\ndata: {payload}\n\n"
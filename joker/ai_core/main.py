@@ -1,12 +1,13 @@
 from fastapi import FastAPI
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import HTTPException
 import uuid
 from outline_generator import create_outline_chain
 from source_searcher import create_datasource_factory, Document
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
 
 
 app = FastAPI()
@@ -20,6 +21,9 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有请求头
 )
 
+# 统计正在处理的请求数
+metrics.install(app)
+
 class OutlineRequest(BaseModel):
     title: str
     history: Optional[str] = None 
@@ -33,11 +37,12 @@ async def generate_outline(request: OutlineRequest):
         history=request.history,
         focus_modules=request.focus_modules
     )
-    outline = await chain.ainvoke({
-        "title": request.title,
-        "history_context": f"Historical reference:\n{request.history}" if request.history else "",
-        "focus_context": "Focus on these modules:\n" + "\n".join(request.focus_modules) if request.focus_modules else ""
-    })
+    with metrics.stage("outline"):
+        outline = await chain.ainvoke({
+            "title": request.title,
+            "history_context": f"Historical reference:\n{request.history}" if request.history else "",
+            "focus_context": "Focus on these modules:\n" + "\n".join(request.focus_modules) if request.focus_modules else ""
+        })
     return outline
 
 
@@ -53,7 +58,8 @@ async def search_documents(request: SearchRequest):
         data_source = create_datasource_factory("rag", collection_name=request.collection_name)
     
         # Perform the search
-        results = await data_source.search(request.keyword)
+        with metrics.stage("search"):
+            results = await data_source.search(request.keyword)
         
         # Convert the results to a list of dictionaries
         formatted_results = [
@@ -86,11 +92,18 @@ async def add_documents(request: AddDocumentRequest):
         data_source = create_datasource_factory("rag", collection_name=request.collection_name)
 
         # Add the documents to the data source
-        await data_source.add(request.documents)
+        # 写入时计算向量，计入embed阶段
+        with metrics.stage("embed"):
+            await data_source.add(request.documents)
         return {"message": f"Successfully added {len(request.documents)} documents to {request.collection_name}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus文本格式的运行指标"""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)